@@ -1,11 +1,11 @@
 import streamlit as st
 import os
 import base64
-import shutil
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-from src.search import RAGSearch, FAISS_STORE_DIR
+from src.search import RAGSearch, STARTUP_WARM_UP
+from src.metrics import metrics
 
 # -----------------------------
 # Setup
@@ -22,7 +22,10 @@ logger = logging.getLogger(__name__)
 # Configuration constants
 UPLOADED_DOCS_DIR = "uploaded_docs"
 MAX_FILE_SIZE_MB = 50  # Maximum file size in MB
-MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+# CSV, XLSX and JSON are parsed in bounded parts, so larger files are fine;
+# Streamlit's own server.maxUploadSize must be raised to match
+STREAMED_EXTENSIONS = (".csv", ".xlsx", ".json")
+MAX_STREAMED_FILE_SIZE_MB = int(os.getenv("MAX_STREAMED_FILE_SIZE_MB", "1024"))
 
 st.set_page_config(
     page_title="RAG Document Q&A",
@@ -216,6 +219,9 @@ div[data-testid="stChatInputContainer"]:focus-within {
 if "rag" not in st.session_state:
     try:
         st.session_state.rag = RAGSearch()
+        if STARTUP_WARM_UP:
+            # Loads the models while the page renders; once per server process
+            st.session_state.rag.start_warm_up()
         st.session_state.history = []
         st.session_state.last_query = None
         st.session_state.query_counter = 0
@@ -238,6 +244,13 @@ def show_pdf(file):
         unsafe_allow_html=True
     )
 
+# -----------------------------
+# Question display
+# -----------------------------
+def render_question(text):
+    st.markdown("### ❓ Question")
+    st.markdown(f"<div style='padding: 1rem; background-color: #f7fafc; border-radius: 10px; margin-bottom: 1rem; border-left: 4px solid #a0aec0; color: #2d3748; line-height: 1.6; box-shadow: 0 1px 2px rgba(0, 0, 0, 0.04);'><strong>{text}</strong></div>", unsafe_allow_html=True)
+
 # =============================
 # SIDEBAR
 # =============================
@@ -258,8 +271,9 @@ with st.sidebar:
         for f in uploaded_files:
             # Check file size
             file_size = len(f.getbuffer())
-            if file_size > MAX_FILE_SIZE_BYTES:
-                error_msg = f"❌ {f.name} exceeds {MAX_FILE_SIZE_MB}MB limit ({file_size / (1024*1024):.2f}MB)"
+            limit_mb = MAX_STREAMED_FILE_SIZE_MB if f.name.lower().endswith(STREAMED_EXTENSIONS) else MAX_FILE_SIZE_MB
+            if file_size > limit_mb * 1024 * 1024:
+                error_msg = f"❌ {f.name} exceeds {limit_mb}MB limit ({file_size / (1024*1024):.2f}MB)"
                 st.warning(error_msg)
                 file_errors.append(error_msg)
                 continue
@@ -288,8 +302,12 @@ with st.sidebar:
                     
                     if result["success"]:
                         success_msg = f"✅ Successfully indexed {result['doc_count']} documents!"
+                        if result.get("parts"):
+                            success_msg += f" ({result['pages']} pages and rows, streamed in {result['parts']} parts)"
                         if result["errors"]:
                             success_msg += f" ({len(result['errors'])} files had errors)"
+                        if result["unchanged"]:
+                            success_msg += f" ({result['unchanged']} unchanged files skipped)"
                         st.success(success_msg)
                         
                         if result["errors"]:
@@ -297,6 +315,13 @@ with st.sidebar:
                                 for error in result["errors"]:
                                     st.text(error)
                         
+                        with st.expander("⏱️ Indexing throughput", expanded=False):
+                            for name, stage in result["stages"].items():
+                                st.caption(
+                                    f"{name}: {stage['items']} items, {stage['items_per_s']}/s, "
+                                    f"{stage['utilization']:.0%} busy"
+                                )
+                        
                         # Clean up uploaded files after successful indexing
                         try:
                             for path in paths:
@@ -321,17 +346,66 @@ with st.sidebar:
             except Exception as e:
                 st.warning(f"Could not preview PDF: {str(e)}")
 
+    indexed_docs = st.session_state.rag.list_documents()
+    if indexed_docs:
+        with st.expander(f"📚 Indexed documents ({len(indexed_docs)})", expanded=False):
+            for d in indexed_docs:
+                name_col, del_col = st.columns([5, 1])
+                name_col.caption(f"{Path(d['source']).name or d['doc_id']} ({d['chunks']} chunks)")
+                if del_col.button("✖", key=f"delete_{d['doc_id']}", help="Remove this document from the index"):
+                    try:
+                        st.session_state.rag.delete_document(d["doc_id"])
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Error removing document: {str(e)}")
+                        logger.error(f"Error removing document: {str(e)}", exc_info=True)
+
+    # Optionally restrict questions to some of the indexed documents
+    search_filter = None
+    if indexed_docs:
+        names = {d["doc_id"]: Path(d["source"]).name or d["doc_id"] for d in indexed_docs}
+        selected = st.multiselect("🔎 Search only in", options=list(names), format_func=names.get,
+                                  help="Leave empty to search all indexed documents")
+        if selected:
+            search_filter = {"doc_id": selected}
+
     if st.button("🗑 Clear index"):
         try:
-            if os.path.exists(FAISS_STORE_DIR):
-                shutil.rmtree(FAISS_STORE_DIR, ignore_errors=True)
-            st.session_state.rag = RAGSearch()
+            # The store is shared by all sessions, so clear it in place
+            st.session_state.rag.clear_index()
             st.success("✅ Index cleared successfully")
             logger.info("Vector store index cleared")
         except Exception as e:
             st.error(f"❌ Error clearing index: {str(e)}")
             logger.error(f"Error clearing index: {str(e)}", exc_info=True)
 
+    # Process-wide counters: covers every session of this Streamlit server
+    if metrics.enabled:
+        with st.expander("📈 Performance", expanded=False):
+            snapshot = metrics.snapshot()
+            for family, title in (("rag_query_stage_seconds", "Query stages"),
+                                  ("rag_ingest_stage_seconds", "Ingestion stages")):
+                stages = snapshot["histograms"].get(family)
+                if stages:
+                    st.markdown(f"**{title}** (count, mean / p95 ms)")
+                    for label, h in stages.items():
+                        st.caption(f"{label.split('=', 1)[-1]}: {h['count']}, "
+                                   f"{h['mean_ms']:.1f} / {h['p95_ms']:.1f}")
+            counters = snapshot["counters"]
+            outcomes = counters.get("rag_queries_total", {})
+            if outcomes:
+                st.caption("Questions: " + ", ".join(
+                    f"{label.split('=', 1)[-1]} {int(n)}" for label, n in outcomes.items()))
+            tokens = [(name, counters.get(f"rag_{name}_tokens_total", {}).get("", 0))
+                      for name in ("prompt", "context", "completion")]
+            if any(n for _, n in tokens):
+                st.caption("Tokens: " + ", ".join(f"{name} {int(n)}" for name, n in tokens))
+            stats = st.session_state.rag.stats()
+            for name in ("answer_cache", "embedding_cache"):
+                if stats.get(name):
+                    st.caption(f"{name.replace('_', ' ').capitalize()} hit rate: "
+                               f"{stats[name]['hit_rate']:.0%}")
+
     st.markdown("---")
     st.header("🕘 Query History")
     for q in reversed(st.session_state.history[-6:]):
@@ -362,21 +436,39 @@ if query and query != st.session_state.get("last_query"):
     st.session_state.last_query = query
     st.session_state.current_result = None  # Clear previous result
 
-# Process query if provided
+# Process query if provided, streaming the answer as it is generated
+streamed = False
 if query:
-    with st.spinner("Searching..."):
-        try:
-            result = st.session_state.rag.search_with_details(query)
-            st.session_state.history.append(query)
-            st.session_state.current_result = result  # Store current result
-        except ValueError as e:
-            st.error(f"❌ {str(e)}")
-            logger.warning(f"Search error: {str(e)}")
-            st.session_state.current_result = None
-        except Exception as e:
-            st.error(f"❌ Unexpected error during search: {str(e)}")
-            logger.error(f"Search error: {str(e)}", exc_info=True)
-            st.session_state.current_result = None
+    render_question(query)
+    st.markdown("### 📝 Answer")
+    answer_slot = st.empty()
+    try:
+        with st.spinner("Searching..."):
+            events = st.session_state.rag.stream_search(query, filter=search_filter)
+            next(events)  # Sources are ready; answer tokens follow
+        parts = []
+        for event in events:
+            if event["type"] == "token":
+                parts.append(event["text"])
+                answer_slot.markdown(f"<div class='answer-box'>{''.join(parts)}▌</div>", unsafe_allow_html=True)
+            elif event["type"] == "done":
+                answer_slot.markdown(f"<div class='answer-box'>{event['answer']}</div>", unsafe_allow_html=True)
+                st.session_state.history.append(query)
+                st.session_state.current_result = {
+                    k: event.get(k) for k in ("answer", "sources", "context", "cached", "timings",
+                                              "prompt_tokens", "context_tokens")
+                }
+                streamed = True
+    except ValueError as e:
+        answer_slot.empty()
+        st.error(f"❌ {str(e)}")
+        logger.warning(f"Search error: {str(e)}")
+        st.session_state.current_result = None
+    except Exception as e:
+        answer_slot.empty()
+        st.error(f"❌ Unexpected error during search: {str(e)}")
+        logger.error(f"Search error: {str(e)}", exc_info=True)
+        st.session_state.current_result = None
 
 # Display results only for the current query
 # When current_result is None (new query), nothing is displayed (clears previous results)
@@ -384,14 +476,21 @@ if st.session_state.get("current_result"):
     result = st.session_state.current_result
     current_query = st.session_state.get("last_query", "")
     
-    # Display question
-    if current_query:
-        st.markdown("### ❓ Question")
-        st.markdown(f"<div style='padding: 1rem; background-color: #f7fafc; border-radius: 10px; margin-bottom: 1rem; border-left: 4px solid #a0aec0; color: #2d3748; line-height: 1.6; box-shadow: 0 1px 2px rgba(0, 0, 0, 0.04);'><strong>{current_query}</strong></div>", unsafe_allow_html=True)
-    
-    # Display answer
-    st.markdown("### 📝 Answer")
-    st.markdown(f"<div class='answer-box'>{result['answer']}</div>", unsafe_allow_html=True)
+    # Question and answer were already drawn while streaming in this run
+    if not streamed:
+        if current_query:
+            render_question(current_query)
+        st.markdown("### 📝 Answer")
+        st.markdown(f"<div class='answer-box'>{result['answer']}</div>", unsafe_allow_html=True)
+    if result.get("cached"):
+        st.caption("⚡ Reused the answer to a near-identical earlier question")
+    if result.get("timings"):
+        t = result["timings"]
+        st.caption(f"⏱️ First token after {t['ttft_s']:.2f}s, complete after {t['total_s']:.2f}s "
+                   f"(retrieval {t['retrieval_s']:.2f}s)")
+    if result.get("prompt_tokens"):
+        st.caption(f"🧮 Prompt: {result['prompt_tokens']} tokens, "
+                   f"{result.get('context_tokens', 0)} of them retrieved context")
     
     st.markdown("<br>", unsafe_allow_html=True)  # Add space between answer and sources
 
@@ -399,9 +498,24 @@ if st.session_state.get("current_result"):
     if result.get("sources"):
         with st.expander("📚 Sources", expanded=False):
             for s in result["sources"]:
+                # Scores the result was ranked by: cross-encoder, and hybrid search's fused and keyword scores
+                parts = [f"{label} {s[key]:.3f}" for label, key in
+                         (("rerank", "rerank_score"), ("RRF", "rrf_score"), ("BM25", "bm25_score"))
+                         if s.get(key) is not None]
+                detail = f"; {', '.join(parts)}" if parts else ""
+                # Citation: file name plus page (PDF, 0-based in metadata) or rows (CSV, JSON records)
+                citation = Path(s.get("source") or "").name
+                if s.get("page") is not None:
+                    citation += f", page {s['page'] + 1}"
+                elif s.get("row") is not None:
+                    if s.get("row_end") is not None and s["row_end"] != s["row"]:
+                        citation += f", rows {s['row'] + 1}–{s['row_end'] + 1}"
+                    else:
+                        citation += f", row {s['row'] + 1}"
+                citation = f" — {citation}" if citation else ""
                 st.markdown(f"""
                 <div class="source-box">
-                <strong>Chunk {s['index']}</strong> (Score: {s['similarity']:.2f})<br>
+                <strong>Chunk {s['index']}{citation}</strong> (Score: {s['similarity']:.3f}{detail})<br>
                 <small>{s['text']}</small>
                 </div>
                 """, unsafe_allow_html=True)
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers, keyed by query embedding.
+
+    A lookup compares the query's normalized embedding with those of
+    recently answered queries; the best match above ``threshold`` cosine
+    similarity is a hit. Entries are scoped to the store's data version,
+    ``top_k`` and any metadata filter, so adding, replacing, deleting or clearing documents
+    invalidates every answer computed before the change; answers for other
+    stores sharing the cache are kept.
+
+    Entries live in memory as one matrix for fast matching and, when a
+    ``path`` is given, are written through to SQLite so they survive
+    restarts. At most ``max_entries`` are kept (oldest evicted first),
+    and entries older than ``ttl_s`` seconds are never returned.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 1000,
+                 ttl_s: float = 86400.0, threshold: float = 0.95):
+        """
+        Args:
+            path: SQLite database file; None keeps the cache in memory only
+            max_entries: Maximum number of cached answers
+            ttl_s: Seconds after which an answer expires
+            threshold: Minimum cosine similarity between queries for a hit
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # Row _head + i of _matrix is the embedding of _entries[i]; the matrix
+        # has spare rows, so appending and evicting the oldest do not copy it
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._head = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if path:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, query TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, result TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._load()
+            logger.info(f"Opened answer cache at {path} ({len(self._entries)} entries)")
+
+    @staticmethod
+    def scope(data_version: str, top_k: int, variant: str = "") -> str:
+        return f"{data_version}/{top_k}/{variant}" if variant else f"{data_version}/{top_k}"
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, scope, query, embedding, result, created FROM answers "
+            "WHERE created >= ? ORDER BY id DESC LIMIT ?",
+            (time.time() - self.ttl_s, self.max_entries)
+        ).fetchall()
+        for row_id, scope, query, blob, result, created in reversed(rows):
+            self._append(row_id, scope, query, np.frombuffer(blob, dtype=np.float32),
+                         json.loads(result), created)
+
+    def _rows(self) -> np.ndarray:
+        """Embeddings of the entries, in order (a view of the matrix)."""
+        return self._matrix[self._head:self._head + len(self._entries)]
+
+    def _append(self, row_id: Optional[int], scope: str, query: str, embedding: np.ndarray,
+                result: Dict[str, Any], created: float) -> None:
+        n = len(self._entries)
+        if self._matrix is None or self._head + n == len(self._matrix):
+            # Out of rows at the end: move the entries to the front of a matrix
+            # at least twice their number, so this happens rarely
+            capacity = 16 if self._matrix is None else len(self._matrix)
+            while capacity < 2 * (n + 1):
+                capacity *= 2
+            matrix = np.empty((capacity, embedding.size), dtype=np.float32)
+            if n:
+                matrix[:n] = self._rows()
+            self._matrix, self._head = matrix, 0
+        self._matrix[self._head + n] = embedding.reshape(-1)
+        self._entries.append({"id": row_id, "scope": scope, "query": query,
+                              "result": result, "created": created})
+
+    def _drop(self, keep: np.ndarray) -> None:
+        """Keep only the entries where ``keep`` is True, in memory and on disk."""
+        dropped = [e["id"] for e, k in zip(self._entries, keep) if not k and e["id"] is not None]
+        first = int(np.argmax(keep)) if keep.any() else len(keep)
+        if keep[first:].all():
+            # Only the oldest go (eviction, expiry): skip their rows
+            self._head += first
+        else:
+            kept = self._rows()[keep]
+            self._matrix[:len(kept)] = kept
+            self._head = 0
+        self._entries = [e for e, k in zip(self._entries, keep) if k]
+        if self._conn is not None and dropped:
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in dropped])
+            self._conn.commit()
+
+    def get(self, embedding: np.ndarray, data_version: str, top_k: int,
+            variant: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Return the cached result for the most similar earlier query, or None.
+
+        Args:
+            embedding: Normalized query embedding, shape (dim,) or (1, dim)
+            data_version: Current FaissVectorStore.data_version
+            top_k: Number of retrieved chunks the answer was built from
+            variant: Anything else that changes retrieval, e.g. a metadata filter key
+        """
+        scope = self.scope(data_version, top_k, variant)
+        store_id = data_version.rpartition(":")[0]
+        now = time.time()
+        with self._lock:
+            if self._entries:
+                # Forget expired answers and this store's answers from older data versions
+                keep = np.array([
+                    now - e["created"] < self.ttl_s and (
+                        e["scope"].split("/")[0] == data_version
+                        or e["scope"].split("/")[0].rpartition(":")[0] != store_id
+                    )
+                    for e in self._entries
+                ])
+                if not keep.all():
+                    self._drop(keep)
+
+            best = None
+            if self._entries:
+                scores = self._rows() @ embedding.reshape(-1).astype(np.float32)
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self._entries[i]["scope"] == scope:
+                        best = self._entries[i]
+                        break
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        logger.debug(f"Answer cache hit for query similar to: {best['query'][:50]}")
+        return best["result"]
+
+    def put(self, query: str, embedding: np.ndarray, data_version: str, top_k: int,
+            result: Dict[str, Any], variant: str = "") -> None:
+        """Cache a result (JSON-serializable) computed for the given query and data version."""
+        scope = self.scope(data_version, top_k, variant)
+        created = time.time()
+        vector = embedding.reshape(-1).astype(np.float32)
+        with self._lock:
+            row_id = None
+            if self._conn is not None:
+                cur = self._conn.execute(
+                    "INSERT INTO answers (scope, query, embedding, result, created) VALUES (?, ?, ?, ?, ?)",
+                    (scope, query, vector.tobytes(), json.dumps(result), created)
+                )
+                self._conn.commit()
+                row_id = cur.lastrowid
+            self._append(row_id, scope, query, vector, result, created)
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                keep = np.ones(len(self._entries), dtype=bool)
+                keep[:excess] = False
+                self._drop(keep)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self) -> None:
+        """Remove all cached answers and reset counters."""
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+            self._head = 0
+            self.hits = self.misses = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,333 @@
+"""
+Offline benchmark for ingestion, loading and querying.
+
+Generates a synthetic corpus, indexes it into a fresh store and reports
+throughput, latency percentiles and peak memory as JSON, so runs on
+different commits can be compared. By default a hashing embedder and a
+fake chat model stand in for SentenceTransformer and OpenAI, so no
+network or model download is needed.
+
+Usage:
+    python -m src.benchmark --chunks 100000 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Any, Dict, Iterator, Optional
+import numpy as np
+from langchain_core.documents import Document
+from src.registry import get_vector_store, register_embedding_model
+from src.index_types import IndexSpec, INDEX_TYPES
+from src.vectorstore import FaissVectorStore
+from src.fake_llm import FakeChatModel
+from src.answer_cache import AnswerCache
+
+logger = logging.getLogger(__name__)
+
+HASHING_MODEL = "hashing"
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words embedder with SentenceTransformer's interface.
+
+    Each word is hashed into one of ``dim`` buckets; texts sharing words get
+    similar vectors, which is enough to exercise indexing and search
+    realistically without loading a model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs: Any) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = [zlib.crc32(w.encode("utf-8")) % self.dim for w in text.split()]
+            np.add.at(out[i], buckets, 1.0)
+        return out
+
+
+def _vocabulary(size: int) -> np.ndarray:
+    """Pronounceable pseudo-words, so chunk lengths resemble real text."""
+    syllables = ["ka", "to", "ri", "mel", "san", "du", "vo", "len",
+                 "pra", "ti", "shu", "ber", "no", "gal", "fi", "um"]
+    # Word i spells i in base 16, one syllable per digit
+    words = []
+    for i in range(size):
+        word = ""
+        while True:
+            i, digit = divmod(i, len(syllables))
+            word += syllables[digit]
+            if not i:
+                break
+        words.append(word)
+    return np.array(words)
+
+
+def synthetic_documents(n_chunks: int, chunks_per_doc: int = 10, words_per_chunk: int = 120,
+                        vocab_size: int = 20_000, seed: int = 0) -> Iterator[List[Document]]:
+    """
+    Yield synthetic documents, one list of page Documents per source file.
+
+    Word frequencies follow a Zipf distribution and each document draws a
+    share of its words from its own topic, so queries have real nearest
+    neighbours. Pages are sized to produce one chunk each with the
+    default splitter settings.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _vocabulary(vocab_size)
+    n_docs = -(-n_chunks // chunks_per_doc)
+    for d in range(n_docs):
+        topic = rng.integers(0, vocab_size, 50)
+        pages = []
+        for p in range(min(chunks_per_doc, n_chunks - d * chunks_per_doc)):
+            common = np.minimum(rng.zipf(1.3, words_per_chunk // 2) - 1, vocab_size - 1)
+            topical = rng.choice(topic, words_per_chunk - len(common))
+            words = vocab[np.concatenate([common, topical])]
+            rng.shuffle(words)
+            pages.append(Document(
+                page_content=" ".join(words),
+                metadata={"source": f"synthetic/doc-{d:07d}.txt", "page": p},
+            ))
+        yield pages
+
+
+def synthetic_queries(n: int, words: int = 6, vocab_size: int = 20_000, seed: int = 1) -> List[str]:
+    rng = np.random.default_rng(seed)
+    vocab = _vocabulary(vocab_size)
+    return [" ".join(vocab[rng.integers(0, vocab_size, words)]) for _ in range(n)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(latencies_s: List[float], wall_s: float) -> Dict[str, Any]:
+    ms = np.array(latencies_s) * 1000
+    return {
+        "count": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "qps": round(len(ms) / wall_s, 1) if wall_s else 0.0,
+    }
+
+
+def _timed_calls(fn, args: List[Any], concurrency: int) -> Dict[str, Any]:
+    def call(arg: Any) -> float:
+        start = time.perf_counter()
+        fn(arg)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [call(a) for a in args]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, args))
+    return latency_summary(latencies, time.perf_counter() - start)
+
+
+def _timed_stream(rag: Any, queries: List[str], top_k: int) -> Dict[str, Any]:
+    """Time-to-first-token, total latency and prompt size of RAGSearch.stream_search."""
+    ttft, total, prompt_tokens = [], [], []
+    start = time.perf_counter()
+    for q in queries:
+        for event in rag.stream_search(q, top_k=top_k):
+            if event["type"] == "done":
+                ttft.append(event["timings"]["ttft_s"])
+                total.append(event["timings"]["total_s"])
+                if event.get("prompt_tokens"):
+                    prompt_tokens.append(event["prompt_tokens"])
+    wall = time.perf_counter() - start
+    return {"ttft": latency_summary(ttft, wall), "total": latency_summary(total, wall),
+            "mean_prompt_tokens": round(float(np.mean(prompt_tokens)), 1) if prompt_tokens else None}
+
+
+def bench_ingest(store: FaissVectorStore, args: argparse.Namespace) -> Dict[str, Any]:
+    docs = chunks = 0
+    batch: List[Document] = []
+    generate_s = 0.0
+    start = time.perf_counter()
+    gen = synthetic_documents(args.chunks, args.chunks_per_doc, args.words_per_chunk, seed=args.seed)
+    while True:
+        t = time.perf_counter()
+        pages = next(gen, None)
+        generate_s += time.perf_counter() - t
+        if pages is not None:
+            batch.extend(pages)
+            docs += 1
+        if batch and (pages is None or docs % args.batch_docs == 0):
+            chunks += store.add_documents(batch)["chunks"]
+            batch = []
+        if pages is None:
+            break
+    ingest_s = time.perf_counter() - start - generate_s
+
+    # Let background compaction finish so load and query see the settled store
+    t = time.perf_counter()
+    while store.compact():
+        pass
+    compact_s = time.perf_counter() - t
+
+    return {
+        "documents": docs,
+        "chunks": chunks,
+        "seconds": round(ingest_s, 3),
+        "docs_per_s": round(docs / ingest_s, 1) if ingest_s else 0.0,
+        "chunks_per_s": round(chunks / ingest_s, 1) if ingest_s else 0.0,
+        "compact_s": round(compact_s, 3),
+        "segments": len(store.segments),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_load(args: argparse.Namespace, spec: IndexSpec) -> Dict[str, Any]:
+    report = {}
+    for use_mmap in (False, True):
+        start = time.perf_counter()
+        store = FaissVectorStore(args.store_dir, model=args.model, use_mmap=use_mmap, index_spec=spec)
+        store.load()
+        report["mmap" if use_mmap else "heap"] = {
+            "seconds": round(time.perf_counter() - start, 3),
+            "chunks": store.ntotal,
+        }
+        del store
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.model == HASHING_MODEL:
+        register_embedding_model(HASHING_MODEL, HashingEmbedder(args.dim))
+    spec = IndexSpec(args.index_type, train_threshold=args.train_threshold)
+    if os.path.exists(args.store_dir):
+        shutil.rmtree(args.store_dir)
+
+    store = get_vector_store(args.store_dir, model=args.model, use_mmap=args.mmap, index_spec=spec)
+    results: Dict[str, Any] = {"ingest": bench_ingest(store, args)}
+    results["load"] = bench_load(args, spec)
+
+    queries = synthetic_queries(args.queries, seed=args.seed + 1)
+    for q in queries[:args.warmup]:
+        store.query(q, top_k=args.top_k)
+    results["query"] = _timed_calls(lambda q: store.query(q, top_k=args.top_k), queries, 1)
+    if args.concurrency > 1:
+        results["query_concurrent"] = {
+            "concurrency": args.concurrency,
+            **_timed_calls(lambda q: store.query(q, top_k=args.top_k), queries, args.concurrency),
+        }
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), args.batch_size):
+        store.query_batch(queries[i:i + args.batch_size], top_k=args.top_k)
+    wall = time.perf_counter() - start
+    results["query_batch"] = {"batch_size": args.batch_size, "seconds": round(wall, 3),
+                              "qps": round(len(queries) / wall, 1) if wall else 0.0}
+
+    # Keep RAGSearch's embedding cache next to the benchmark store, not in the working directory
+    os.environ.setdefault("EMBEDDING_CACHE_PATH",
+                          os.path.join(os.path.dirname(os.path.abspath(args.store_dir)), "embeddings.sqlite"))
+    from src.search import RAGSearch
+    rag = RAGSearch(args.store_dir, use_mmap=args.mmap, index_spec=spec,
+                    embedding_model=args.model,
+                    llm=FakeChatModel(first_token_s=args.llm_first_token, token_s=args.llm_token),
+                    answer_cache=AnswerCache())
+    n_e2e = max(1, args.queries // 10)
+    results["search_with_details"] = _timed_calls(
+        lambda q: rag.search_with_details(q, top_k=args.top_k), queries[:n_e2e], 1
+    )
+    results["stream_search"] = _timed_stream(rag, queries[n_e2e:2 * n_e2e] or queries[:n_e2e], args.top_k)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and search on a synthetic corpus")
+    parser.add_argument("--chunks", type=int, default=10_000, help="Corpus size in chunks")
+    parser.add_argument("--chunks-per-doc", type=int, default=10)
+    parser.add_argument("--words-per-chunk", type=int, default=120)
+    parser.add_argument("--batch-docs", type=int, default=1000, help="Documents per add_documents call")
+    parser.add_argument("--model", default=HASHING_MODEL,
+                        help=f"Embedding model; '{HASHING_MODEL}' runs offline without a model download")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the hashing embedder")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--train-threshold", type=int, default=100_000)
+    parser.add_argument("--mmap", action="store_true", help="Query a memory-mapped store")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64, help="Queries per query_batch call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads for the concurrent query run")
+    parser.add_argument("--llm-first-token", type=float, default=0.0,
+                        help="Seconds the fake LLM waits before its first token")
+    parser.add_argument("--llm-token", type=float, default=0.0,
+                        help="Seconds the fake LLM waits between tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-dir", default=None, help="Store directory (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="Keep the store directory afterwards")
+    parser.add_argument("--output", default=None, help="JSON file to write (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args(argv)
+    temp_dir = None
+    if args.store_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="rag-bench-")
+        args.store_dir = os.path.join(temp_dir, "faiss_store")
+
+    try:
+        results = run(args)
+    finally:
+        if temp_dir and not args.keep:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "keep")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark results to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import re
+import hashlib
+import logging
+from typing import List, Dict, Iterable, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BM25_SUFFIXES = (".bm25_terms.npy", ".bm25_offsets.npy", ".bm25_postings.npy", ".bm25_doclen.npy")
+
+_WORD_RE = re.compile(r"\w+")
+# Identifiers such as "AB-1234" or "v2.1" are indexed whole as well as by their parts
+_COMPOUND_RE = re.compile(r"\b\w+(?:[-./]\w+)+")
+_JOINED_RE = re.compile(r"\w[-./]\w")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text, in no particular order."""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    if _JOINED_RE.search(text):
+        tokens.extend(_COMPOUND_RE.findall(text))
+    return tokens
+
+
+def term_hash(term: str) -> int:
+    """64-bit term id; hashes keep the on-disk vocabulary fixed-width and mmap-able."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def query_hashes(text: str) -> np.ndarray:
+    """Sorted unique term hashes of a query."""
+    return np.unique(np.array([term_hash(t) for t in set(tokenize(text))], dtype=np.uint64))
+
+
+class BM25Index:
+    """
+    Inverted index over one segment's chunks, in CSR form.
+
+    ``terms`` holds the sorted term hashes; the postings of ``terms[i]`` are
+    ``postings[offsets[i]:offsets[i + 1]]``, rows of (segment row, term
+    frequency). ``doclen`` is the token count of each row. All four arrays
+    are plain ``.npy`` files, so they can be memory-mapped like the rest of
+    the segment.
+    """
+
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                 doclen: np.ndarray):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.doclen = doclen
+        self.total_len = int(np.asarray(doclen, dtype=np.int64).sum())
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doclen: List[int] = []
+        for text in texts:
+            tokens = tokenize(text)
+            doclen.append(len(tokens))
+            term_ids.extend([vocab.setdefault(t, len(vocab)) for t in tokens])
+
+        # One (term, row) key per token; equal keys are counted into term frequencies
+        n_rows = max(len(doclen), 1)
+        rows = np.repeat(np.arange(len(doclen), dtype=np.int64), doclen)
+        keys, tfs = np.unique(np.array(term_ids, dtype=np.int64) * n_rows + rows, return_counts=True)
+        posting_terms, posting_rows = np.divmod(keys, n_rows)
+
+        hashes = np.array([term_hash(t) for t in vocab], dtype=np.uint64)
+        posting_hashes = hashes[posting_terms]
+        order = np.argsort(posting_hashes, kind="stable")  # rows stay ascending per term
+        terms, starts = np.unique(posting_hashes[order], return_index=True)
+        offsets = np.append(starts, len(order)).astype(np.int64)
+        postings = np.stack([posting_rows[order], tfs[order]], axis=1).astype(np.uint32)
+        return cls(terms, offsets, postings, np.array(doclen, dtype=np.uint32))
+
+    def save(self, prefix: str) -> None:
+        for suffix, arr in zip(BM25_SUFFIXES, (self.terms, self.offsets, self.postings, self.doclen)):
+            with open(f"{prefix}{suffix}", "wb") as f:
+                np.save(f, arr)
+                f.flush()
+                os.fsync(f.fileno())
+
+    @classmethod
+    def open(cls, prefix: str, use_mmap: bool = False) -> Optional["BM25Index"]:
+        """Load a saved index, or return None if the segment has none yet."""
+        paths = [f"{prefix}{suffix}" for suffix in BM25_SUFFIXES]
+        if not all(os.path.exists(p) for p in paths):
+            return None
+        return cls(*(np.load(p, mmap_mode="r" if use_mmap else None) for p in paths))
+
+    def lookup(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find query terms in this segment.
+
+        Returns:
+            (found mask, posting starts, posting ends), one entry per hash
+        """
+        if len(self.terms) == 0:
+            empty = np.zeros(len(hashes), dtype=np.int64)
+            return np.zeros(len(hashes), dtype=bool), empty, empty
+        idx = np.minimum(np.searchsorted(self.terms, hashes), len(self.terms) - 1)
+        found = self.terms[idx] == hashes
+        return found, self.offsets[idx], self.offsets[idx + 1]
+
+
+def bm25_scores(indexes: List[BM25Index], hashes: np.ndarray, k1: float = 1.2,
+                b: float = 0.75) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Score the rows of several segment indexes against one query.
+
+    Corpus statistics (document count, document frequencies, average
+    length) are summed over all given segments, so scores are comparable
+    across segments.
+
+    Returns:
+        Per index, (rows, scores) for every row containing a query term
+    """
+    lookups = [ix.lookup(hashes) for ix in indexes]
+    n_docs = sum(len(ix.doclen) for ix in indexes)
+    if n_docs == 0 or len(hashes) == 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in indexes]
+    avgdl = max(sum(ix.total_len for ix in indexes) / n_docs, 1e-9)
+    df = sum(np.where(found, end - start, 0) for found, start, end in lookups)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    results = []
+    for ix, (found, start, end) in zip(indexes, lookups):
+        matched = np.flatnonzero(found)
+        if len(matched) == 0:
+            results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+            continue
+        doclen = np.asarray(ix.doclen)
+        # Dense accumulator: a row appears at most once per term's postings
+        acc = np.zeros(len(doclen), dtype=np.float32)
+        for t in matched:
+            postings = np.asarray(ix.postings[start[t]:end[t]])
+            rows = postings[:, 0]
+            tf = postings[:, 1].astype(np.float32)
+            norm = k1 * (1 - b + b * doclen[rows].astype(np.float32) / avgdl)
+            acc[rows] += np.float32(idf[t]) * tf * (k1 + 1) / (tf + norm)
+        rows = np.flatnonzero(acc)
+        results.append((rows, acc[rows]))
+    return results
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked lists of chunk ids: each list adds 1 / (k + rank) to an id's score.
+
+    Returns:
+        (chunk id, fused score) pairs, best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,440 @@
+"""
+Structure-aware document chunking.
+
+``StructuredChunker`` (the default) splits in a single pass over each text:
+every chunk is cut at the best break point in its window, found with
+``str.rfind`` (paragraph, then line, sentence and word), and the next chunk
+starts ``overlap`` characters earlier at a word boundary (unless the chunk
+ended with a paragraph). Each chunk records
+its character offsets in the loaded text (``start_index``/``end_index``)
+and keeps the page or row of its source. Documents are split by shape:
+
+    rows    documents with a ``row`` (CSV and spreadsheet rows, JSON
+            records from data_loader's streaming readers) are grouped
+            into chunks of whole rows up to ``chunk_size``; chunks note
+            their first and last row (``row``, ``row_end``)
+    json    a JSON array or object is cut between records, never inside
+            one; records larger than a chunk are split at their own
+            records, or as text if they have none
+    text    everything else, page by page for PDFs, so no chunk spans pages
+
+``RecursiveChunker`` keeps LangChain's RecursiveCharacterTextSplitter for
+comparison. To compare the two on synthetic corpora or your own files:
+
+    python -m src.chunking benchmark --files data/export.csv data/report.pdf
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+from typing import List, Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNKING_STRATEGIES = ("structured", "recursive")
+# Break points by preference; separators in one group rank equally
+BREAK_GROUPS = (("\n\n",), ("\n",), (". ", "? ", "! "), ("; ", ", "), (" ", "\t"))
+# A chunk is cut at the best break in the second half of its window, so
+# chunks are never shorter than half of chunk_size (except at the end)
+MIN_FILL = 0.5
+# Joins grouped rows into one chunk
+ROW_SEPARATOR = "\n\n"
+
+Span = Tuple[int, int]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _skip_space(text: str, i: int) -> int:
+    n = len(text)
+    while i < n and text[i].isspace():
+        i += 1
+    return i
+
+
+def _trim_end(text: str, start: int, end: int) -> int:
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def _is_json(doc: Any) -> bool:
+    return str(doc.metadata.get("source") or "").lower().endswith(".json")
+
+
+def _row_group(doc: Any) -> Dict[str, Any]:
+    """Metadata shared by rows that may be chunked together: everything but the row number."""
+    return {k: v for k, v in doc.metadata.items() if k != "row"}
+
+
+def json_records(text: str, pos: int = 0) -> Optional[List[Tuple[int, int, int]]]:
+    """
+    Locate the records of the JSON array or object starting at ``pos``.
+
+    Returns:
+        (start, value_start, end) character offsets per element (array) or
+        member (object, where ``start`` is at the key), or None if the text
+        at ``pos`` is not a non-empty, well-formed array or object
+    """
+    pos = _WHITESPACE.match(text, pos).end()
+    if pos >= len(text) or text[pos] not in "[{":
+        return None
+    is_object = text[pos] == "{"
+    close = "}" if is_object else "]"
+    i = _WHITESPACE.match(text, pos + 1).end()
+    records = []
+    try:
+        while True:
+            start = value_start = i
+            if is_object:
+                key, i = _JSON_DECODER.raw_decode(text, i)
+                i = _WHITESPACE.match(text, i).end()
+                if not isinstance(key, str) or not text.startswith(":", i):
+                    return None
+                value_start = i = _WHITESPACE.match(text, i + 1).end()
+            _, i = _JSON_DECODER.raw_decode(text, i)
+            records.append((start, value_start, i))
+            i = _WHITESPACE.match(text, i).end()
+            if text.startswith(",", i):
+                i = _WHITESPACE.match(text, i + 1).end()
+            elif text.startswith(close, i):
+                return records
+            else:
+                return None
+    except ValueError:
+        return None
+
+
+class StructuredChunker:
+    """Single-pass chunker that follows rows, JSON records and pages (see module docstring)."""
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200):
+        """
+        Args:
+            chunk_size: Maximum characters per chunk
+            overlap: Characters repeated from the end of a chunk at the start
+                of the next one (text only; rows and records do not overlap)
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be at least 0 and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._min_break = max(1, int(chunk_size * MIN_FILL))
+
+    def _break_before(self, text: str, start: int, limit: int) -> Tuple[int, int]:
+        """
+        End of a chunk starting at ``start``: after the best break point before ``limit``.
+
+        Returns:
+            The end offset and the index of its group in BREAK_GROUPS
+            (len(BREAK_GROUPS) for a cut without a break point)
+        """
+        lo = start + self._min_break
+        for level, group in enumerate(BREAK_GROUPS):
+            best = -1
+            for sep in group:
+                pos = text.rfind(sep, lo, limit)
+                if pos != -1 and pos + len(sep) > best:
+                    best = pos + len(sep)
+            if best != -1:
+                return best, level
+        return limit, len(BREAK_GROUPS)
+
+    def _next_start(self, text: str, start: int, end: int, level: int) -> int:
+        """Start of the chunk after [start, end): the first word at most ``overlap`` before ``end``."""
+        # A chunk ending with its paragraph needs no overlap (as with the recursive splitter)
+        if not self.overlap or level == 0:
+            return end
+        # Advance by at least half a chunk, however large the overlap
+        lo = max(end - self.overlap, start + (end - start + 1) // 2)
+        breaks = [p for p in (text.find(" ", lo, end), text.find("\n", lo, end)) if p != -1]
+        return min(breaks) + 1 if breaks else end
+
+    def spans(self, text: str, offset: int = 0) -> List[Span]:
+        """
+        Chunk boundaries of one text, without leading or trailing whitespace.
+
+        Args:
+            text: Text to split
+            offset: Added to every returned offset (position of ``text`` in a larger text)
+
+        Returns:
+            (start, end) character offsets of each chunk
+        """
+        n = len(text)
+        spans: List[Span] = []
+        start = _skip_space(text, 0)
+        while start < n:
+            limit = start + self.chunk_size
+            if limit >= n:
+                end, level = n, 0
+            else:
+                end, level = self._break_before(text, start, limit)
+            stop = _trim_end(text, start, end)
+            if stop > start:
+                spans.append((offset + start, offset + stop))
+            if end >= n:
+                break
+            start = _skip_space(text, self._next_start(text, start, end, level))
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        """Chunk texts of one string."""
+        return [text[s:e] for s, e in self.spans(text)]
+
+    def _text_chunks(self, doc: Any) -> List[Tuple[str, Dict[str, Any]]]:
+        text = doc.page_content
+        return [(text[s:e], {**doc.metadata, "start_index": s, "end_index": e})
+                for s, e in self.spans(text)]
+
+    def _row_chunks(self, rows: List[Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        chunks: List[Tuple[str, Dict[str, Any]]] = []
+        group: List[Any] = []
+        size = 0
+
+        def flush() -> None:
+            if group:
+                text = ROW_SEPARATOR.join(d.page_content.strip() for d in group)
+                chunks.append((text, {**group[0].metadata, "row_end": group[-1].metadata["row"]}))
+                group.clear()
+
+        for doc in rows:
+            length = len(doc.page_content.strip())
+            if not length:
+                continue
+            if length > self.chunk_size:
+                # A row too long for one chunk is split on its own, keeping its row number
+                flush()
+                if _is_json(doc):
+                    chunks.extend(self._json_chunks(doc, row=doc.metadata["row"]))
+                else:
+                    chunks.extend(self._text_chunks(doc))
+                continue
+            if group and size + len(ROW_SEPARATOR) + length > self.chunk_size:
+                flush()
+            size = length if not group else size + len(ROW_SEPARATOR) + length
+            group.append(doc)
+        flush()
+        return chunks
+
+    def _record_spans(self, text: str, records: List[Tuple[int, int, int]],
+                      row: Optional[int]) -> List[Tuple[int, int, int, int]]:
+        """Group records into (start, end, first record, last record) chunks of at most chunk_size."""
+        out: List[Tuple[int, int, int, int]] = []
+        group: Optional[List[int]] = None
+        for i, (start, value_start, end) in enumerate(records):
+            r = i if row is None else row
+            if end - start > self.chunk_size:
+                if group:
+                    out.append(tuple(group))
+                    group = None
+                nested = json_records(text, value_start)
+                if nested:
+                    out.extend(self._record_spans(text, nested, r))
+                else:
+                    out.extend((s, e, r, r) for s, e in self.spans(text[start:end], start))
+                continue
+            if group and end - group[0] > self.chunk_size:
+                out.append(tuple(group))
+                group = None
+            if group is None:
+                group = [start, end, r, r]
+            else:
+                group[1], group[3] = end, r
+        if group:
+            out.append(tuple(group))
+        return out
+
+    def _json_chunks(self, doc: Any, row: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """Chunks of a JSON document by its records (numbered from 0, or all ``row`` if given)."""
+        text = doc.page_content
+        records = json_records(text)
+        if not records:
+            return self._text_chunks(doc)
+        return [
+            (text[s:e], {**doc.metadata, "start_index": s, "end_index": e, "row": r, "row_end": r_end})
+            for s, e, r, r_end in self._record_spans(text, records, row)
+        ]
+
+    def split_documents(self, docs: List[Any]) -> List[Any]:
+        """
+        Split loaded documents into chunk Documents.
+
+        Consecutive documents with a ``row`` and otherwise equal metadata
+        (source, spreadsheet sheet) are grouped as rows; a document from a
+        ``.json`` file is split by records; any other document (e.g. one PDF
+        page) is split as text on its own.
+        """
+        from langchain_core.documents import Document
+
+        chunks: List[Tuple[str, Dict[str, Any]]] = []
+        i = 0
+        while i < len(docs):
+            doc = docs[i]
+            if doc.metadata.get("row") is not None:
+                group = _row_group(doc)
+                j = i + 1
+                while j < len(docs) and docs[j].metadata.get("row") is not None and _row_group(docs[j]) == group:
+                    j += 1
+                chunks.extend(self._row_chunks(docs[i:j]))
+                i = j
+                continue
+            if _is_json(doc):
+                chunks.extend(self._json_chunks(doc))
+            else:
+                chunks.extend(self._text_chunks(doc))
+            i += 1
+        return [Document(page_content=text, metadata=metadata) for text, metadata in chunks]
+
+
+class RecursiveChunker:
+    """LangChain's RecursiveCharacterTextSplitter, created once and recording start offsets."""
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._splitter: Any = None
+
+    def split_documents(self, docs: List[Any]) -> List[Any]:
+        if self._splitter is None:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.chunk_size, chunk_overlap=self.overlap, add_start_index=True
+            )
+        return self._splitter.split_documents(docs)
+
+
+def make_chunker(strategy: str = "structured", chunk_size: int = 1000, overlap: int = 200) -> Any:
+    """
+    Chunker for a strategy name.
+
+    Raises:
+        ValueError: For unknown strategies
+    """
+    if strategy == "structured":
+        return StructuredChunker(chunk_size, overlap)
+    if strategy == "recursive":
+        return RecursiveChunker(chunk_size, overlap)
+    raise ValueError(f"Unknown chunking strategy '{strategy}' "
+                     f"(expected one of: {', '.join(CHUNKING_STRATEGIES)})")
+
+
+def benchmark_corpora(n_rows: int = 50_000, n_pages: int = 2_000, seed: int = 0) -> Dict[str, List[List[Any]]]:
+    """
+    Synthetic corpora shaped like the loaders' output, one list of Documents per file.
+
+    Returns:
+        'text' (multi-paragraph pages), 'csv' (one Document per row, as
+        data_loader.iter_csv_rows reads them) and 'json' (one Document
+        holding a JSON array)
+    """
+    from langchain_core.documents import Document
+    from src.benchmark import synthetic_documents
+
+    rng = np.random.default_rng(seed)
+    pages_per_file, paragraphs_per_page = 20, 4
+    paragraphs = []
+    for doc in synthetic_documents(n_pages * paragraphs_per_page, seed=seed):
+        for page in doc:
+            words = page.page_content.split()
+            paragraphs.append(". ".join(" ".join(words[w:w + 15]) for w in range(0, len(words), 15)) + ".")
+    pages = [
+        "\n\n".join(paragraphs[p:p + paragraphs_per_page])
+        for p in range(0, len(paragraphs), paragraphs_per_page)
+    ]
+    text_docs = [
+        [Document(page_content=page, metadata={"source": f"synthetic/report-{f:05d}.pdf", "page": i})
+         for i, page in enumerate(pages[f:f + pages_per_file])]
+        for f in range(0, len(pages), pages_per_file)
+    ]
+
+    words = paragraphs[0].rstrip(".").split()
+    csv_rows = [
+        Document(
+            page_content=(f"id: {r}\nname: {words[r % len(words)]}\n"
+                          f"amount: {rng.integers(1, 10_000)}\nnote: {' '.join(rng.choice(words, 8))}"),
+            metadata={"source": "synthetic/export.csv", "row": r},
+        )
+        for r in range(n_rows)
+    ]
+    records = [{"id": r, "name": words[r % len(words)], "tags": list(rng.choice(words, 3)),
+                "note": " ".join(rng.choice(words, 12))} for r in range(n_rows)]
+    json_doc = Document(page_content=json.dumps(records, ensure_ascii=False),
+                        metadata={"source": "synthetic/export.json"})
+    return {"text": text_docs, "csv": [csv_rows], "json": [[json_doc]]}
+
+
+def compare_chunkers(files: List[List[Any]], chunk_size: int = 1000, overlap: int = 200,
+                     repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Chunk the same files with each strategy and compare speed and chunk sizes.
+
+    Returns:
+        One row per strategy with 'seconds' (best of ``repeat``), 'mb_per_s',
+        'speedup' over recursive, 'chunks', and 'mean_chars'/'max_chars' of the chunks
+    """
+    n_chars = sum(len(d.page_content) for docs in files for d in docs)
+    report = []
+    for strategy in ("recursive", "structured"):
+        chunker = make_chunker(strategy, chunk_size, overlap)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = [c for docs in files for c in chunker.split_documents(docs)]
+            best = min(best, time.perf_counter() - start)
+        lengths = np.array([len(c.page_content) for c in chunks]) if chunks else np.zeros(1)
+        report.append({
+            "strategy": strategy,
+            "seconds": round(best, 4),
+            "mb_per_s": round(n_chars / 1e6 / best, 2),
+            "speedup": round(report[0]["seconds"] / best, 2) if report else 1.0,
+            "chunks": len(chunks),
+            "mean_chars": round(float(lengths.mean()), 1),
+            "max_chars": int(lengths.max()),
+        })
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the structured chunker with RecursiveCharacterTextSplitter")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("benchmark", help="Throughput and chunk sizes of both strategies")
+    bench.add_argument("--files", nargs="*", default=[], help="Also compare on these files")
+    bench.add_argument("--rows", type=int, default=50_000, help="Rows in the synthetic CSV and JSON corpora")
+    bench.add_argument("--pages", type=int, default=2_000, help="Pages in the synthetic text corpus")
+    bench.add_argument("--chunk-size", type=int, default=1000)
+    bench.add_argument("--overlap", type=int, default=200)
+    bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    corpora = benchmark_corpora(args.rows, args.pages)
+    if args.files:
+        from src.data_loader import iter_uploaded_documents
+
+        errors: List[str] = []
+        corpora["files"] = list(iter_uploaded_documents(args.files, errors, max_workers=0))
+        for error in errors:
+            print(error, file=sys.stderr)
+    result = {
+        name: {
+            "documents": sum(len(docs) for docs in files),
+            "mb": round(sum(len(d.page_content) for docs in files for d in docs) / 1e6, 2),
+            "strategies": compare_chunkers(files, args.chunk_size, args.overlap, args.repeat),
+        }
+        for name, files in corpora.items() if files
+    }
+    print(json.dumps({"chunk_size": args.chunk_size, "overlap": args.overlap,
+                      "cpu_count": os.cpu_count(), "corpora": result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
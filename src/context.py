@@ -0,0 +1,181 @@
+import re
+import logging
+import threading
+from typing import List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text between neighbouring chunks that counts as splitter overlap
+MIN_OVERLAP_CHARS = 20
+
+_encoding: Any = None
+_encoding_lock = threading.Lock()
+_WORD_RE = re.compile(r"\w+")
+
+
+def _get_encoding() -> Any:
+    """The tokenizer of the default OpenAI chat models, or False if unavailable (e.g. offline)."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens as characters / 4: {str(e)}")
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of LLM tokens in a text (estimated when tiktoken cannot be loaded)."""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to at most ``max_tokens`` tokens, at a word boundary where possible."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # Leave room for the " ..." marker
+        cut = encoding.decode(tokens[:max(max_tokens - 2, 1)])
+    else:
+        if len(text) <= max_tokens * 4:
+            return text
+        cut = text[:max(max_tokens - 2, 1) * 4]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > len(cut) // 2 else cut).rstrip() + " ..."
+
+
+def merge_overlapping(first: str, second: str) -> str:
+    """
+    Join two consecutive chunks of a document, writing their shared text once.
+
+    The text splitter repeats the end of a chunk at the start of the next;
+    the longest suffix of ``first`` that is a prefix of ``second`` is dropped
+    from ``second``. Chunks without such overlap are joined by a newline.
+    """
+    head = second[:MIN_OVERLAP_CHARS]
+    if len(head) == MIN_OVERLAP_CHARS:
+        # Candidate overlaps start where the head of `second` occurs in `first`
+        pos = first.find(head)
+        while pos != -1:
+            if second.startswith(first[pos:]):
+                return first + second[len(first) - pos:]
+            pos = first.find(head, pos + 1)
+    return first + "\n" + second
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _similarity(a: set, b: set) -> float:
+    """How much of the smaller passage is contained in the other (word 3-gram overlap)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class ContextBuilder:
+    """
+    Turn ranked search results into a compact prompt context.
+
+    Results that are consecutive chunks of the same document are merged
+    into one passage with their overlapping text written once; passages
+    whose wording is mostly contained in a more relevant passage are
+    dropped. The remaining passages are added by relevance until
+    ``max_tokens`` is reached; the first passage is truncated rather than
+    dropped if it alone exceeds the budget.
+    """
+
+    def __init__(self, max_tokens: int = 2000, dedup_threshold: float = 0.8):
+        """
+        Args:
+            max_tokens: Token budget for the context
+            dedup_threshold: Word 3-gram containment above which a passage
+                counts as a near-duplicate of a more relevant one
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+
+    def _passages(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge consecutive chunks of a document; passages keep their best rank."""
+        ranked = [{**r, "rank": i} for i, r in enumerate(results) if r["text"].strip()]
+        by_position = sorted(
+            ranked, key=lambda r: (r.get("doc_id") is None, r.get("doc_id") or "", r.get("chunk_id", r["rank"]))
+        )
+        passages: List[Dict[str, Any]] = []
+        for r in by_position:
+            last = passages[-1] if passages else None
+            if (last is not None and r.get("doc_id") is not None and r.get("doc_id") == last["doc_id"]
+                    and r.get("chunk_id") == last["last_chunk_id"] + 1):
+                last["text"] = merge_overlapping(last["text"], r["text"])
+                last["last_chunk_id"] = r["chunk_id"]
+                last["results"].append(r)
+                last["rank"] = min(last["rank"], r["rank"])
+            else:
+                passages.append({"text": r["text"], "doc_id": r.get("doc_id"), "rank": r["rank"],
+                                 "last_chunk_id": r.get("chunk_id", -1), "results": [r]})
+        passages.sort(key=lambda p: p["rank"])
+        return passages
+
+    def build(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Assemble the context from results ordered best first.
+
+        Returns:
+            Dictionary with 'context' (passages separated by blank lines),
+            'passages' (each with 'text', 'tokens' and the 'results' it
+            covers), 'context_tokens', and the counts of 'merged' chunks,
+            'duplicates' dropped and passages 'truncated' or 'skipped' for
+            the budget
+        """
+        stats = {"merged": 0, "duplicates": 0, "truncated": 0, "skipped": 0}
+        kept: List[Dict[str, Any]] = []
+        kept_shingles: List[set] = []
+        for passage in self._passages(results):
+            stats["merged"] += len(passage["results"]) - 1
+            shingles = _shingles(passage["text"])
+            if any(_similarity(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                stats["duplicates"] += 1
+                continue
+            kept.append(passage)
+            kept_shingles.append(shingles)
+
+        separator_tokens = count_tokens("\n\n")
+        used: List[Dict[str, Any]] = []
+        total = 0
+        for passage in kept:
+            tokens = count_tokens(passage["text"])
+            cost = tokens + (separator_tokens if used else 0)
+            if total + cost > self.max_tokens:
+                if used:
+                    # A smaller, less relevant passage may still fit
+                    stats["skipped"] += 1
+                    continue
+                passage["text"] = truncate_to_tokens(passage["text"], self.max_tokens)
+                tokens = cost = count_tokens(passage["text"])
+                stats["truncated"] += 1
+            passage["tokens"] = tokens
+            used.append(passage)
+            total += cost
+
+        return {
+            "context": "\n\n".join(p["text"] for p in used),
+            "passages": used,
+            "context_tokens": total,
+            **stats,
+        }
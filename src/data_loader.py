@@ -1,22 +1,368 @@
-import logging
 import os
+import re
+import csv
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import List, Any, Tuple
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    CSVLoader,
-    Docx2txtLoader,
-    JSONLoader
-)
-from langchain_community.document_loaders.excel import UnstructuredExcelLoader
+from typing import List, Any, Dict, Tuple, Iterator, Optional, Set, Callable
 
 logger = logging.getLogger(__name__)
 
-def load_uploaded_documents(paths: List[str]) -> Tuple[List[Any], List[str]]:
+# PDF/DOCX parsing is CPU-bound, so files are parsed in worker processes
+DEFAULT_LOAD_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+# CSV, XLSX and JSON files are read incrementally instead, and indexed in
+# parts of at most this many rows (or records) and about this many characters
+STREAM_PART_ROWS = 10_000
+STREAM_PART_CHARS = 4_000_000
+# Bytes read from a JSON file at a time (more while a single record is incomplete)
+JSON_READ_SIZE = 1 << 20
+# A JSON value ending this close to the end of the buffer may continue after it
+_JSON_LOOKAHEAD = 32
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def get_loaders() -> Dict[str, Callable[[str], Any]]:
+    """
+    Document loader factory per file extension.
+
+    langchain_community takes seconds to import, so it is imported on the
+    first call rather than with this module; call this ahead of time to
+    move that cost out of the first upload.
+    """
+    from langchain_community.document_loaders import (
+        PyPDFLoader,
+        TextLoader,
+        Docx2txtLoader,
+    )
+    from langchain_community.document_loaders.excel import UnstructuredExcelLoader
+
+    # .csv, .xlsx and .json are streamed (see get_stream_readers)
+    return {
+        ".pdf": PyPDFLoader,
+        ".txt": TextLoader,
+        ".xls": UnstructuredExcelLoader,
+        ".docx": Docx2txtLoader,
+    }
+
+
+def _row_text(header: List[str], values: Any) -> str:
+    """One row as "column: value" lines, like LangChain's CSVLoader; empty cells are left out."""
+    lines = []
+    for i, value in enumerate(values):
+        if value is None or value == "":
+            continue
+        name = header[i] if i < len(header) else f"column_{i + 1}"
+        lines.append(f"{name}: {str(value).strip()}")
+    return "\n".join(lines)
+
+
+def iter_csv_rows(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Text and metadata ('row', 0-based after the header) of each row of a CSV file."""
+    with open(path, "r", newline="", encoding="utf-8-sig", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [h.strip() or f"column_{i + 1}" for i, h in enumerate(header)]
+        for row, values in enumerate(reader):
+            text = _row_text(header, values)
+            if text:
+                yield text, {"row": row}
+
+
+def iter_xlsx_rows(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Text and metadata ('sheet', 'row' 0-based after the sheet's header) of each spreadsheet row."""
+    from openpyxl import load_workbook
+
+    # read_only parses rows as they are iterated instead of building the whole sheet
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            header = [str(h).strip() if h is not None else f"column_{i + 1}" for i, h in enumerate(header)]
+            for row, values in enumerate(rows):
+                text = _row_text(header, values)
+                if text:
+                    yield text, {"sheet": sheet.title, "row": row}
+    finally:
+        workbook.close()
+
+
+class _JsonStream:
+    """Incremental reader of JSON values from a text file, holding only unread data."""
+
+    def __init__(self, f: Any):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read_more(self) -> bool:
+        if self.eof:
+            return False
+        # Read at least as much as is buffered, so a huge value is re-parsed O(log n) times
+        data = self.f.read(max(JSON_READ_SIZE, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the file), without consuming it."""
+        while True:
+            self.pos = _JSON_WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._read_more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        """Consume the next non-whitespace character, which must be one of ``chars``."""
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON, found {c or 'end of file'!r}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        """Decode the next JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if self.eof or end < len(self.buf) - _JSON_LOOKAHEAD:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                incomplete = e.pos >= len(self.buf) - _JSON_LOOKAHEAD or e.msg.startswith("Unterminated")
+                if self.eof or not incomplete:
+                    raise ValueError(f"Invalid JSON: {e.msg}") from e
+            self._read_more()
+
+
+def iter_json_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Text and metadata ('row', the record number) of each record of a JSON file.
+
+    The records of a top-level array are its elements, those of an object
+    its members; any other top-level value (a string, number, ...) is a
+    single record. Records are returned as compact JSON (strings as they
+    are) and read one at a time, so the file is never fully in memory.
+
+    Raises:
+        ValueError: For empty files and malformed JSON
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        if stream.peek() not in ("[", "{"):
+            record = stream.value()
+            if stream.peek():
+                raise ValueError("Invalid JSON: Extra data after the top-level value")
+            text = record if isinstance(record, str) else json.dumps(record, ensure_ascii=False)
+            yield text, {"row": 0}
+            return
+        opening = stream.expect("[{")
+        closing = "]" if opening == "[" else "}"
+        if stream.peek() == closing:
+            return
+        row = 0
+        while True:
+            if opening == "{":
+                key = stream.value()
+                stream.expect(":")
+                record = {key: stream.value()}
+            else:
+                record = stream.value()
+            text = record if isinstance(record, str) else json.dumps(record, ensure_ascii=False)
+            yield text, {"row": row}
+            row += 1
+            if stream.expect("," + closing) == closing:
+                return
+
+
+def get_stream_readers() -> Dict[str, Callable[[str], Iterator[Tuple[str, Dict[str, Any]]]]]:
+    """Incremental row/record reader per file extension."""
+    return {".csv": iter_csv_rows, ".xlsx": iter_xlsx_rows, ".json": iter_json_records}
+
+
+def iter_file_parts(path: str) -> Iterator[List[Any]]:
+    """
+    Read a CSV, XLSX or JSON file incrementally, in parts of row Documents.
+
+    Each part holds up to STREAM_PART_ROWS rows and about STREAM_PART_CHARS
+    characters, so memory does not grow with the file. Rows carry
+    'source', 'row' and 'part' metadata (XLSX rows also 'sheet'); every
+    part is indexed as its own piece of the file's document.
+    """
+    from langchain_core.documents import Document
+
+    reader = get_stream_readers()[Path(path).suffix.lower()]
+    docs: List[Any] = []
+    part, chars = 0, 0
+    for text, metadata in reader(path):
+        docs.append(Document(page_content=text, metadata={"source": path, **metadata, "part": part}))
+        chars += len(text)
+        if len(docs) >= STREAM_PART_ROWS or chars >= STREAM_PART_CHARS:
+            yield docs
+            docs, part, chars = [], part + 1, 0
+    if docs:
+        yield docs
+
+
+def _load_file(p: str) -> Tuple[str, List[Any], Optional[str]]:
+    """
+    Load a single file. Runs in a worker process, so it never raises.
+
+    Returns:
+        Tuple of (path, documents, error_message or None)
+    """
+    if not os.path.exists(p):
+        error_msg = f"File not found: {p}"
+        logger.warning(error_msg)
+        return p, [], error_msg
+
+    ext = Path(p).suffix.lower()
+
+    try:
+        factory = get_loaders().get(ext)
+        if factory is None:
+            error_msg = f"Unsupported file type: {ext} for {p}"
+            logger.warning(error_msg)
+            return p, [], error_msg
+
+        loaded_docs = factory(p).load()
+        logger.info(f"Successfully loaded {len(loaded_docs)} documents from {p}")
+        return p, loaded_docs, None
+
+    except Exception as e:
+        error_msg = f"Error loading {p}: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        return p, [], error_msg
+
+
+def _stream_file(p: str, errors: List[str], completed: Dict[str, int]) -> Iterator[List[Any]]:
+    """
+    Yield the parts of one streamed file and record in ``completed`` how many there were.
+
+    A file that fails partway is recorded with the parts read before the
+    error, so the caller can drop the rest of its previous version instead
+    of leaving old and new parts mixed. One that fails before its first
+    part is not recorded and keeps its previous version.
+    """
+    if not os.path.exists(p):
+        error_msg = f"File not found: {p}"
+        logger.warning(error_msg)
+        errors.append(error_msg)
+        return
+    parts = 0
+    try:
+        for docs in iter_file_parts(p):
+            parts += 1
+            yield docs
+    except Exception as e:
+        error_msg = f"Error loading {p}: {str(e)}"
+        if parts:
+            error_msg += f" (kept the {parts} parts read before the error)"
+            completed[p] = parts
+        logger.error(error_msg, exc_info=True)
+        errors.append(error_msg)
+        return
+    completed[p] = parts
+    logger.info(f"Successfully streamed {p} in {parts} parts")
+
+
+def iter_uploaded_documents(paths: List[str], errors: Optional[List[str]] = None,
+                            max_workers: Optional[int] = None,
+                            completed: Optional[Dict[str, int]] = None) -> Iterator[List[Any]]:
+    """
+    Load files concurrently, yielding each file's documents as soon as it is parsed.
+
+    Files are yielded in completion order, not input order. At most
+    ``2 * max_workers`` files are in flight, so parsed-but-unconsumed
+    documents stay bounded however many paths are passed. CSV, XLSX and
+    JSON files are read incrementally in the calling process after the
+    others and yielded in parts (see iter_file_parts), however large.
+
+    Args:
+        paths: File paths to load
+        errors: List that per-file error messages are appended to
+        max_workers: Worker processes; 0 or 1 loads in the calling process
+        completed: Dictionary that each streamed file is added to with its
+            number of parts; a file that failed partway has the parts read
+            before the error, one that failed before any part is left out
+
+    Yields:
+        The list of documents loaded from one file (e.g. one per PDF page),
+        or one part of a streamed file
+    """
+    if errors is None:
+        errors = []
+    if completed is None:
+        completed = {}
+    readers = get_stream_readers()
+    streamed = [p for p in paths if Path(p).suffix.lower() in readers]
+    yield from _iter_parsed([p for p in paths if Path(p).suffix.lower() not in readers], errors, max_workers)
+    for p in streamed:
+        yield from _stream_file(p, errors, completed)
+
+
+def _iter_parsed(paths: List[str], errors: List[str], max_workers: Optional[int]) -> Iterator[List[Any]]:
+    """Parse files in worker processes, yielding each file's documents as it completes."""
+    if not paths:
+        return
+    workers = DEFAULT_LOAD_WORKERS if max_workers is None else max_workers
+    workers = min(workers, len(paths))
+
+    if workers <= 1:
+        for p in paths:
+            _, docs, error = _load_file(p)
+            if error:
+                errors.append(error)
+            elif docs:
+                yield docs
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Set[Future] = set()
+        remaining = iter(paths)
+        max_in_flight = 2 * workers
+
+        def submit_next() -> bool:
+            p = next(remaining, None)
+            if p is None:
+                return False
+            pending.add(pool.submit(_load_file, p))
+            return True
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                submit_next()
+                try:
+                    _, docs, error = future.result()
+                except Exception as e:
+                    # Worker crashed (e.g. killed); the per-file handler never ran
+                    docs, error = [], f"Error loading file: {str(e)}"
+                    logger.error(error, exc_info=True)
+                if error:
+                    errors.append(error)
+                elif docs:
+                    yield docs
+
+
+def load_uploaded_documents(paths: List[str], max_workers: Optional[int] = None) -> Tuple[List[Any], List[str]]:
     """
     Load documents from file paths with error handling.
-    
+
     Returns:
         Tuple of (documents, error_messages) where error_messages contains
         any files that failed to load.
@@ -24,43 +370,7 @@ def load_uploaded_documents(paths: List[str]) -> Tuple[List[Any], List[str]]:
     documents = []
     errors = []
 
-    for p in paths:
-        if not os.path.exists(p):
-            error_msg = f"File not found: {p}"
-            logger.warning(error_msg)
-            errors.append(error_msg)
-            continue
-
-        ext = Path(p).suffix.lower()
-        loader = None
-
-        try:
-            if ext == ".pdf":
-                loader = PyPDFLoader(p)
-            elif ext == ".txt":
-                loader = TextLoader(p)
-            elif ext == ".csv":
-                loader = CSVLoader(p)
-            elif ext in [".xlsx", ".xls"]:
-                loader = UnstructuredExcelLoader(p)
-            elif ext == ".docx":
-                loader = Docx2txtLoader(p)
-            elif ext == ".json":
-                loader = JSONLoader(p, jq_schema=".", text_content=False)
-            else:
-                error_msg = f"Unsupported file type: {ext} for {p}"
-                logger.warning(error_msg)
-                errors.append(error_msg)
-                continue
-
-            if loader:
-                loaded_docs = loader.load()
-                documents.extend(loaded_docs)
-                logger.info(f"Successfully loaded {len(loaded_docs)} documents from {p}")
-
-        except Exception as e:
-            error_msg = f"Error loading {p}: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            errors.append(error_msg)
+    for docs in iter_uploaded_documents(paths, errors, max_workers=max_workers):
+        documents.extend(docs)
 
     return documents, errors
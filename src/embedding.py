@@ -1,48 +1,110 @@
 import logging
-from typing import List, Any
+from typing import List, Any, Dict, Optional, Iterator
 import numpy as np
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+from src.registry import get_embedding_model
+from src.embedding_cache import EmbeddingCache
+from src.embedding_backends import cache_model_name
+from src.chunking import make_chunker
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_EMBED_BATCH_SIZE = 64
+
 class EmbeddingPipeline:
-    def __init__(self, model: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, overlap: int = 200):
+    def __init__(self, model: str = "all-MiniLM-L6-v2", chunk_size: int = 1000, overlap: int = 200,
+                 cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = DEFAULT_EMBED_BATCH_SIZE, backend: str = "torch",
+                 threads: Optional[int] = None, chunking: str = "structured"):
         """
         Initialize the embedding pipeline.
         
         Args:
-            model: SentenceTransformer model name
+            model: SentenceTransformer model name (shared process-wide,
+                loaded on first use)
             chunk_size: Size of text chunks
             overlap: Overlap between chunks
+            cache: Optional persistent cache; only cache misses are encoded
+            batch_size: Texts per encode call; bounds the model's working memory
+            backend: "torch", "onnx" or "onnx-int8" (see embedding_backends)
+            threads: CPU threads per encode call (None: the runtime's default)
+            chunking: "structured" (rows, JSON records and pages) or
+                "recursive" (LangChain's splitter); see src.chunking
         """
-        self.model = SentenceTransformer(model)
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.model_name = model
+        self.backend = backend
+        self.threads = threads
+        # int8 vectors are cached apart from fp32 ones
+        self.cache_model = cache_model_name(model, backend)
+        self._model: Any = None
         self.chunk_size = chunk_size
         self.overlap = overlap
-        logger.info(f"Initialized EmbeddingPipeline with model: {model}")
+        self.chunker = make_chunker(chunking, chunk_size, overlap)
+        self.cache = cache
+        self.batch_size = batch_size
+        self._dim: Optional[int] = None
+        logger.info(f"Initialized EmbeddingPipeline with model: {model} ({backend})")
+
+    @property
+    def model(self) -> Any:
+        """The shared SentenceTransformer, loaded on first access."""
+        if self._model is None:
+            self._model = get_embedding_model(self.model_name, self.backend, self.threads)
+        return self._model
 
     def chunk(self, docs: List[Any]) -> List[Any]:
         """
         Split documents into chunks.
         
         Args:
-            docs: List of documents to chunk
+            docs: List of documents to chunk (e.g. the pages or rows of one file)
             
         Returns:
-            List of document chunks
+            List of document chunks with their character offsets and page/row
         """
         if not docs:
             logger.warning("Empty document list provided for chunking")
             return []
         
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.overlap
-        )
-        chunks = splitter.split_documents(docs)
+        chunks = self.chunker.split_documents(docs)
         logger.info(f"Split {len(docs)} documents into {len(chunks)} chunks")
         return chunks
 
+    def _batches(self, texts: List[str]) -> Iterator[np.ndarray]:
+        """
+        Yield index arrays of micro-batches, shortest texts first.
+
+        Batching texts of similar length keeps the tokenizer from padding
+        short chunks up to the longest one in the batch. Character length
+        is used as a cheap stand-in for token length.
+        """
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        for start in range(0, len(order), self.batch_size):
+            yield order[start:start + self.batch_size]
+
+    def _encode_into(self, texts: List[str], out: np.ndarray, rows: np.ndarray) -> None:
+        """
+        Encode texts batch by batch, writing text i's vector to ``out[rows[i]]``.
+
+        Peak memory is the preallocated result plus one batch, however many
+        texts there are. Each batch is added to the cache as it completes.
+        """
+        for idx in self._batches(texts):
+            batch = [texts[i] for i in idx]
+            vecs = self.model.encode(batch, batch_size=len(batch), convert_to_numpy=True)
+            out[rows[idx]] = vecs
+            if self.cache is not None:
+                self.cache.put_many(self.cache_model, batch, vecs)
+
+    def dimension(self) -> int:
+        """Embedding dimension of the model."""
+        if self._dim is None:
+            self._dim = self.model.get_sentence_embedding_dimension()
+            if not self._dim:
+                self._dim = int(self.model.encode([""]).shape[1])
+        return self._dim
+
     def embed(self, chunks: List[Any]) -> np.ndarray:
         """
         Generate embeddings for document chunks.
@@ -59,8 +121,31 @@ class EmbeddingPipeline:
         
         try:
             texts = [c.page_content for c in chunks]
-            emb = self.model.encode(texts).astype("float32")
-            logger.debug(f"Generated embeddings for {len(chunks)} chunks")
+            # Filled batch by batch; no per-batch arrays are kept around
+            emb = np.empty((len(texts), self.dimension()), dtype=np.float32)
+            if self.cache is None:
+                self._encode_into(texts, emb, np.arange(len(texts)))
+                logger.debug(f"Generated embeddings for {len(chunks)} chunks")
+                return emb
+
+            miss_idx = []
+            for i, v in enumerate(self.cache.get_many(self.cache_model, texts)):
+                if v is None:
+                    miss_idx.append(i)
+                else:
+                    emb[i] = v
+
+            if miss_idx:
+                # Duplicate texts within one upload are encoded once
+                first: Dict[str, int] = {}
+                for i in miss_idx:
+                    first.setdefault(texts[i], i)
+                self._encode_into(list(first), emb, np.fromiter(first.values(), dtype=np.int64))
+                for i in miss_idx:
+                    emb[i] = emb[first[texts[i]]]
+
+            logger.debug(f"Generated embeddings for {len(chunks)} chunks "
+                         f"({len(chunks) - len(miss_idx)} from cache)")
             return emb
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}", exc_info=True)
@@ -0,0 +1,181 @@
+"""
+Embedding model backends: PyTorch, ONNX Runtime, and int8-quantized ONNX.
+
+All backends load the same sentence-transformers model and expose the same
+``encode`` API, so EmbeddingPipeline and the vector store do not change:
+
+    torch      PyTorch in fp32 (default)
+    onnx       the model exported to ONNX, run by ONNX Runtime on the CPU;
+               numerically equivalent to torch
+    onnx-int8  ONNX with dynamically int8-quantized weights; fastest on CPU,
+               vectors differ slightly from fp32
+
+Check a backend against torch on your own machine before switching:
+
+    python -m src.embedding_backends check --backends onnx onnx-int8
+
+The ONNX backends need ``pip install "sentence-transformers[onnx]"``.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Where int8 models are exported to (once per model and CPU instruction set)
+ONNX_EXPORT_DIR = os.getenv("EMBEDDING_ONNX_DIR", "embedding_models")
+# Smallest cosine similarity to torch fp32 vectors at which a backend's
+# vectors are treated as interchangeable with them
+MIN_COSINE = 0.98
+
+
+def quantization_config() -> str:
+    """ONNX Runtime dynamic quantization preset for this CPU: arm64, avx512_vnni or avx2."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    return "avx512_vnni" if "avx512_vnni" in flags else "avx2"
+
+
+def cache_model_name(model: str, backend: str) -> str:
+    """Model name under which embeddings are cached; int8 vectors are kept apart from fp32 ones."""
+    return f"{model}@{backend}" if backend == "onnx-int8" else model
+
+
+def _onnx_kwargs(threads: Optional[int], file_name: Optional[str] = None) -> Dict[str, Any]:
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    kwargs: Dict[str, Any] = {"provider": "CPUExecutionProvider", "session_options": options}
+    if file_name:
+        kwargs["file_name"] = file_name
+    return kwargs
+
+
+def load_model(model: str, backend: str = "torch", threads: Optional[int] = None) -> Any:
+    """
+    Load a SentenceTransformer on the given backend.
+
+    Args:
+        model: sentence-transformers model name or path
+        backend: One of BACKENDS
+        threads: CPU threads per encode call (None: the runtime's default)
+
+    Raises:
+        ValueError: For unknown backends
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected one of: {', '.join(BACKENDS)})")
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model)
+
+    if backend == "onnx":
+        return SentenceTransformer(model, backend="onnx", model_kwargs=_onnx_kwargs(threads))
+
+    config = quantization_config()
+    file_name = f"onnx/model_qint8_{config}.onnx"
+    local_dir = os.path.join(ONNX_EXPORT_DIR, model.replace("/", "__"))
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        start = time.perf_counter()
+        fp32 = SentenceTransformer(model, backend="onnx", model_kwargs=_onnx_kwargs(threads))
+        fp32.save(local_dir)
+        export_dynamic_quantized_onnx_model(fp32, config, local_dir)
+        logger.info(f"Exported int8 ONNX model ({config}) to {local_dir} in {time.perf_counter() - start:.1f}s")
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs=_onnx_kwargs(threads, file_name))
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each row of ``a`` with the same row of ``b``."""
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return np.einsum("ij,ij->i", a, b)
+
+
+def compare_backends(model: str, texts: List[str], backends: List[str], threads: Optional[int] = None,
+                     batch_size: int = 64, k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Encode the same texts on each backend and compare with torch.
+
+    Returns:
+        One row per backend (torch first) with 'texts_per_s', the 'min_cosine'
+        and 'mean_cosine' to the torch vectors, 'recall_at_k' of torch's
+        nearest neighbours (texts as queries against themselves), and
+        'compatible' (min_cosine >= MIN_COSINE)
+    """
+    report = []
+    reference: Optional[np.ndarray] = None
+    reference_neighbours: Optional[np.ndarray] = None
+    k = min(k, len(texts) - 1)
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        encoder = load_model(model, backend, threads)
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+        start = time.perf_counter()
+        vectors = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        sims = normalized @ normalized.T
+        np.fill_diagonal(sims, -np.inf)
+        neighbours = np.argsort(-sims, axis=1)[:, :k]
+        if reference is None:
+            reference, reference_neighbours = vectors, neighbours
+        cos = cosine_rows(vectors, reference)
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbours, reference_neighbours)])
+        report.append({
+            "backend": backend,
+            "texts_per_s": round(len(texts) / elapsed, 1),
+            "speedup": round(report[0]["seconds"] / elapsed, 2) if report else 1.0,
+            "seconds": round(elapsed, 3),
+            "min_cosine": round(float(cos.min()), 5),
+            "mean_cosine": round(float(cos.mean()), 5),
+            "recall_at_k": round(float(recall), 4),
+            "compatible": bool(cos.min() >= MIN_COSINE),
+        })
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare embedding backends with PyTorch")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("check", help="Speed and numerical agreement of each backend with torch")
+    check.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    check.add_argument("--backends", nargs="+", choices=BACKENDS, default=["onnx", "onnx-int8"])
+    check.add_argument("--texts", type=int, default=2000, help="Synthetic texts to encode")
+    check.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    from src.benchmark import synthetic_documents
+
+    texts = [page.page_content for pages in synthetic_documents(args.texts, words_per_chunk=60)
+             for page in pages]
+    report = compare_backends(args.model, texts, args.backends, threads=args.threads)
+    print(json.dumps({"model": args.model, "quantization": quantization_config(),
+                      "min_cosine_required": MIN_COSINE, "backends": report}, indent=2))
+    # Non-zero exit if any backend's vectors are not interchangeable with torch's
+    sys.exit(0 if all(row["compatible"] for row in report) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import re
+import time
+import asyncio
+from typing import List, Dict, Iterator, AsyncIterator
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeChatModel:
+    """
+    Offline stand-in for ChatOpenAI: ``invoke``, ``stream`` and their async versions.
+
+    The answer quotes the start of the retrieved context, so it is
+    deterministic and visibly grounded. ``first_token_s`` and ``token_s``
+    simulate model latency, which makes streaming and time-to-first-token
+    measurable without network access.
+    """
+
+    def __init__(self, first_token_s: float = 0.0, token_s: float = 0.0, max_words: int = 40):
+        """
+        Args:
+            first_token_s: Delay before the first token
+            token_s: Delay between subsequent tokens
+            max_words: Number of context words quoted in the answer
+        """
+        self.first_token_s = first_token_s
+        self.token_s = token_s
+        self.max_words = max_words
+
+    def _answer(self, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"]
+        context = prompt.split("Context:\n", 1)[-1].split("\n\nQuestion:\n", 1)[0]
+        words = context.split()[:self.max_words]
+        if not words:
+            return "The context doesn't contain enough information to answer."
+        return "Based on the context: " + " ".join(words)
+
+    def _tokens(self, messages: List[Dict[str, str]]) -> List[str]:
+        # Word-sized tokens, keeping the whitespace so the pieces join back exactly
+        return re.findall(r"\s*\S+", self._answer(messages))
+
+    def invoke(self, messages: List[Dict[str, str]]) -> AIMessage:
+        if self.first_token_s:
+            time.sleep(self.first_token_s)
+        answer = self._answer(messages)
+        if self.token_s:
+            time.sleep(self.token_s * len(answer.split()))
+        return AIMessage(content=answer)
+
+    async def ainvoke(self, messages: List[Dict[str, str]]) -> AIMessage:
+        if self.first_token_s:
+            await asyncio.sleep(self.first_token_s)
+        answer = self._answer(messages)
+        if self.token_s:
+            await asyncio.sleep(self.token_s * len(answer.split()))
+        return AIMessage(content=answer)
+
+    def stream(self, messages: List[Dict[str, str]]) -> Iterator[AIMessageChunk]:
+        if self.first_token_s:
+            time.sleep(self.first_token_s)
+        for i, token in enumerate(self._tokens(messages)):
+            if i and self.token_s:
+                time.sleep(self.token_s)
+            yield AIMessageChunk(content=token)
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[AIMessageChunk]:
+        if self.first_token_s:
+            await asyncio.sleep(self.first_token_s)
+        for i, token in enumerate(self._tokens(messages)):
+            if i and self.token_s:
+                await asyncio.sleep(self.token_s)
+            yield AIMessageChunk(content=token)
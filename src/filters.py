@@ -0,0 +1,134 @@
+import os
+import json
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+# Filterable fields of a document entry, and per-chunk columns kept by each segment
+DOCUMENT_FIELDS = ("doc_id", "source", "file_type")
+CHUNK_COLUMNS = ("page", "row", "row_end")
+# Filterable chunk columns; a chunk of grouped rows matches every row from `row` to `row_end`
+CHUNK_FIELDS = ("page", "row")
+# Range conditions on the document's indexing time (Unix seconds)
+TIME_FIELDS = ("indexed_after", "indexed_before")
+
+# Stored in chunk columns when a loader gives no page/row number
+MISSING = -1
+
+
+def file_type(source: str) -> str:
+    """Lowercase file extension without the dot, e.g. 'pdf'; '' if there is none."""
+    return os.path.splitext(source)[1].lower().lstrip(".")
+
+
+def chunk_column_value(metadata: Dict[str, Any], column: str) -> int:
+    """Integer value of a chunk column from loader metadata, or MISSING."""
+    value = metadata.get(column)
+    try:
+        return int(value) if value is not None else MISSING
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def normalize_filter(filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Validate a metadata filter and bring it into canonical form.
+
+    A filter maps fields to the values they must have; all conditions must
+    hold. ``doc_id``, ``source`` and ``file_type`` take a string or a list
+    of strings, ``page`` and ``row`` an integer or a list of integers, and
+    ``indexed_after`` / ``indexed_before`` a Unix timestamp. For example
+    ``{"file_type": ["pdf", "docx"], "page": [0, 1]}``.
+
+    Returns:
+        The filter with list values sorted and deduplicated, or None if empty
+
+    Raises:
+        ValueError: On unknown fields or values of the wrong type
+    """
+    if not filter:
+        return None
+    if not isinstance(filter, dict):
+        raise ValueError("Filter must be a dictionary of field: value(s)")
+
+    normalized: Dict[str, Any] = {}
+    for field, value in filter.items():
+        if field in TIME_FIELDS:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Filter field '{field}' must be a Unix timestamp")
+            normalized[field] = float(value)
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if field in DOCUMENT_FIELDS:
+            if not all(isinstance(v, str) for v in values):
+                raise ValueError(f"Filter field '{field}' takes strings")
+            if field == "file_type":
+                values = [v.lower().lstrip(".") for v in values]
+            elif field == "source":
+                values = [os.path.normpath(v) for v in values]
+        elif field in CHUNK_FIELDS:
+            if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                raise ValueError(f"Filter field '{field}' takes integers")
+        else:
+            known = ", ".join(DOCUMENT_FIELDS + CHUNK_FIELDS + TIME_FIELDS)
+            raise ValueError(f"Unknown filter field '{field}' (expected one of: {known})")
+        normalized[field] = sorted(set(values))
+    return normalized
+
+
+def filter_key(filter: Optional[Dict[str, Any]]) -> str:
+    """Stable string for a normalized filter, e.g. to key cached answers."""
+    return json.dumps(filter, sort_keys=True) if filter else ""
+
+
+def matches_document(doc: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """True if a document entry satisfies the document-level conditions of a normalized filter."""
+    for field in DOCUMENT_FIELDS:
+        if field in filter:
+            value = doc.get(field, "")
+            if field == "source":
+                value = os.path.normpath(value) if value else ""
+            if value not in filter[field]:
+                return False
+    indexed_at = doc.get("indexed_at")
+    if "indexed_after" in filter and (indexed_at is None or indexed_at < filter["indexed_after"]):
+        return False
+    if "indexed_before" in filter and (indexed_at is None or indexed_at >= filter["indexed_before"]):
+        return False
+    return True
+
+
+def chunk_mask(columns: Dict[str, np.ndarray], filter: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Rows of one segment satisfying the chunk-level conditions of a normalized filter.
+
+    Returns:
+        Boolean array over the segment's rows, or None if the filter has no chunk conditions
+    """
+    mask = None
+    for column in CHUNK_FIELDS:
+        if column in filter:
+            values = np.array(filter[column], dtype=np.int64)
+            if column == "row":
+                hit = _row_range_hit(np.asarray(columns["row"]), np.asarray(columns["row_end"]), values)
+            else:
+                hit = np.isin(columns[column], values)
+            mask = hit if mask is None else mask & hit
+    return mask
+
+
+def _row_range_hit(rows: np.ndarray, row_ends: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Rows whose [row, row_end] range holds one of the sorted ``values``."""
+    ends = np.where(row_ends == MISSING, rows, row_ends)
+    # The smallest wanted value at or after each chunk's first row
+    i = np.searchsorted(values, rows)
+    hit = (i < len(values)) & (rows != MISSING)
+    hit[hit] = values[i[hit]] <= ends[hit]
+    return hit
+
+
+def chunk_columns(chunks: List[Any]) -> Dict[str, np.ndarray]:
+    """Columnar chunk metadata (one int32 array per column) from chunk Documents."""
+    return {
+        column: np.array([chunk_column_value(c.metadata, column) for c in chunks], dtype=np.int32)
+        for column in CHUNK_COLUMNS
+    }
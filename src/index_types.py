@@ -0,0 +1,393 @@
+import time
+import logging
+import faiss
+import numpy as np
+from typing import List, Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "pq", "binary")
+# Compressed codes without a coarse quantizer; scanned exhaustively like flat
+QUANTIZED_TYPES = ("sq8", "pq", "binary")
+# Candidates fetched per requested result before exact re-ranking, by index type
+DEFAULT_RERANK = {"pq": 4, "binary": 10}
+
+
+class IndexSpec:
+    """
+    Configuration for the FAISS index built for each segment.
+
+    Segments smaller than ``train_threshold`` always use an exact
+    ``IndexFlatIP``; approximate indexes only pay off (and can only be
+    trained well) once there is enough data. When compaction produces a
+    segment at or above the threshold, it is built with the configured
+    type instead, which migrates the store from flat to ANN transparently.
+
+    The quantized types trade accuracy for memory: ``sq8`` stores one byte
+    per dimension (4x smaller than float32), ``pq`` ``pq_m`` bytes per
+    vector, and ``binary`` one bit per dimension (32x smaller). Their
+    segments keep the float vectors on disk (memory-mapped), so a search
+    can fetch ``rerank`` times more candidates and re-score them exactly.
+    """
+
+    def __init__(
+        self,
+        kind: str = "flat",
+        train_threshold: int = 100_000,
+        train_sample_size: int = 100_000,
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        pq_m: Optional[int] = None,
+        pq_bits: int = 8,
+        rerank: Optional[int] = None,
+    ):
+        """
+        Args:
+            kind: One of "flat", "hnsw", "ivf_flat", "ivf_pq", "sq8", "pq", "binary"
+            train_threshold: Minimum segment size for building an ANN index
+            train_sample_size: Maximum number of vectors used for IVF/PQ training
+            hnsw_m: HNSW graph degree
+            ef_construction: HNSW build-time beam width
+            ef_search: HNSW query-time beam width
+            nlist: Number of IVF lists (default: ~4 * sqrt(n))
+            nprobe: Number of IVF lists scanned per query
+            pq_m: PQ sub-quantizers, must divide the dimension (default: dim / 8)
+            pq_bits: Bits per PQ code
+            rerank: Candidates per result re-scored with the float vectors;
+                1 disables re-ranking (default: 4 for pq, 10 for binary, else 1)
+        """
+        if kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {kind}. Expected one of {INDEX_TYPES}")
+        self.kind = kind
+        self.train_threshold = train_threshold
+        self.train_sample_size = train_sample_size
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.rerank = rerank
+
+    def __repr__(self) -> str:
+        return f"IndexSpec(kind={self.kind!r}, train_threshold={self.train_threshold})"
+
+    def wants_ann(self, n: int) -> bool:
+        """Return True if a segment of n rows should get an approximate index."""
+        if self.kind in ("pq", "ivf_pq") and n < 2 ** self.pq_bits:
+            # Too few vectors to train the PQ codebooks
+            return False
+        return self.kind != "flat" and n >= self.train_threshold
+
+    def target_kind(self, n: int) -> str:
+        """Index type a segment of n rows should be built with."""
+        return self.kind if self.wants_ann(n) else "flat"
+
+    def rerank_factor(self, index: Any) -> int:
+        """Candidates fetched per result for an index of this type (1 = no re-ranking)."""
+        kind = index_kind(index)
+        if self.rerank is not None and kind not in ("flat", "other"):
+            return max(1, self.rerank)
+        return DEFAULT_RERANK.get(kind, 1)
+
+    def _nlist_for(self, n: int, n_train: int) -> int:
+        nlist = self.nlist or int(4 * np.sqrt(n))
+        # FAISS wants roughly 39+ training points per centroid
+        return max(1, min(nlist, n_train // 39))
+
+    def _pq_m_for(self, dim: int) -> int:
+        if self.pq_m:
+            if dim % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} does not divide dimension {dim}")
+            return self.pq_m
+        m = max(1, dim // 8)
+        while dim % m:
+            m -= 1
+        return m
+
+    def build(self, vectors: np.ndarray, ids: Optional[np.ndarray] = None) -> Any:
+        """
+        Build (and train, if needed) an index holding the given normalized vectors.
+
+        With ``ids`` the index is wrapped in ``IndexIDMap2`` so searches
+        return those ids instead of row positions.
+        """
+        index = self._empty_index(vectors)
+        if isinstance(index, faiss.IndexBinary):
+            codes = binary_codes(vectors)
+            if ids is None:
+                index.add(codes)
+                return index
+            mapped = faiss.IndexBinaryIDMap2(index)
+            mapped.add_with_ids(codes, np.ascontiguousarray(ids, dtype=np.int64))
+            return mapped
+        if ids is None:
+            index.add(vectors)
+            return index
+        mapped = faiss.IndexIDMap2(index)
+        mapped.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+        return mapped
+
+    def _empty_index(self, vectors: np.ndarray) -> Any:
+        """Create an empty index of the right type, trained on the vectors if needed."""
+        n, dim = vectors.shape
+        if not self.wants_ann(n):
+            return faiss.IndexFlatIP(dim)
+
+        if self.kind == "binary":
+            if dim % 8:
+                raise ValueError(f"Binary index needs a dimension divisible by 8, got {dim}")
+            # Sign bits need no training
+            return faiss.IndexBinaryFlat(dim)
+        if self.kind == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.ef_construction
+        else:
+            rng = np.random.default_rng(0)
+            n_train = min(n, self.train_sample_size)
+            sample = vectors[np.sort(rng.choice(n, n_train, replace=False))]
+            nlist = self._nlist_for(n, n_train)
+            if self.kind == "sq8":
+                factory = "SQ8"
+            elif self.kind == "pq":
+                factory = f"PQ{self._pq_m_for(dim)}x{self.pq_bits}"
+            elif self.kind == "ivf_flat":
+                factory = f"IVF{nlist},Flat"
+            else:
+                factory = f"IVF{nlist},PQ{self._pq_m_for(dim)}x{self.pq_bits}"
+            index = faiss.index_factory(dim, factory, faiss.METRIC_INNER_PRODUCT)
+            start = time.perf_counter()
+            index.train(np.ascontiguousarray(sample))
+            logger.info(f"Trained {factory} on {n_train} vectors in {time.perf_counter() - start:.1f}s")
+
+        return index
+
+    def search_params(self, index: faiss.Index,
+                      sel: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+        """Return per-query search parameters matching the index type, if any."""
+        inner = unwrap(index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=self.ef_search, sel=sel)
+        if isinstance(inner, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=sel)
+        if sel is not None and accepts_selector(index):
+            return faiss.SearchParameters(sel=sel)
+        return None
+
+    def search(self, index: Any, q: np.ndarray, k: int, sel: Optional[faiss.IDSelector] = None,
+               vectors: Optional[np.ndarray] = None, ids: Optional[np.ndarray] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search an index built by this spec, returning (inner-product scores, ids).
+
+        Args:
+            index: Index from build(), possibly binary
+            q: Normalized float32 queries
+            k: Results per query
+            sel: Restricts the searched ids
+            vectors: Float vectors of the indexed rows, for exact re-ranking
+            ids: Ascending ids of those rows (default: row numbers)
+            allowed: Bool array over ids, True for those ``sel`` admits;
+                required with ``sel`` for index types that reject selectors
+
+        Raises:
+            ValueError: If such an index gets ``sel`` without ``allowed``
+        """
+        factor = self.rerank_factor(index) if vectors is not None else 1
+        n_fetch = min(k * factor, index.ntotal)
+        if sel is not None and not accepts_selector(index):
+            if allowed is None:
+                raise ValueError(f"{type(unwrap(index)).__name__} cannot take an ID selector; "
+                                 f"pass the allowed ids instead")
+            D, I = self._search_selected(index, q, n_fetch, allowed)
+        else:
+            D, I = self._search(index, q, n_fetch, self.search_params(index, sel))
+        if factor == 1:
+            return D, I
+        return rerank(q, I, vectors, ids, k)
+
+    def _search(self, index: Any, q: np.ndarray, k: int,
+                params: Optional[faiss.SearchParameters]) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(unwrap(index), faiss.IndexBinary):
+            D, I = index.search(binary_codes(q), k, params=params)
+            # Hamming distance to an estimate of the cosine between the vectors
+            return np.cos(np.pi * D.astype(np.float32) / index.d), I
+        return index.search(q, k, params=params)
+
+    def _search_selected(self, index: Any, q: np.ndarray, k: int,
+                         allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search an index that rejects ID selectors: over-fetch, then drop ids
+        not in ``allowed``, fetching more until every query has k or the
+        whole index was scanned.
+        """
+        out_D = np.full((len(q), k), -np.inf, dtype=np.float32)
+        out_I = np.full((len(q), k), -1, dtype=np.int64)
+        if index.ntotal == 0 or k == 0:
+            return out_D, out_I
+        n = k
+        while True:
+            n = min(n * 4, index.ntotal)
+            D, I = self._search(index, q, n, self.search_params(index))
+            keep = (I >= 0) & allowed[I.clip(0)]
+            if n == index.ntotal or keep.sum(axis=1).min() >= k:
+                break
+        # Kept candidates first, each row still in score order
+        order = np.argsort(~keep, axis=1, kind="stable")[:, :k]
+        kept = np.take_along_axis(keep, order, axis=1)
+        width = order.shape[1]
+        out_D[:, :width] = np.where(kept, np.take_along_axis(D, order, axis=1), -np.inf)
+        out_I[:, :width] = np.where(kept, np.take_along_axis(I, order, axis=1), -1)
+        return out_D, out_I
+
+
+def binary_codes(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed into bytes."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def rerank(q: np.ndarray, I: np.ndarray, vectors: np.ndarray, ids: Optional[np.ndarray],
+           k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Re-score candidate ids (-1 = none) with exact inner products and keep the top k."""
+    valid = I >= 0
+    rows = np.where(valid, I, 0) if ids is None else np.searchsorted(ids, np.where(valid, I, ids[0]))
+    # Gather each needed row once; memory-mapped vectors then read only those pages
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    candidates = np.asarray(vectors[unique_rows], dtype=np.float32)[inverse.reshape(rows.shape)]
+    scores = np.einsum("qd,qnd->qn", q, candidates)
+    scores[~valid] = -np.inf
+    order = np.argsort(-scores, axis=1)[:, :k]
+    D = np.take_along_axis(scores, order, axis=1)
+    I = np.where(np.isfinite(D), np.take_along_axis(I, order, axis=1), -1)
+    return D.astype(np.float32), I
+
+
+def unwrap(index: Any) -> Any:
+    """Return the underlying index of an IndexIDMap/IndexIDMap2, downcast to its type."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexBinaryIDMap):
+        return faiss.downcast_IndexBinary(index.index)
+    return index
+
+
+def accepts_selector(index: Any) -> bool:
+    """Whether FAISS can restrict searches of this index with an ID selector (IndexPQ cannot)."""
+    return not isinstance(unwrap(index), faiss.IndexPQ)
+
+
+def is_flat(index: Any) -> bool:
+    return isinstance(unwrap(index), faiss.IndexFlat)
+
+
+def index_kind(index: Any) -> str:
+    """The INDEX_TYPES name of a built index, or "other"."""
+    inner = unwrap(index)
+    if isinstance(inner, faiss.IndexBinaryFlat):
+        return "binary"
+    if isinstance(inner, faiss.IndexFlat):
+        return "flat"
+    if isinstance(inner, faiss.IndexHNSWFlat):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq8"
+    if isinstance(inner, faiss.IndexPQ):
+        return "pq"
+    return "other"
+
+
+def index_bytes(index: Any) -> int:
+    """Serialized size of an index, about the memory it occupies when loaded."""
+    if isinstance(unwrap(index), faiss.IndexBinary):
+        return int(faiss.serialize_index_binary(index).nbytes)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def write_index(index: Any, path: str) -> None:
+    if isinstance(unwrap(index), faiss.IndexBinary):
+        faiss.write_index_binary(index, path)
+    else:
+        faiss.write_index(index, path)
+
+
+def read_index(path: str, flags: int = 0) -> Any:
+    """Read a float or binary index; binary index files start with the fourcc "IB"."""
+    with open(path, "rb") as f:
+        binary = f.read(2) == b"IB"
+    if binary:
+        return faiss.read_index_binary(path, flags)
+    return faiss.read_index(path, flags)
+
+
+def evaluate_index(vectors: np.ndarray, specs: List[IndexSpec], k: int = 10,
+                   n_queries: int = 200) -> List[Dict[str, Any]]:
+    """
+    Compare index types against the exact flat index on the same vectors.
+
+    Queries are a random sample of the stored vectors themselves, which
+    matches the distribution real queries see after normalization.
+
+    Args:
+        vectors: Normalized float32 vectors to index
+        specs: Index configurations to evaluate (train_threshold is ignored)
+        k: Number of neighbours for recall@k
+        n_queries: Number of sampled queries
+
+    Returns:
+        One dict per spec (flat baseline first) with recall, latency, build
+        time, index memory and its compression against flat. Quantized types
+        are measured with their re-ranking, which reads the float vectors
+        from disk rather than memory.
+    """
+    n = vectors.shape[0]
+    if n == 0:
+        raise ValueError("Cannot evaluate index types on an empty store")
+    k = min(k, n)
+    rng = np.random.default_rng(1)
+    queries = np.ascontiguousarray(vectors[rng.choice(n, min(n_queries, n), replace=False)])
+
+    def run(label: str, spec: IndexSpec) -> Dict[str, Any]:
+        start = time.perf_counter()
+        index = spec.build(vectors)
+        build_s = time.perf_counter() - start
+        latencies = []
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        for i, q in enumerate(queries):
+            t = time.perf_counter()
+            _, I = spec.search(index, q[None, :], k, vectors=vectors)
+            latencies.append((time.perf_counter() - t) * 1000)
+            ids[i] = I[0]
+        size = index_bytes(index)
+        return {
+            "index": label,
+            "build_s": round(build_s, 3),
+            "memory_mb": round(size / 1e6, 3),
+            "bytes_per_vector": round(size / n, 1),
+            "rerank": spec.rerank_factor(index),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+            "ids": ids,
+        }
+
+    baseline = run("flat", IndexSpec("flat"))
+    report = [baseline]
+    for spec in specs:
+        # Force the ANN build regardless of the configured threshold
+        forced = IndexSpec(**{**vars(spec), "train_threshold": 0})
+        report.append(run(spec.kind, forced))
+
+    exact = baseline["ids"]
+    for row in report:
+        row["compression"] = round(baseline["memory_mb"] / row["memory_mb"], 2) if row["memory_mb"] else None
+        hits = sum(len(set(a) & set(b)) for a, b in zip(row.pop("ids"), exact))
+        row["recall_at_k"] = round(hits / exact.size, 4)
+        row["k"] = k
+    return report
@@ -0,0 +1,268 @@
+import time
+import queue
+import logging
+import threading
+from typing import List, Any, Dict, Optional, Callable
+from src.data_loader import iter_uploaded_documents
+from src.metrics import metrics
+from src.vectorstore import FaissVectorStore, group_by_source
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output; one per consumer worker
+_DONE = object()
+# How often blocked queue operations re-check whether another stage failed
+_POLL_S = 0.1
+
+
+class _Stage:
+    """Per-stage counters: items processed and time spent working (not waiting)."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_s += seconds
+        metrics.observe("rag_ingest_stage_seconds", seconds, stage=self.name)
+
+    def report(self, elapsed_s: float) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_s": round(self.busy_s, 3),
+            # Throughput while working, and share of wall time the stage was busy
+            "items_per_s": round(self.items / self.busy_s, 1) if self.busy_s else 0.0,
+            "utilization": round(self.busy_s / (elapsed_s * self.workers), 3) if elapsed_s else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """
+    Streams files through load -> chunk -> embed -> add with bounded queues.
+
+    Each stage runs in its own thread(s) and hands work to the next through
+    a ``queue.Queue`` of at most ``queue_size`` items, so a slow stage (usually
+    embedding) blocks the ones before it instead of letting parsed documents
+    and chunks pile up in memory. Loading still parses files in worker
+    processes; chunks are embedded in batches of about ``embed_batch_size``
+    and written to the store as one segment per batch. CSV, XLSX and JSON
+    files are read and indexed in parts, so memory stays flat however
+    large they are.
+    """
+
+    def __init__(self, store: FaissVectorStore, load_workers: Optional[int] = None,
+                 chunk_workers: int = 2, embed_batch_size: int = 512, queue_size: int = 4):
+        """
+        Args:
+            store: Vector store that chunks, embeds and persists documents
+            load_workers: Loader processes (default: data_loader.DEFAULT_LOAD_WORKERS)
+            chunk_workers: Threads splitting loaded files into chunks
+            embed_batch_size: Chunks to accumulate before each embedding call
+            queue_size: Maximum items waiting between two stages
+        """
+        if chunk_workers < 1:
+            raise ValueError("chunk_workers must be at least 1")
+        if embed_batch_size < 1:
+            raise ValueError("embed_batch_size must be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.store = store
+        self.load_workers = load_workers
+        self.chunk_workers = chunk_workers
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+
+    def run(self, paths: List[str]) -> Dict[str, Any]:
+        """
+        Index the given files.
+
+        Returns:
+            Dictionary with 'doc_count' (files loaded), 'pages' (pages, rows
+            or records loaded from them), 'parts' (pieces streamed files
+            were read in), 'errors' (list),
+            per-file (or, for streamed files, per-part) 'added', 'replaced'
+            and 'unchanged' counts, new 'chunks',
+            'elapsed_s' and per-stage throughput under 'stages'
+        """
+        if not paths:
+            raise ValueError("No file paths provided")
+
+        stages = {
+            # Loading is driven by one thread; parsing happens in worker processes
+            "load": _Stage("load", 1),
+            "chunk": _Stage("chunk", self.chunk_workers),
+            "embed": _Stage("embed", 1),
+            "add": _Stage("add", 1),
+        }
+        loaded_q: queue.Queue = queue.Queue(self.queue_size)
+        chunked_q: queue.Queue = queue.Queue(self.queue_size)
+        embedded_q: queue.Queue = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        failures: List[BaseException] = []
+        errors: List[str] = []
+        # Streamed files with the number of parts read (up to an error, if any)
+        completed: Dict[str, int] = {}
+        totals = {"doc_count": 0, "pages": 0, "parts": 0, "added": 0, "replaced": 0, "unchanged": 0,
+                  "chunks": 0}
+        sources = set()
+
+        def put(q: queue.Queue, item: Any) -> None:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=_POLL_S)
+                    return
+                except queue.Full:
+                    continue
+
+        def get(q: queue.Queue) -> Any:
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=_POLL_S)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def guarded(fn: Callable[[], None]) -> Callable[[], None]:
+            def target() -> None:
+                try:
+                    fn()
+                except BaseException as e:
+                    failures.append(e)
+                    stop.set()
+            return target
+
+        def load() -> None:
+            docs_iter = iter_uploaded_documents(paths, errors, max_workers=self.load_workers,
+                                                completed=completed)
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    docs = next(docs_iter, None)
+                    if docs is None:
+                        break
+                    stages["load"].record(1, time.perf_counter() - start)
+                    put(loaded_q, docs)
+            finally:
+                # Shuts the loader's process pool down if we stopped early
+                docs_iter.close()
+                for _ in range(self.chunk_workers):
+                    put(loaded_q, _DONE)
+
+        chunkers_left = [self.chunk_workers]
+        chunkers_lock = threading.Lock()
+
+        def chunk() -> None:
+            try:
+                while True:
+                    docs = get(loaded_q)
+                    if docs is _DONE:
+                        return
+                    start = time.perf_counter()
+                    groups = group_by_source(docs)
+                    pending, unchanged = self.store.plan_upsert(groups)
+                    pending = self.store.chunk_pending(pending)
+                    with chunkers_lock:
+                        sources.update(groups)
+                        totals["pages"] += len(docs)
+                        totals["parts"] += docs[0].metadata.get("part") is not None
+                        totals["unchanged"] += unchanged
+                    stages["chunk"].record(len(docs), time.perf_counter() - start)
+                    if pending:
+                        put(chunked_q, pending)
+            finally:
+                # The last chunker to finish tells the embed stage
+                with chunkers_lock:
+                    chunkers_left[0] -= 1
+                    last = chunkers_left[0] == 0
+                if last:
+                    put(chunked_q, _DONE)
+
+        def embed() -> None:
+            batch: List[Any] = []
+            n_chunks = 0
+
+            def flush() -> None:
+                start = time.perf_counter()
+                emb = self.store.embed_pending(batch)
+                stages["embed"].record(len(emb), time.perf_counter() - start)
+                put(embedded_q, (list(batch), emb))
+
+            try:
+                while True:
+                    pending = get(chunked_q)
+                    if pending is _DONE:
+                        break
+                    for doc in pending:
+                        if not doc[3]:
+                            # Nothing to embed; write_pending counts it as unchanged
+                            with chunkers_lock:
+                                totals["unchanged"] += 1
+                            continue
+                        batch.append(doc)
+                        n_chunks += len(doc[3])
+                        if n_chunks >= self.embed_batch_size:
+                            flush()
+                            batch, n_chunks = [], 0
+                if batch and not stop.is_set():
+                    flush()
+            finally:
+                put(embedded_q, _DONE)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=guarded(load), name="ingest-load", daemon=True)]
+        threads += [
+            threading.Thread(target=guarded(chunk), name=f"ingest-chunk-{i}", daemon=True)
+            for i in range(self.chunk_workers)
+        ]
+        threads.append(threading.Thread(target=guarded(embed), name="ingest-embed", daemon=True))
+        for t in threads:
+            t.start()
+
+        try:
+            # The add stage runs in the calling thread
+            while True:
+                item = get(embedded_q)
+                if item is _DONE:
+                    break
+                pending, emb = item
+                t0 = time.perf_counter()
+                stats = self.store.write_pending(pending, emb)
+                stages["add"].record(stats["chunks"], time.perf_counter() - t0)
+                for key in ("added", "replaced", "unchanged", "chunks"):
+                    totals[key] += stats[key]
+        except BaseException as e:
+            failures.append(e)
+            stop.set()
+        finally:
+            for t in threads:
+                t.join()
+
+        if failures:
+            logger.error(f"Ingestion pipeline failed: {str(failures[0])}")
+            raise failures[0]
+        totals["doc_count"] = len(sources)
+
+        # Only now are all parts written; drop the ones a shrunk file no longer has,
+        # and for a file that failed partway the old parts after the new ones
+        for source, parts in completed.items():
+            self.store.prune_parts(source, parts)
+
+        elapsed = time.perf_counter() - start
+        result = {
+            **totals,
+            "errors": errors,
+            "elapsed_s": round(elapsed, 3),
+            "stages": {name: s.report(elapsed) for name, s in stages.items()},
+        }
+        logger.info(
+            f"Ingested {len(paths)} files in {elapsed:.2f}s: {totals['added']} added, "
+            f"{totals['replaced']} replaced, {totals['unchanged']} unchanged, "
+            f"{totals['chunks']} chunks"
+        )
+        return result
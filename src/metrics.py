@@ -0,0 +1,211 @@
+"""
+Process-wide latency histograms and counters for the query and ingestion hot paths.
+
+Query stages (``encode``, ``search``, ``rerank``, ``context``, ``llm``,
+``ttft``, ``total``) are recorded under ``rag_query_stage_seconds``,
+ingestion stages (``load``, ``chunk``, ``embed``, ``add``, ``save``) under
+``rag_ingest_stage_seconds``. ``render_prometheus`` formats everything in
+the Prometheus text exposition format, e.g. for ``GET /metrics``.
+
+With ``METRICS_ENABLED=false`` every recording call returns immediately
+and ``timer`` hands out a shared no-op context manager.
+"""
+import os
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Histogram bucket upper bounds in seconds, from a cached lookup to a long LLM answer
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent observations kept per histogram for exact percentiles in snapshot()
+RECENT_OBSERVATIONS = 1000
+
+HELP = {
+    "rag_query_stage_seconds": "Time spent in each stage of answering a question",
+    "rag_ingest_stage_seconds": "Time spent in each ingestion stage per batch",
+    "rag_queries_total": "Questions answered, by outcome",
+    "rag_prompt_tokens_total": "Prompt tokens sent to the LLM",
+    "rag_context_tokens_total": "Retrieved-context tokens sent to the LLM",
+    "rag_completion_tokens_total": "Answer tokens generated by the LLM",
+    "rag_ingested_chunks_total": "Chunks written to the index",
+    "rag_warm_up_seconds": "Time taken by each startup warm-up step",
+}
+
+_NULL_TIMER = nullcontext()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: deque = deque(maxlen=RECENT_OBSERVATIONS)
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+
+class Metrics:
+    """Thread-safe registry of labelled counters and latency histograms."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Add ``value`` to a counter."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record one duration in a histogram."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name: str, **labels: str) -> Any:
+        """Context manager recording the duration of its block in a histogram."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed(name, labels)
+
+    @contextmanager
+    def _timed(self, name: str, labels: Dict[str, str]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current values for display.
+
+        Returns:
+            Dictionary with 'counters' (name -> {label string: value}) and
+            'histograms' (name -> {label string: count, mean_ms, p50_ms,
+            p95_ms, p99_ms}); percentiles cover the most recent observations
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (h.count, h.sum, sorted(h.recent)) for key, h in self._histograms.items()}
+
+        result: Dict[str, Any] = {"counters": {}, "histograms": {}}
+        for (name, labels), value in sorted(counters.items()):
+            result["counters"].setdefault(name, {})[_label_string(labels)] = value
+        for (name, labels), (count, total, recent) in sorted(histograms.items()):
+            result["histograms"].setdefault(name, {})[_label_string(labels)] = {
+                "count": count,
+                "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+                **{f"p{p}_ms": round(_percentile(recent, p) * 1000, 2) for p in (50, 95, 99)},
+            }
+        return result
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        All counters and histograms in the Prometheus text format.
+
+        Args:
+            gauges: Extra point-in-time values (e.g. index size, cache hit
+                rates) exported as gauges under their own names
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.buckets), h.count, h.sum)) for key, h in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        declared = set()
+
+        def declare(name: str, kind: str) -> None:
+            if name not in declared:
+                declared.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (buckets, count, total) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, value in sorted((gauges or {}).items()):
+            declare(name, "gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_string(labels: Labels) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def flatten_stats(stats: Dict[str, Any], prefix: str = "rag") -> Dict[str, float]:
+    """Numeric leaves of a nested stats dictionary as gauge names, e.g. rag_answer_cache_hit_rate."""
+    gauges: Dict[str, float] = {}
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            gauges.update(flatten_stats(value, name))
+        elif isinstance(value, (int, float)):
+            gauges[name] = float(value)
+    return gauges
+
+
+# Shared by every store, pipeline and RAGSearch in the process
+metrics = Metrics(enabled=METRICS_ENABLED)
@@ -0,0 +1,140 @@
+"""
+Compare quantized index types on a store's own vectors, and migrate a store to one.
+
+    python -m src.quantize report  --store-dir faiss_store
+    python -m src.quantize migrate --store-dir faiss_store --index-type sq8
+
+``report`` prints JSON with memory per vector, compression against flat
+float32, recall@k and latency for each index type; it never modifies the
+store. ``migrate`` rewrites every segment whose index type differs from
+the requested one (including stores still in the single ``faiss.index``
+layout, which are converted first). Stop processes that write to the store
+before migrating; read-only query workers pick up the result on their own.
+Alternatively, start the app with ``FAISS_INDEX_TYPE`` set and background
+compaction migrates segments as they are loaded.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import faiss
+import numpy as np
+from typing import List, Any, Dict, Optional
+from src.index_types import IndexSpec, INDEX_TYPES, QUANTIZED_TYPES, evaluate_index, index_kind
+from src.segments import SegmentStorage, LEGACY_INDEX_FILE, MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+
+def store_vectors(store_dir: str, max_vectors: int = 1_000_000) -> np.ndarray:
+    """Read up to ``max_vectors`` live vectors of a store without modifying it."""
+    if os.path.exists(os.path.join(store_dir, MANIFEST_FILE)):
+        storage = SegmentStorage(store_dir, use_mmap=True, read_only=True)
+        parts, remaining = [], max_vectors
+        for seg in storage.load():
+            if remaining <= 0:
+                break
+            live = ~storage.tombstones.mask(seg.ids)
+            parts.append(np.asarray(seg.vectors(), dtype=np.float32)[live][:remaining])
+            remaining -= parts[-1].shape[0]
+        if not parts:
+            raise ValueError(f"Store {store_dir} is empty")
+        return np.vstack(parts)
+
+    legacy_path = os.path.join(store_dir, LEGACY_INDEX_FILE)
+    if os.path.exists(legacy_path):
+        index = faiss.read_index(legacy_path)
+        return index.reconstruct_n(0, min(index.ntotal, max_vectors))
+    raise FileNotFoundError(f"No vector store found in {store_dir}")
+
+
+def quantization_report(vectors: np.ndarray, kinds: List[str], k: int = 10, n_queries: int = 200,
+                        rerank: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Memory and recall of each index type on the given vectors, flat first.
+
+    Args:
+        vectors: Normalized float32 vectors, e.g. from store_vectors()
+        kinds: Index types to compare against flat
+        k: Number of neighbours for recall@k
+        n_queries: Number of sampled queries
+        rerank: Re-ranking factor for all types (default: per type)
+    """
+    specs = [IndexSpec(kind, rerank=rerank) for kind in kinds if kind != "flat"]
+    report = evaluate_index(vectors, specs, k=k, n_queries=n_queries)
+    for row in report:
+        row["recall_loss"] = round(1.0 - row["recall_at_k"], 4)
+    return report
+
+
+def migrate_store(store_dir: str, spec: IndexSpec) -> Dict[str, Any]:
+    """
+    Rewrite every segment whose index type is not what ``spec`` wants for its size.
+
+    Each segment is rewritten and committed on its own, so an interrupted
+    migration leaves a consistent store that a rerun continues.
+
+    Returns:
+        Counts of 'segments' rewritten and 'vectors' re-encoded, and 'seconds'
+    """
+    start = time.perf_counter()
+    storage = SegmentStorage(store_dir, spec=spec)
+    segments = storage.load()
+    rewritten, vectors = 0, 0
+    for seg in list(segments):
+        if index_kind(seg.index) == spec.target_kind(seg.count):
+            continue
+        merged = storage.merge(storage.allocate_name(), [seg])
+        segments = [s for s in segments if s is not seg] + ([merged] if merged is not None else [])
+        storage.tombstones.prune(segments)
+        storage.commit(segments, data_changed=False)
+        storage.delete_segment_files(seg.name)
+        rewritten += 1
+        vectors += merged.count if merged is not None else 0
+        logger.info(f"Rewrote {seg.name} as {merged.name if merged else 'nothing'} "
+                    f"({spec.target_kind(seg.count)})")
+    return {"segments": rewritten, "vectors": vectors,
+            "seconds": round(time.perf_counter() - start, 3)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Quantized index report and migration")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    report = sub.add_parser("report", help="Compare memory and recall of index types")
+    report.add_argument("--store-dir", default="faiss_store")
+    report.add_argument("--index-types", nargs="+", choices=INDEX_TYPES,
+                        default=list(QUANTIZED_TYPES))
+    report.add_argument("--k", type=int, default=10)
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--max-vectors", type=int, default=1_000_000)
+    report.add_argument("--rerank", type=int, default=None)
+
+    migrate = sub.add_parser("migrate", help="Rewrite the store's segments with another index type")
+    migrate.add_argument("--store-dir", default="faiss_store")
+    migrate.add_argument("--index-type", choices=INDEX_TYPES, required=True)
+    migrate.add_argument("--train-threshold", type=int,
+                         default=int(os.getenv("FAISS_TRAIN_THRESHOLD", "100000")),
+                         help="Smallest segment that gets the new type; smaller ones stay flat. "
+                              "Use the app's FAISS_TRAIN_THRESHOLD, or compaction converts them back")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+
+    if args.command == "report":
+        vectors = store_vectors(args.store_dir, args.max_vectors)
+        result: Any = {
+            "vectors": int(vectors.shape[0]),
+            "dimension": int(vectors.shape[1]),
+            "index_types": quantization_report(vectors, args.index_types, k=args.k,
+                                               n_queries=args.queries, rerank=args.rerank),
+        }
+    else:
+        spec = IndexSpec(args.index_type, train_threshold=args.train_threshold)
+        result = migrate_store(args.store_dir, spec)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
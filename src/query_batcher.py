@@ -0,0 +1,105 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Any, Dict, Optional, Tuple
+import numpy as np
+from src.vectorstore import FaissVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent queries into batched encode and search calls.
+
+    Callers block in ``query()`` while a single worker thread collects
+    requests for up to ``window_ms`` after the first one arrives (or until
+    ``max_batch`` are waiting), encodes them in one forward pass and runs
+    one multi-row search per segment for each ``top_k`` in the batch, so
+    every caller gets exactly what a direct query returns. While a batch is being processed,
+    new requests queue up and form the next batch, so batches grow with
+    load and an idle system adds at most ``window_ms`` of latency.
+    """
+
+    def __init__(self, store: FaissVectorStore, max_batch: int = 32, window_ms: float = 2.0):
+        """
+        Args:
+            store: Vector store to encode and search with
+            max_batch: Maximum queries per batch
+            window_ms: How long to wait for more queries after the first one
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.store = store
+        self.max_batch = max_batch
+        self.window_s = window_ms / 1000.0
+        self.batches = 0
+        self.queries = 0
+
+        self._requests: "queue.Queue[Tuple[str, int, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, text: str, top_k: int = 5) -> Future:
+        """Queue a query; the future resolves to (normalized embedding (1, dim), results)."""
+        if not self.store.segments:
+            raise ValueError("Index not initialized. Please load or add documents first.")
+        if not text or not text.strip():
+            raise ValueError("Query text cannot be empty")
+        if top_k <= 0:
+            raise ValueError("top_k must be positive")
+        future: Future = Future()
+        self._requests.put((text, top_k, future))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._worker.start()
+        return future
+
+    def query(self, text: str, top_k: int = 5) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Encode and search one query as part of a batch; blocks until done."""
+        return self.submit(text, top_k).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+        }
+
+    def _collect(self) -> List[Tuple[str, int, Future]]:
+        batch = [self._requests.get()]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0
+                             else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                texts = [text for text, _, _ in batch]
+                q = self.store.encode_queries(texts)
+                # One search per distinct k: hybrid fusion and quantized re-ranking depend on
+                # how many candidates are fetched, so a prefix of a larger k could differ
+                rows_by_k: Dict[int, List[int]] = {}
+                for row, (_, k, _) in enumerate(batch):
+                    rows_by_k.setdefault(k, []).append(row)
+                for k, rows in rows_by_k.items():
+                    results = self.store.query_vectors(q[rows], k, texts=[texts[r] for r in rows])
+                    for row, row_results in zip(rows, results):
+                        batch[row][2].set_result((q[row:row + 1], row_results))
+            except Exception as e:
+                logger.error(f"Batched query failed: {str(e)}", exc_info=True)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.queries += len(batch)
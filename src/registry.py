@@ -0,0 +1,236 @@
+import time
+import logging
+import shutil
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Tuple, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# Process-wide caches shared by every Streamlit session / RAGSearch instance
+_models: Dict[Any, Any] = {}
+# One lock per model, so loading a model (seconds) does not block the rest of the registry
+_model_locks: Dict[Any, threading.Lock] = {}
+_stores: Dict[Tuple[str, str], Any] = {}
+_caches: Dict[Any, Any] = {}
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_registry_lock = threading.Lock()
+
+
+class ReadWriteLock:
+    """
+    Lock allowing many concurrent readers or a single writer.
+
+    Writers are preferred: once a writer is waiting, new readers block
+    until it has finished, so a stream of queries cannot starve indexing.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read_lock(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write_lock(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+def _load_model(key: Any, load: Callable[[], Any]) -> Any:
+    """Return the shared model under ``key``, calling ``load`` once if it is missing."""
+    with _registry_lock:
+        instance = _models.get(key)
+        if instance is not None:
+            return instance
+        lock = _model_locks.setdefault(key, threading.Lock())
+    with lock:
+        with _registry_lock:
+            instance = _models.get(key)
+        if instance is None:
+            instance = load()
+            with _registry_lock:
+                _models[key] = instance
+        return instance
+
+
+def get_embedding_model(model: str, backend: str = "torch", threads: Optional[int] = None) -> Any:
+    """
+    Return the process-wide SentenceTransformer for a model name and backend.
+
+    The model is loaded once on first use and shared afterwards;
+    encode() is safe to call from multiple threads. sentence-transformers
+    (and torch) are only imported here, so processes that never encode
+    do not pay for them. See embedding_backends for the backends.
+    """
+    def load() -> Any:
+        from src.embedding_backends import load_model
+
+        start = time.perf_counter()
+        instance = load_model(model, backend, threads)
+        logger.info(f"Loaded shared embedding model: {model} ({backend}) "
+                    f"in {time.perf_counter() - start:.1f}s")
+        return instance
+
+    return _load_model(model if backend == "torch" else (model, backend), load)
+
+
+def register_embedding_model(model: str, instance: Any) -> None:
+    """
+    Use a preloaded model object for a model name.
+
+    Anything with SentenceTransformer's ``encode`` and
+    ``get_sentence_embedding_dimension`` works, e.g. an offline stand-in
+    for benchmarks.
+    """
+    with _registry_lock:
+        _models[model] = instance
+    logger.info(f"Registered embedding model: {model}")
+
+
+def get_cross_encoder(model: str) -> Any:
+    """Return the process-wide sentence-transformers CrossEncoder for a model name."""
+    def load() -> Any:
+        from sentence_transformers import CrossEncoder
+
+        instance = CrossEncoder(model)
+        logger.info(f"Loaded shared cross-encoder: {model}")
+        return instance
+
+    return _load_model(("cross-encoder", model), load)
+
+
+def get_reranker(model: str, batch_size: int = 16, budget_ms: float = 300.0,
+                 cache_max_entries: int = 10_000):
+    """Return the process-wide CrossEncoderReranker for a model name (the model loads on first use)."""
+    from src.reranker import CrossEncoderReranker
+
+    with _registry_lock:
+        reranker = _caches.get(("reranker", model))
+        if reranker is None:
+            reranker = CrossEncoderReranker(model, batch_size=batch_size, budget_ms=budget_ms,
+                                            cache_max_entries=cache_max_entries)
+            _caches[("reranker", model)] = reranker
+        return reranker
+
+
+def get_embedding_cache(path: str, max_entries: int = 500_000):
+    """Return the process-wide EmbeddingCache for a database path."""
+    from src.embedding_cache import EmbeddingCache
+
+    with _registry_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = EmbeddingCache(path, max_entries=max_entries)
+            _caches[path] = cache
+        return cache
+
+
+def get_answer_cache(path: Optional[str], max_entries: int = 1000, ttl_s: float = 86400.0,
+                     threshold: float = 0.95):
+    """Return the process-wide AnswerCache for a database path (None: in-memory only)."""
+    from src.answer_cache import AnswerCache
+
+    with _registry_lock:
+        cache = _caches.get(("answers", path))
+        if cache is None:
+            cache = AnswerCache(path, max_entries=max_entries, ttl_s=ttl_s, threshold=threshold)
+            _caches[("answers", path)] = cache
+        return cache
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """
+    Return the process-wide thread pool with the given name.
+
+    Shared pools bound how much CPU work async callers can run at once,
+    however many sessions or event loops submit to them.
+    """
+    with _registry_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
+
+
+def get_query_batcher(store: Any, max_batch: int = 32, window_ms: float = 2.0):
+    """Return the process-wide QueryBatcher for a vector store."""
+    from src.query_batcher import QueryBatcher
+
+    with _registry_lock:
+        batcher = _caches.get(("batcher", id(store)))
+        if batcher is None:
+            batcher = QueryBatcher(store, max_batch=max_batch, window_ms=window_ms)
+            _caches[("batcher", id(store))] = batcher
+        return batcher
+
+
+def get_vector_store(persist_dir: str, model: str = "all-MiniLM-L6-v2", **store_options):
+    """
+    Return the process-wide FaissVectorStore for a persist directory.
+
+    On first access the store is created with ``store_options`` and any
+    existing index on disk is loaded, so later callers get a ready-to-query
+    store immediately. Options passed by later callers are ignored.
+    """
+    from src.vectorstore import FaissVectorStore
+
+    key = (persist_dir, model)
+    with _registry_lock:
+        store = _stores.get(key)
+        if store is not None:
+            return store
+
+    # Build outside the registry lock; model loading takes seconds
+    store = FaissVectorStore(persist_dir=persist_dir, model=model, **store_options)
+    if store.exists():
+        try:
+            store.load()
+            logger.info("Loaded existing vector store")
+        except Exception as e:
+            logger.warning(f"Failed to load existing index: {str(e)}")
+        # Not caught: serving or extending a store with mismatched embeddings corrupts results
+        store.check_embedding_compatibility()
+
+    with _registry_lock:
+        # Another thread may have won the race while we were loading
+        return _stores.setdefault(key, store)
+
+
+def reset_vector_store(persist_dir: str) -> None:
+    """Clear every shared store for a persist directory, on disk and in memory."""
+    with _registry_lock:
+        stores = [s for (d, _), s in _stores.items() if d == persist_dir]
+    if not stores:
+        shutil.rmtree(persist_dir, ignore_errors=True)
+    for store in stores:
+        store.clear()
+    logger.info(f"Reset shared vector store(s) for {persist_dir}")
@@ -0,0 +1,164 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Re-order search candidates by a cross-encoder's relevance score.
+
+    A cross-encoder reads the question and a chunk together, which ranks
+    far more precisely than comparing two independently computed
+    embeddings, but costs a forward pass per pair. Candidates are therefore
+    scored in batches in their vector-search order. Before every batch,
+    including the first, the time left in ``budget_ms`` is checked against
+    the measured cost per pair: batches shrink to what still fits, and
+    scoring stops when nothing does. The scored candidates are returned
+    best first, followed by the unscored rest in their original order.
+    Scores are cached per (question, chunk text), so repeated and
+    paginated questions cost nothing.
+    """
+
+    def __init__(self, model: str, batch_size: int = 16, budget_ms: float = 300.0,
+                 cache_max_entries: int = 10_000):
+        """
+        Args:
+            model: sentence-transformers CrossEncoder model name
+            batch_size: Question/chunk pairs per forward pass
+            budget_ms: Time allowed for scoring one question; 0 disables the limit
+            cache_max_entries: Cached pair scores (least recently used evicted first)
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.model_name = model
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_max_entries = cache_max_entries
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.budget_exceeded = 0
+
+        self._model: Any = None
+        # Seconds per pair in the latest batch; None until something was scored
+        self._pair_s: Optional[float] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            from src.registry import get_cross_encoder
+            self._model = get_cross_encoder(self.model_name)
+        return self._model
+
+    def load(self) -> None:
+        """Load the model now rather than on the first question, and time a batch for the budget."""
+        model = self._get_model()
+        pairs = [("warm-up question", "warm-up passage")] * self.batch_size
+        model.predict(pairs[:1], show_progress_bar=False)
+        self._predict(model, pairs)
+
+    def _predict(self, model: Any, pairs: List[Any]) -> List[float]:
+        """Score pairs in one forward pass, updating the cost per pair."""
+        start = time.perf_counter()
+        predicted = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        self._pair_s = (time.perf_counter() - start) / len(pairs)
+        return [float(s) for s in predicted]
+
+    @staticmethod
+    def _key(query: str, text: str) -> str:
+        return hashlib.sha256(f"{query}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _cached(self, keys: List[str]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            hits = sum(s is not None for s in scores)
+            self.cache_hits += hits
+            self.cache_misses += len(keys) - hits
+            return scores
+
+    def _store(self, keys: List[str], scores: List[float]) -> None:
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def score(self, query: str, texts: List[str]) -> List[Optional[float]]:
+        """
+        Cross-encoder scores for question/text pairs, in the order given.
+
+        Returns:
+            One score per text; None for texts not reached within the time budget
+        """
+        start = time.perf_counter()
+        keys = [self._key(query, t) for t in texts]
+        scores = self._cached(keys)
+        pending = [i for i, s in enumerate(scores) if s is None]
+        if not pending:
+            return scores
+
+        # Loading the model on a cold start counts against the budget too
+        model = self._get_model()
+        done = 0
+        while done < len(pending):
+            size = min(self.batch_size, len(pending) - done)
+            if self.budget_ms:
+                remaining_s = self.budget_ms / 1000 - (time.perf_counter() - start)
+                # Only as many pairs as the last measured cost says still fit
+                if self._pair_s is not None:
+                    size = min(size, int(remaining_s / self._pair_s))
+                if remaining_s <= 0 or size <= 0:
+                    self.budget_exceeded += 1
+                    logger.warning(f"Re-ranking budget of {self.budget_ms:.0f}ms reached after "
+                                   f"{done} of {len(pending)} candidates")
+                    break
+            batch = pending[done:done + size]
+            batch_scores = self._predict(model, [(query, texts[i]) for i in batch])
+            for i, s in zip(batch, batch_scores):
+                scores[i] = s
+            self._store([keys[i] for i in batch], batch_scores)
+            done += size
+        return scores
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """
+        Re-order search results by cross-encoder score and keep the best ``top_n``.
+
+        Each returned result gains 'rerank_score' (None if it was not scored
+        within the budget). If the model fails, the vector order is kept.
+        """
+        if not results:
+            return []
+        try:
+            scores = self.score(query, [r["text"] for r in results])
+        except Exception as e:
+            logger.error(f"Re-ranking failed, keeping vector order: {str(e)}", exc_info=True)
+            return [{**r, "rerank_score": None} for r in results[:top_n]]
+
+        scored = [(s, i) for i, s in enumerate(scores) if s is not None]
+        # Stable for ties: the better vector rank wins
+        scored.sort(key=lambda t: (-t[0], t[1]))
+        order = [i for _, i in scored] + [i for i, s in enumerate(scores) if s is None]
+        return [{**results[i], "rerank_score": scores[i]} for i in order[:top_n]]
+
+    def stats(self) -> Dict[str, Any]:
+        """Score cache hits and misses, and questions cut short by the time budget."""
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "cache_entries": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "budget_exceeded": self.budget_exceeded,
+            }
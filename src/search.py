@@ -1,10 +1,20 @@
 import os
+import time
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Iterator
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from src.vectorstore import FaissVectorStore
-from src.data_loader import load_uploaded_documents
+from src.registry import (
+    get_vector_store, get_embedding_cache, get_answer_cache, get_executor, get_query_batcher,
+    get_reranker
+)
+from src.index_types import IndexSpec
+from src.ingest import IngestionPipeline
+from src.answer_cache import AnswerCache
+from src.filters import normalize_filter, filter_key
+from src.context import ContextBuilder, count_tokens
+from src.metrics import metrics, flatten_stats
 
 load_dotenv()
 
@@ -12,35 +22,187 @@ logger = logging.getLogger(__name__)
 
 # Configuration constants
 FAISS_STORE_DIR = "faiss_store"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "openai", or "fake" for an offline model that streams a canned, context-quoting answer
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+# Memory-map the index and chunk texts instead of loading them into RAM
+FAISS_USE_MMAP = os.getenv("FAISS_USE_MMAP", "false").lower() in ("1", "true", "yes")
+# Index type for large segments: flat, hnsw, ivf_flat or ivf_pq, or quantized
+# storage: sq8 (int8, 4x smaller), pq, or binary (32x smaller, re-ranked)
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+# Segments with fewer rows stay exact flat indexes
+FAISS_TRAIN_THRESHOLD = int(os.getenv("FAISS_TRAIN_THRESHOLD", "100000"))
+# Candidates per result re-scored with float vectors (unset: per index type)
+FAISS_RERANK = int(os.getenv("FAISS_RERANK")) if os.getenv("FAISS_RERANK") else None
+# "hybrid" fuses vector and BM25 keyword rankings (reciprocal-rank fusion); "vector" is dense only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates each retriever contributes before fusion, and the fusion constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Token budget for retrieved context in the prompt, and word-overlap ratio above
+# which a passage is dropped as a near-duplicate of a more relevant one
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# Optional cross-encoder re-ranking: RERANK_CANDIDATES are fetched, scored in
+# batches within RERANK_BUDGET_MS (the rest keep vector order) and the best top_k kept
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "10000"))
+# Kept outside faiss_store so re-indexing after "Clear index" is still fast
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache/embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+# Chunks per encode call; smaller batches lower peak memory on large uploads
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Largest segment background compaction builds (0: no limit); a merge holds
+# its output in memory, so this bounds memory while indexing very large files
+COMPACTION_MAX_ROWS = int(os.getenv("COMPACTION_MAX_ROWS", "250000")) or None
+# "structured" chunks by rows, JSON records and pages in one pass; "recursive" is LangChain's splitter
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "structured")
+# Embedding runtime: torch, onnx (ONNX Runtime), or onnx-int8 (quantized, fastest on CPU);
+# compare them first with `python -m src.embedding_backends check`
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# CPU threads per embedding call (0: the runtime's default)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0")) or None
+# Semantic answer cache: near-identical questions on unchanged documents skip the LLM
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache/answers.sqlite")
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# Concurrent queries are encoded and searched together: batches of up to
+# QUERY_BATCH_MAX, collected for QUERY_BATCH_WINDOW_MS after the first arrives
+QUERY_BATCHING = os.getenv("QUERY_BATCHING", "true").lower() in ("1", "true", "yes")
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "2"))
+# Async API: bounded threads for retrieval (mostly waiting on the query batcher);
+# indexing runs on its own single thread
+ASYNC_QUERY_WORKERS = int(os.getenv("ASYNC_QUERY_WORKERS", "16"))
+# Ingestion pipeline: chunking threads, chunks per embedding call, items buffered between stages
+INGEST_CHUNK_WORKERS = int(os.getenv("INGEST_CHUNK_WORKERS", "2"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "512"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+# Models, tokenizer and loaders load on first use; warm-up loads them in a
+# background thread right after startup instead
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() in ("1", "true", "yes")
+
+# Background warm-up, started at most once per process
+_warm_up_thread: Optional[threading.Thread] = None
+_warm_up_lock = threading.Lock()
+
 
 class RAGSearch:
-    def __init__(self, faiss_store_dir: str = FAISS_STORE_DIR):
-        """Initialize RAG search with vector store and LLM."""
-        self.store = FaissVectorStore(persist_dir=faiss_store_dir)
+    def __init__(self, faiss_store_dir: str = FAISS_STORE_DIR, use_mmap: bool = FAISS_USE_MMAP,
+                 index_spec: Optional[IndexSpec] = None, embedding_model: str = EMBEDDING_MODEL,
+                 llm: Optional[Any] = None, answer_cache: Optional[AnswerCache] = None,
+                 read_only: bool = False, reranker: Optional[Any] = None):
+        """
+        Initialize RAG search with vector store and LLM.
 
-        # Try to load existing index
-        index_path = os.path.join(faiss_store_dir, "faiss.index")
-        if os.path.exists(index_path):
-            try:
-                self.store.load()
-                logger.info("Loaded existing vector store")
-            except Exception as e:
-                logger.warning(f"Failed to load existing index: {str(e)}")
+        Args:
+            faiss_store_dir: Directory of the persisted vector store
+            use_mmap: Memory-map the index and chunk texts
+            index_spec: FAISS index type for large segments
+            embedding_model: SentenceTransformer model name
+            llm: Chat model with ``invoke(messages)`` and ``stream(messages)``;
+                defaults to OpenAI gpt-4o-mini (see LLM_PROVIDER), created on
+                first use
+            answer_cache: Semantic answer cache; defaults to the shared one at
+                ANSWER_CACHE_PATH unless ANSWER_CACHE_ENABLED is false
+            read_only: Serve queries only, picking up changes another process
+                commits to the store (used by multi-worker servers)
+            reranker: Re-orders over-fetched candidates before the prompt is
+                built (see CrossEncoderReranker); defaults to the shared one
+                for RERANK_MODEL if RERANK_ENABLED is true
+        """
+        # Shared across all instances in the process; loads any existing index once
+        self.store = get_vector_store(
+            faiss_store_dir,
+            model=embedding_model,
+            use_mmap=use_mmap,
+            index_spec=index_spec or IndexSpec(
+                FAISS_INDEX_TYPE, train_threshold=FAISS_TRAIN_THRESHOLD, rerank=FAISS_RERANK
+            ),
+            embedding_cache=get_embedding_cache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES),
+            embed_batch_size=EMBEDDING_BATCH_SIZE,
+            embedding_backend=EMBEDDING_BACKEND,
+            embedding_threads=EMBEDDING_THREADS,
+            chunking=CHUNKING_STRATEGY,
+            max_segment_rows=COMPACTION_MAX_ROWS,
+            read_only=read_only,
+            hybrid=RETRIEVAL_MODE == "hybrid",
+            rrf_k=HYBRID_RRF_K,
+            hybrid_candidates=HYBRID_CANDIDATES,
+        )
+        self.ingestion = IngestionPipeline(
+            self.store,
+            chunk_workers=INGEST_CHUNK_WORKERS,
+            embed_batch_size=INGEST_EMBED_BATCH_SIZE,
+            queue_size=INGEST_QUEUE_SIZE,
+        )
+
+        # The default chat model is created on first use; a missing API key still fails here
+        self._llm = llm
+        if llm is None:
+            self._check_llm_config()
+        self.context_builder = ContextBuilder(CONTEXT_MAX_TOKENS, CONTEXT_DEDUP_THRESHOLD)
+        if reranker is None and RERANK_ENABLED:
+            reranker = get_reranker(RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_BUDGET_MS,
+                                    RERANK_CACHE_MAX_ENTRIES)
+        self.reranker = reranker
+
+        if answer_cache is None and ANSWER_CACHE_ENABLED:
+            answer_cache = get_answer_cache(
+                ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD
+            )
+        self.answer_cache = answer_cache
+        self.batcher = (
+            get_query_batcher(self.store, QUERY_BATCH_MAX, QUERY_BATCH_WINDOW_MS)
+            if QUERY_BATCHING else None
+        )
+
+    @property
+    def llm(self) -> Any:
+        """The chat model; the default one is created on first access."""
+        if self._llm is None:
+            self._llm = self._default_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, value: Any) -> None:
+        self._llm = value
 
-        # Validate and initialize LLM
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
+    @staticmethod
+    def _check_llm_config() -> None:
+        """Fail early if the default chat model cannot be created."""
+        if LLM_PROVIDER != "fake" and not os.getenv("OPENAI_API_KEY"):
             raise ValueError(
                 "OPENAI_API_KEY not found in environment variables. "
                 "Please set it in your .env file or environment."
             )
-        
+
+    @staticmethod
+    def _default_llm() -> Any:
+        """Validate the OpenAI key and create the default chat model."""
+        if LLM_PROVIDER == "fake":
+            from src.fake_llm import FakeChatModel
+
+            logger.info("Using offline FakeChatModel")
+            return FakeChatModel(first_token_s=0.3, token_s=0.03)
+
+        RAGSearch._check_llm_config()
+        # Imported here: langchain_openai pulls in openai and httpx
+        from langchain_openai import ChatOpenAI
+
         try:
-            self.llm = ChatOpenAI(
-                api_key=api_key,
+            llm = ChatOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
                 model="gpt-4o-mini"
             )
             logger.info("Initialized ChatOpenAI with gpt-4o-mini")
+            return llm
         except Exception as e:
             logger.error(f"Failed to initialize ChatOpenAI: {str(e)}")
             raise
@@ -50,106 +212,417 @@ class RAGSearch:
         Index documents from file paths.
         
         Returns:
-            Dictionary with 'success' (bool), 'doc_count' (int), and 'errors' (list)
+            Dictionary with 'success' (bool), 'doc_count' (files loaded),
+            'pages' (their pages, rows or records), 'parts' (pieces of
+            streamed files), 'errors' (list),
+            per-file 'added', 'replaced' and 'unchanged' counts, new 'chunks'
+            and per-stage throughput under 'stages'
         """
         if not paths:
             raise ValueError("No file paths provided")
         
         try:
-            docs, errors = load_uploaded_documents(paths)
+            # Files are loaded, chunked, embedded and added concurrently
+            stats = self.ingestion.run(paths)
+            errors = stats["errors"]
             
-            if not docs:
+            if not stats["doc_count"]:
                 error_msg = "No documents loaded from provided paths"
                 if errors:
                     error_msg += f". Errors: {', '.join(errors)}"
                 raise ValueError(error_msg)
             
-            self.store.add_documents(docs)
-            
             result = {
                 "success": True,
-                "doc_count": len(docs),
-                "errors": errors
+                "doc_count": stats["doc_count"],
+                "pages": stats["pages"],
+                "parts": stats["parts"],
+                "errors": errors,
+                "added": stats["added"],
+                "replaced": stats["replaced"],
+                "unchanged": stats["unchanged"],
+                "chunks": stats["chunks"],
+                "stages": stats["stages"]
             }
             
             if errors:
-                logger.warning(f"Indexed {len(docs)} documents with {len(errors)} errors")
+                logger.warning(f"Indexed {stats['doc_count']} documents with {len(errors)} errors")
             else:
-                logger.info(f"Successfully indexed {len(docs)} documents")
+                logger.info(f"Successfully indexed {stats['doc_count']} documents")
             
             return result
         except Exception as e:
             logger.error(f"Error indexing documents: {str(e)}", exc_info=True)
             raise
 
-    def search_with_details(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+    def _follow_writer(self) -> None:
+        """In read-only mode, pick up documents indexed by the writer process."""
+        if self.store.read_only:
+            self.store.refresh()
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """Return the indexed documents (doc_id, source, chunk count)."""
+        self._follow_writer()
+        return self.store.list_documents()
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Remove one indexed document; returns False if it was not found."""
+        return self.store.delete_document(doc_id)
+
+    def clear_index(self) -> None:
+        """Remove all indexed documents for every session sharing this store."""
+        self.store.clear()
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Load everything the first question or upload would otherwise wait for.
+
+        Loads the embedding model (with one encode, which also initializes
+        torch), the tokenizer, the re-ranking model, the chat model client
+        and, unless read-only, the document loaders. A failing step is
+        logged and skipped; its cost then moves back to first use.
+
+        Returns:
+            Seconds taken per step
+        """
+        steps = [
+            ("embedding_model", lambda: self.store.encode_query("warm-up")),
+            ("tokenizer", lambda: count_tokens("warm-up")),
+            ("llm", lambda: self.llm),
+        ]
+        if self.reranker is not None:
+            steps.append(("reranker", self.reranker.load))
+        if not self.store.read_only:
+            from src.data_loader import get_loaders
+            steps.append(("loaders", get_loaders))
+
+        timings: Dict[str, float] = {}
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.warning(f"Warm-up step '{name}' failed: {str(e)}")
+                continue
+            timings[name] = round(time.perf_counter() - start, 3)
+            metrics.observe("rag_warm_up_seconds", timings[name], step=name)
+        logger.info(f"Warm-up finished in {sum(timings.values()):.2f}s: {timings}")
+        return timings
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() in a background thread, once per process; returns that thread."""
+        global _warm_up_thread
+        with _warm_up_lock:
+            if _warm_up_thread is None:
+                _warm_up_thread = threading.Thread(target=self.warm_up, name="rag-warm-up", daemon=True)
+                _warm_up_thread.start()
+            return _warm_up_thread
+
+    def _prepare(self, query: str, top_k: int,
+                 filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Retrieve context for a query and build the LLM prompt.
+
+        Returns:
+            Dictionary with the query embedding 'q', 'data_version', the
+            answer cache 'variant', and either a final 'result' (cache hit or
+            nothing found) or the 'messages', 'sources' and 'context' to
+            generate an answer from
+        """
+        if not query or not query.strip():
+            raise ValueError("Query cannot be empty")
+        filter = normalize_filter(filter)
+
+        self._follow_writer()
+        # Read before searching: an add racing with this query then only
+        # stores the answer under the outdated version, where it is never hit
+        data_version = self.store.data_version
+        # With re-ranking, more candidates are fetched than go into the prompt
+        fetch_k = max(top_k, RERANK_CANDIDATES) if self.reranker is not None else top_k
+        if self.batcher is not None and filter is None:
+            # Searched together with concurrent queries; on a cache hit the
+            # (cheap) search result is simply discarded
+            q, results = self.batcher.query(query, fetch_k)
+        else:
+            q, results = self.store.encode_query(query), None
+        variant = filter_key(filter)
+        if self.reranker is not None:
+            variant += f"|rerank:{self.reranker.model_name}"
+        plan = {"q": q, "data_version": data_version, "variant": variant, "result": None}
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(q, data_version, top_k, plan["variant"])
+            if cached is not None:
+                logger.info(f"Answer cache hit for query: {query[:50]}...")
+                metrics.inc("rag_queries_total", outcome="cached")
+                plan["result"] = {**cached, "cached": True}
+                return plan
+
+        if results is None:
+            results = self.store.query(query, top_k=fetch_k, embedding=q, filter=filter)
+        if self.reranker is not None and results:
+            rerank_start = time.perf_counter()
+            candidates = len(results)
+            results = self.reranker.rerank(query, results, top_k)
+            rerank_s = time.perf_counter() - rerank_start
+            metrics.observe("rag_query_stage_seconds", rerank_s, stage="rerank")
+            logger.info(f"Re-ranked {candidates} candidates to {len(results)} in {rerank_s * 1000:.0f}ms")
+        
+        if not results:
+            logger.warning("No results found for query")
+            metrics.inc("rag_queries_total", outcome="empty")
+            plan["result"] = {
+                "answer": "I couldn't find any relevant information in the indexed documents to answer your question.",
+                "sources": [],
+                "context": "",
+                "cached": False
+            }
+            return plan
+        
+        # Neighbouring chunks merged, near-duplicates dropped, within the token budget
+        context_start = time.perf_counter()
+        built = self.context_builder.build(results)
+        context = built["context"]
+        
+        if not context.strip():
+            logger.warning("Empty context generated from results")
+            metrics.inc("rag_queries_total", outcome="empty")
+            plan["result"] = {
+                "answer": "I found some results but couldn't extract meaningful context.",
+                "sources": [],
+                "context": "",
+                "cached": False
+            }
+            return plan
+
+        plan["messages"] = [
+            {
+                "role": "system",
+                "content": "Answer only using the provided context. If the context doesn't contain enough information to answer the question, say so."
+            },
+            {
+                "role": "user",
+                "content": f"Context:\n{context}\n\nQuestion:\n{query}"
+            }
+        ]
+        # One source per passage, cited by its most relevant chunk
+        plan["sources"] = []
+        for i, passage in enumerate(built["passages"]):
+            r = min(passage["results"], key=lambda r: r["rank"])
+            # Hybrid results are ranked by fused score; similarity stays the cosine
+            fused = r.get("vector_score") is not None
+            plan["sources"].append({
+                "index": i + 1,
+                "text": passage["text"][:200] + ("..." if len(passage["text"]) > 200 else ""),
+                "similarity": r["vector_score"] if fused else r["score"],
+                "rrf_score": r["score"] if fused else None,
+                "source": r.get("source", ""),
+                "page": r.get("page"),
+                "row": r.get("row"),
+                "row_end": r.get("row_end"),
+                "vector_score": r.get("vector_score"),
+                "bm25_score": r.get("bm25_score"),
+                "rerank_score": r.get("rerank_score"),
+                "chunks": len(passage["results"]),
+                "tokens": passage["tokens"]
+            })
+        plan["context"] = context
+        plan["context_tokens"] = built["context_tokens"]
+        plan["prompt_tokens"] = sum(count_tokens(m["content"]) for m in plan["messages"])
+        metrics.observe("rag_query_stage_seconds", time.perf_counter() - context_start, stage="context")
+        logger.info(f"Prompt of {plan['prompt_tokens']} tokens ({built['context_tokens']} context) "
+                    f"from {len(results)} chunks: {built['merged']} merged, "
+                    f"{built['duplicates']} duplicates, {built['skipped']} over budget")
+        return plan
+
+    def _finish(self, query: str, top_k: int, plan: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        """Assemble the result for a generated answer and add it to the answer cache."""
+        logger.info(f"Generated answer for query: {query[:50]}...")
+        metrics.inc("rag_queries_total", outcome="answered")
+        if metrics.enabled:
+            metrics.inc("rag_prompt_tokens_total", plan["prompt_tokens"])
+            metrics.inc("rag_context_tokens_total", plan["context_tokens"])
+            metrics.inc("rag_completion_tokens_total", count_tokens(answer))
+        result = {
+            "answer": answer,
+            "sources": plan["sources"],
+            "context": plan["context"],
+            "prompt_tokens": plan["prompt_tokens"],
+            "context_tokens": plan["context_tokens"]
+        }
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, plan["q"], plan["data_version"], top_k, result,
+                                  plan["variant"])
+        return {**result, "cached": False}
+
+    def search_with_details(self, query: str, top_k: int = 5,
+                            filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Search for relevant documents and generate an answer.
         
         Args:
             query: The search query
             top_k: Number of top results to retrieve
+            filter: Restrict retrieval to matching chunks, e.g.
+                ``{"file_type": "pdf"}`` (see FaissVectorStore.query)
             
         Returns:
-            Dictionary with 'answer', 'sources', and 'context'
+            Dictionary with 'answer', 'sources', 'context', 'cached' (True if
+            the answer was reused from a similar earlier question) and, when
+            an answer was generated, 'prompt_tokens' and 'context_tokens'
+            (token counts of the whole prompt and of the retrieved context)
         """
-        if not query or not query.strip():
-            raise ValueError("Query cannot be empty")
-        
+        start = time.perf_counter()
         try:
-            results = self.store.query(query, top_k=top_k)
-            
-            if not results:
-                logger.warning("No results found for query")
-                return {
-                    "answer": "I couldn't find any relevant information in the indexed documents to answer your question.",
-                    "sources": [],
-                    "context": ""
-                }
-            
-            context = "\n\n".join([r["text"] for r in results])
-            
-            if not context.strip():
-                logger.warning("Empty context generated from results")
-                return {
-                    "answer": "I found some results but couldn't extract meaningful context.",
-                    "sources": [],
-                    "context": ""
-                }
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Answer only using the provided context. If the context doesn't contain enough information to answer the question, say so."
-                },
-                {
-                    "role": "user",
-                    "content": f"Context:\n{context}\n\nQuestion:\n{query}"
-                }
-            ]
+            plan = self._prepare(query, top_k, filter)
+            if plan["result"] is not None:
+                metrics.observe("rag_query_stage_seconds", time.perf_counter() - start, stage="total")
+                return plan["result"]
 
             try:
-                response = self.llm.invoke(messages)
+                with metrics.timer("rag_query_stage_seconds", stage="llm"):
+                    response = self.llm.invoke(plan["messages"])
                 answer = response.content if hasattr(response, 'content') else str(response)
             except Exception as e:
                 logger.error(f"LLM API error: {str(e)}", exc_info=True)
                 raise ValueError(f"Failed to generate answer: {str(e)}")
 
-            sources = [
-                {
-                    "index": i + 1,
-                    "text": r["text"][:200] + ("..." if len(r["text"]) > 200 else ""),
-                    "similarity": r["score"]
-                }
-                for i, r in enumerate(results)
-            ]
-
-            logger.info(f"Generated answer for query: {query[:50]}...")
-            return {
-                "answer": answer,
-                "sources": sources,
-                "context": context
-            }
+            result = self._finish(query, top_k, plan, answer)
+            metrics.observe("rag_query_stage_seconds", time.perf_counter() - start, stage="total")
+            return result
         except Exception as e:
             logger.error(f"Error in search_with_details: {str(e)}", exc_info=True)
             raise
+
+    def stream_search(self, query: str, top_k: int = 5,
+                      filter: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Search like search_with_details, but stream the answer as it is generated.
+
+        Yields events in order:
+            {"type": "sources", "sources", "context", "cached"} once retrieval is done;
+            {"type": "token", "text"} for each piece of the answer;
+            {"type": "done", "answer", "sources", "context", "cached", "timings"}
+            (plus 'prompt_tokens' and 'context_tokens' as in search_with_details)
+            where timings has 'retrieval_s', 'ttft_s' (time to first token)
+            and 'total_s', all measured from the call.
+        """
+        start = time.perf_counter()
+        try:
+            plan = self._prepare(query, top_k, filter)
+            retrieval_s = time.perf_counter() - start
+            result = plan["result"]
+            if result is not None:
+                # Cache hit or nothing to answer from: the whole answer is one token
+                yield {"type": "sources", "sources": result["sources"],
+                       "context": result["context"], "cached": result["cached"]}
+                ttft_s = time.perf_counter() - start
+                yield {"type": "token", "text": result["answer"]}
+            else:
+                yield {"type": "sources", "sources": plan["sources"],
+                       "context": plan["context"], "cached": False}
+                parts: List[str] = []
+                ttft_s = None
+                llm_start = time.perf_counter()
+                try:
+                    for chunk in self.llm.stream(plan["messages"]):
+                        text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                        if not text:
+                            continue
+                        if ttft_s is None:
+                            ttft_s = time.perf_counter() - start
+                        parts.append(text)
+                        yield {"type": "token", "text": text}
+                except Exception as e:
+                    logger.error(f"LLM API error: {str(e)}", exc_info=True)
+                    raise ValueError(f"Failed to generate answer: {str(e)}")
+                metrics.observe("rag_query_stage_seconds", time.perf_counter() - llm_start, stage="llm")
+                result = self._finish(query, top_k, plan, "".join(parts))
+
+            total_s = time.perf_counter() - start
+            metrics.observe("rag_query_stage_seconds", ttft_s if ttft_s is not None else total_s, stage="ttft")
+            metrics.observe("rag_query_stage_seconds", total_s, stage="total")
+            yield {
+                "type": "done",
+                **result,
+                "timings": {
+                    "retrieval_s": round(retrieval_s, 4),
+                    "ttft_s": round(ttft_s if ttft_s is not None else total_s, 4),
+                    "total_s": round(total_s, 4),
+                },
+            }
+        except Exception as e:
+            logger.error(f"Error in stream_search: {str(e)}", exc_info=True)
+            raise
+
+    async def asearch_with_details(self, query: str, top_k: int = 5,
+                                   filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Async search_with_details for serving many questions from one event loop.
+
+        Query encoding, FAISS search and cache access run on a shared,
+        bounded thread pool; the LLM call is awaited natively (``ainvoke``)
+        when the model supports it, so waiting on OpenAI ties up no thread.
+
+        Returns:
+            Same dictionary as search_with_details
+        """
+        loop = asyncio.get_running_loop()
+        executor = get_executor("rag-query", ASYNC_QUERY_WORKERS)
+        start = time.perf_counter()
+        try:
+            plan = await loop.run_in_executor(executor, self._prepare, query, top_k, filter)
+            if plan["result"] is not None:
+                metrics.observe("rag_query_stage_seconds", time.perf_counter() - start, stage="total")
+                return plan["result"]
+
+            try:
+                with metrics.timer("rag_query_stage_seconds", stage="llm"):
+                    if hasattr(self.llm, "ainvoke"):
+                        response = await self.llm.ainvoke(plan["messages"])
+                    else:
+                        response = await loop.run_in_executor(executor, self.llm.invoke, plan["messages"])
+                answer = response.content if hasattr(response, 'content') else str(response)
+            except Exception as e:
+                logger.error(f"LLM API error: {str(e)}", exc_info=True)
+                raise ValueError(f"Failed to generate answer: {str(e)}")
+
+            result = await loop.run_in_executor(executor, self._finish, query, top_k, plan, answer)
+            metrics.observe("rag_query_stage_seconds", time.perf_counter() - start, stage="total")
+            return result
+        except Exception as e:
+            logger.error(f"Error in asearch_with_details: {str(e)}", exc_info=True)
+            raise
+
+    async def aindex_documents(self, paths: List[str]) -> Dict[str, Any]:
+        """
+        Async index_documents.
+
+        Indexing runs on a dedicated single-thread pool, so concurrent
+        uploads queue up behind each other instead of occupying the
+        query threads; queries keep being served meanwhile.
+
+        Returns:
+            Same dictionary as index_documents
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor("rag-index", 1), self.index_documents, paths)
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and cache/batcher/re-ranker counters, e.g. for monitoring."""
+        self._follow_writer()
+        embedding_cache = self.store.pipeline.cache
+        return {
+            "documents": self.store.document_count,
+            "chunks": self.store.ntotal,
+            "segments": len(self.store.segments),
+            "data_version": self.store.data_version,
+            "read_only": self.store.read_only,
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "query_batcher": self.batcher.stats() if self.batcher is not None else None,
+            "reranker": self.reranker.stats() if self.reranker is not None else None,
+        }
+
+    def prometheus_metrics(self) -> str:
+        """Stage latency histograms, query/token counters and stats() values in the Prometheus text format."""
+        return metrics.render_prometheus(flatten_stats(self.stats()))
@@ -0,0 +1,648 @@
+import os
+import json
+import uuid
+import bisect
+import mmap
+import logging
+import faiss
+import pickle
+import numpy as np
+from typing import List, Any, Dict, Optional, Tuple, Union
+from src.index_types import IndexSpec, index_kind, is_flat, read_index, unwrap, write_index
+from src.bm25 import BM25Index, BM25_SUFFIXES
+from src.filters import CHUNK_COLUMNS, MISSING
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+SEGMENT_PREFIX = "seg-"
+FORMAT_VERSION = 4
+SEGMENT_SUFFIXES = (
+    (".faiss", ".vectors.npy", ".text", ".offsets.npy", ".docs.json")
+    + tuple(f".{column}.npy" for column in CHUNK_COLUMNS)
+    + BM25_SUFFIXES
+)
+
+# Flags for zero-copy loading: index codes stay in the page cache, not the heap
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+# Single-file layout written before segments were introduced
+LEGACY_INDEX_FILE = "faiss.index"
+LEGACY_META_FILE = "meta.pkl"
+
+
+def _fsync_file(path: str) -> None:
+    """Flush a file written by a third-party writer (e.g. faiss) to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_json(path: str, obj: Any) -> None:
+    with open(path, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class TextStore:
+    """
+    Chunk texts packed into one flat UTF-8 file, addressed by an offsets array.
+
+    Row ``i`` is ``buf[offsets[i]:offsets[i + 1]]``. When memory-mapped, a
+    lookup only faults in the pages holding the requested rows, so reading
+    the top-k hits costs the same regardless of segment size.
+    """
+
+    def __init__(self, buf: Union[bytes, mmap.mmap], offsets: np.ndarray):
+        self._buf = buf
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw_row(i).decode("utf-8")
+
+    def raw_row(self, i: int) -> bytes:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._buf[start:end]
+
+    @staticmethod
+    def write(prefix: str, blobs: List[bytes]) -> None:
+        """Write ``<prefix>.text`` and ``<prefix>.offsets.npy`` for one blob per row."""
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=offsets[1:])
+        with open(f"{prefix}.text", "wb") as f:
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(f"{prefix}.offsets.npy", "wb") as f:
+            np.save(f, offsets)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @classmethod
+    def open(cls, prefix: str, use_mmap: bool = False) -> "TextStore":
+        if use_mmap:
+            offsets = np.load(f"{prefix}.offsets.npy", mmap_mode="r")
+            with open(f"{prefix}.text", "rb") as f:
+                # mmap of an empty file is an error; all-empty chunks are legal
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        else:
+            offsets = np.load(f"{prefix}.offsets.npy")
+            with open(f"{prefix}.text", "rb") as f:
+                buf = f.read()
+        return cls(buf, offsets)
+
+
+class Tombstones:
+    """
+    Deleted chunk ids, kept as sorted [start, end) ranges.
+
+    Every document occupies one contiguous id range when written, so a
+    deletion is a single range. Rows stay in their segment files until
+    compaction rewrites them; searches skip them via an ID selector.
+    """
+
+    def __init__(self, ranges: Optional[List[List[int]]] = None):
+        self.ranges: List[List[int]] = sorted([list(r) for r in ranges or []])
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges)
+
+    def add(self, start: int, end: int) -> None:
+        self.ranges.append([start, end])
+        self.ranges.sort()
+
+    def covers(self, start: int, end: int) -> bool:
+        return any(s <= start and end <= e for s, e in self.ranges)
+
+    def mask(self, ids: np.ndarray) -> np.ndarray:
+        """Return a boolean array, True where the id is deleted."""
+        if not self.ranges:
+            return np.zeros(len(ids), dtype=bool)
+        starts = np.array([s for s, _ in self.ranges], dtype=np.int64)
+        ends = np.array([e for _, e in self.ranges], dtype=np.int64)
+        pos = np.searchsorted(starts, ids, side="right") - 1
+        return (pos >= 0) & (ids < ends[np.maximum(pos, 0)])
+
+    def live_bitmap(self, next_id: int) -> np.ndarray:
+        """Return a bool array over [0, next_id), False for deleted ids."""
+        live = np.ones(next_id, dtype=bool)
+        for s, e in self.ranges:
+            live[s:e] = False
+        return live
+
+    def prune(self, segments: List["Segment"]) -> None:
+        """Forget ranges whose rows have been physically removed from every segment."""
+        self.ranges = [
+            r for r in self.ranges if any(seg.count_ids(*r) for seg in segments)
+        ]
+
+
+class Segment:
+    """
+    An immutable batch of normalized vectors, their chunk texts and documents.
+
+    The FAISS index is an ``IndexIDMap2`` over globally unique chunk ids,
+    sorted ascending within the segment. ``docs`` lists the documents whose
+    chunks live here, each with its [id_start, id_end) range.
+
+    Flat segments can reconstruct their vectors exactly from the index.
+    Approximate ones (HNSW/IVF/PQ) also keep the raw float32 vectors in
+    ``.vectors.npy`` so they can be merged or retrained without loss.
+
+    ``bm25`` is the keyword index over the same rows, for hybrid search.
+    ``columns`` holds per-row chunk metadata (page, row) as int32 arrays.
+    """
+
+    def __init__(self, name: str, index: faiss.Index, texts: TextStore,
+                 docs: List[Dict[str, Any]], spec: IndexSpec, bm25: BM25Index,
+                 columns: Dict[str, np.ndarray], raw_vectors: Optional[np.ndarray] = None):
+        self.name = name
+        self.index = index
+        self.texts = texts
+        self.bm25 = bm25
+        self.columns = columns
+        self._doc_starts = [d["id_start"] for d in docs]
+        self.docs = docs
+        self.spec = spec
+        self.ids = faiss.vector_to_array(index.id_map)
+        self.deleted = 0
+        self._raw_vectors = raw_vectors
+
+    @property
+    def count(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def live_count(self) -> int:
+        return self.count - self.deleted
+
+    @property
+    def is_flat(self) -> bool:
+        return is_flat(self.index)
+
+    def count_ids(self, start: int, end: int) -> int:
+        """Number of rows whose id falls in [start, end)."""
+        return int(np.searchsorted(self.ids, end) - np.searchsorted(self.ids, start))
+
+    def row_of(self, chunk_id: int) -> int:
+        return int(np.searchsorted(self.ids, chunk_id))
+
+    def text(self, chunk_id: int) -> str:
+        return self.texts[self.row_of(chunk_id)]
+
+    def chunk_metadata(self, chunk_id: int) -> Dict[str, Optional[int]]:
+        """Column values of one chunk, None where the loader gave none."""
+        row = self.row_of(chunk_id)
+        values = {column: int(self.columns[column][row]) for column in CHUNK_COLUMNS}
+        return {column: (None if v == MISSING else v) for column, v in values.items()}
+
+    def document_of(self, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """The entry in ``docs`` whose id range holds a chunk."""
+        i = bisect.bisect_right(self._doc_starts, chunk_id) - 1
+        if i >= 0 and chunk_id < self.docs[i]["id_end"]:
+            return self.docs[i]
+        return None
+
+    def search(self, q: np.ndarray, k: int, sel: Optional[faiss.IDSelector] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search this segment; returns (scores, chunk ids), -1 for empty slots.
+
+        ``allowed`` is the bool array over chunk ids that ``sel`` was built
+        from, used by index types that cannot take a selector.
+        """
+        # Quantized segments re-rank their candidates with the raw vectors
+        return self.spec.search(self.index, q, min(k, self.count), sel,
+                                vectors=self._raw_vectors, ids=self.ids, allowed=allowed)
+
+    def vectors_at(self, rows: np.ndarray) -> np.ndarray:
+        """Vectors of some rows, without reconstructing the whole segment."""
+        if self._raw_vectors is not None:
+            return np.asarray(self._raw_vectors[rows], dtype=np.float32)
+        inner = unwrap(self.index)
+        return np.vstack([inner.reconstruct(int(r)) for r in rows])
+
+    def vectors(self) -> np.ndarray:
+        """Return all vectors in this segment, in id order (used for compaction)."""
+        if self._raw_vectors is not None:
+            return self._raw_vectors
+        return unwrap(self.index).reconstruct_n(0, self.count)
+
+
+class SegmentStorage:
+    """
+    Append-only on-disk layout for a vector store.
+
+    Every add writes a new segment (``seg-NNNNNN.faiss`` for vectors,
+    ``.text`` + ``.offsets.npy`` for chunk texts, ``.page.npy`` and
+    ``.row.npy`` for chunk metadata, ``.bm25_*.npy`` for the keyword index,
+    ``.docs.json`` for the documents it holds) and then atomically replaces ``manifest.json``,
+    which lists the live segments, the next free chunk id and the deleted
+    id ranges. Files are never modified in place, so a crash at any point
+    leaves either the old or the new manifest, both consistent. Files not
+    referenced by the manifest are leftovers and removed on load.
+
+    With ``use_mmap`` segments are opened memory-mapped and read-only, so
+    cold start and resident memory scale with what queries touch.
+
+    With ``read_only`` nothing on disk is ever modified, so any number of
+    reader processes can share a store that a single writer process updates.
+
+    ``spec`` decides which FAISS index type each new segment is built with.
+    """
+
+    def __init__(self, persist_dir: str, use_mmap: bool = False,
+                 spec: Optional[IndexSpec] = None, read_only: bool = False):
+        self.persist_dir = persist_dir
+        self.use_mmap = use_mmap
+        self.read_only = read_only
+        self.spec = spec or IndexSpec()
+        self.manifest: Dict[str, Any] = self._empty_manifest()
+        self.tombstones = Tombstones()
+
+    @staticmethod
+    def _empty_manifest() -> Dict[str, Any]:
+        return {"format": FORMAT_VERSION, "version": 0, "next_segment": 1,
+                "next_id": 0, "segments": [], "tombstones": [],
+                "store_id": uuid.uuid4().hex, "data_version": 0}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_dir, name)
+
+    def exists(self) -> bool:
+        """Return True if a segmented or legacy store exists on disk."""
+        return (
+            os.path.exists(self._path(MANIFEST_FILE))
+            or os.path.exists(self._path(LEGACY_INDEX_FILE))
+        )
+
+    def reset(self) -> None:
+        """Forget the in-memory manifest (files are removed by the caller)."""
+        self.manifest = self._empty_manifest()
+        self.tombstones = Tombstones()
+
+    @property
+    def next_id(self) -> int:
+        return self.manifest["next_id"]
+
+    @property
+    def data_version(self) -> str:
+        """
+        Identifies the searchable content: changes on every add or delete and
+        when the store is cleared, but not on compaction.
+        """
+        return f"{self.manifest['store_id']}:{self.manifest['data_version']}"
+
+    @property
+    def embedding(self) -> Optional[Dict[str, Any]]:
+        """Model, backend and dimension that produced the stored vectors (None in older stores)."""
+        return self.manifest.get("embedding")
+
+    def record_embedding(self, info: Dict[str, Any]) -> None:
+        """Remember what produced the vectors, unless already known; saved by the next commit."""
+        self.manifest.setdefault("embedding", info)
+
+    def allocate_name(self) -> str:
+        """Reserve a new, never-reused segment name."""
+        n = self.manifest["next_segment"]
+        self.manifest["next_segment"] = n + 1
+        return f"{SEGMENT_PREFIX}{n:06d}"
+
+    def allocate_ids(self, n: int) -> np.ndarray:
+        """Reserve n new, never-reused, ascending chunk ids."""
+        start = self.manifest["next_id"]
+        self.manifest["next_id"] = start + n
+        return np.arange(start, start + n, dtype=np.int64)
+
+    def write_segment(self, name: str, vectors: np.ndarray, texts: List[bytes],
+                      ids: np.ndarray, docs: List[Dict[str, Any]],
+                      columns: Optional[Dict[str, np.ndarray]] = None) -> Segment:
+        """
+        Write a segment's files to disk without publishing it.
+
+        Args:
+            name: Segment name from allocate_name()
+            vectors: Normalized float32 vectors, one row per chunk
+            texts: UTF-8 encoded chunk texts, one per row
+            ids: Ascending chunk ids, one per row
+            docs: Documents held by the segment with their id ranges
+            columns: Chunk metadata columns, one int32 value per row
+                (default: MISSING everywhere)
+        """
+        if not (vectors.shape[0] == len(texts) == len(ids)):
+            raise ValueError(
+                f"Segment {name}: {vectors.shape[0]} vectors, {len(texts)} texts, {len(ids)} ids"
+            )
+
+        index = self.spec.build(vectors, ids)
+        index_path = self._path(f"{name}.faiss")
+        write_index(index, index_path)
+        _fsync_file(index_path)
+        if not is_flat(index):
+            with open(self._path(f"{name}.vectors.npy"), "wb") as f:
+                np.save(f, np.ascontiguousarray(vectors, dtype=np.float32))
+                f.flush()
+                os.fsync(f.fileno())
+
+        TextStore.write(self._path(name), texts)
+        columns = columns or {}
+        columns = {
+            column: np.ascontiguousarray(columns.get(column, np.full(len(ids), MISSING)), dtype=np.int32)
+            for column in CHUNK_COLUMNS
+        }
+        for column, values in columns.items():
+            with open(self._path(f"{name}.{column}.npy"), "wb") as f:
+                np.save(f, values)
+                f.flush()
+                os.fsync(f.fileno())
+        bm25 = BM25Index.build(t.decode("utf-8") for t in texts)
+        bm25.save(self._path(name))
+        _write_json(self._path(f"{name}.docs.json"), docs)
+
+        if self.use_mmap or not is_flat(index):
+            # Serve from the page cache (mmap) / pick up the raw vector file
+            return self.read_segment(name)
+        return Segment(name, index, TextStore.open(self._path(name)), docs, self.spec, bm25, columns)
+
+    def read_segment(self, name: str) -> Segment:
+        """Open an existing segment from disk."""
+        index_path = self._path(f"{name}.faiss")
+        if self.use_mmap:
+            index = read_index(index_path, MMAP_FLAGS)
+        else:
+            index = read_index(index_path)
+
+        raw_vectors = None
+        vectors_path = self._path(f"{name}.vectors.npy")
+        if os.path.exists(vectors_path):
+            # Only needed for compaction, so always mapped rather than loaded
+            raw_vectors = np.load(vectors_path, mmap_mode="r")
+
+        with open(self._path(f"{name}.docs.json"), "r") as f:
+            docs = json.load(f)
+
+        texts = TextStore.open(self._path(name), self.use_mmap)
+        bm25 = BM25Index.open(self._path(name), self.use_mmap)
+        if bm25 is None:
+            # Segment written before keyword search existed
+            bm25 = BM25Index.build(texts[i] for i in range(len(texts)))
+            if not self.read_only:
+                bm25.save(self._path(name))
+                logger.info(f"Built keyword index for segment {name}")
+
+        columns = {}
+        for column in CHUNK_COLUMNS:
+            path = self._path(f"{name}.{column}.npy")
+            if os.path.exists(path):
+                columns[column] = np.load(path, mmap_mode="r" if self.use_mmap else None)
+            else:
+                # Segment written before chunk metadata was kept
+                columns[column] = np.full(len(texts), MISSING, dtype=np.int32)
+
+        segment = Segment(name, index, texts, docs, self.spec, bm25, columns,
+                          raw_vectors=raw_vectors)
+        segment.deleted = int(self.tombstones.mask(segment.ids).sum())
+        return segment
+
+    def delete_segment_files(self, name: str) -> None:
+        for suffix in SEGMENT_SUFFIXES:
+            path = self._path(f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete_range(self, segments: List[Segment], start: int, end: int) -> None:
+        """Tombstone chunk ids [start, end); publish with commit()."""
+        self.tombstones.add(start, end)
+        for seg in segments:
+            seg.deleted += seg.count_ids(start, end)
+
+    def commit(self, segments: List[Segment], data_changed: bool = True) -> None:
+        """
+        Atomically publish the given segments and current tombstones as the live set.
+
+        Args:
+            segments: The new live segments
+            data_changed: False when only the layout changed (compaction), so
+                results cached against the current data_version stay valid
+        """
+        self.check_writable("commit to")
+        manifest = dict(self.manifest)
+        manifest["version"] = self.manifest["version"] + 1
+        if data_changed:
+            manifest["data_version"] = self.manifest["data_version"] + 1
+        manifest["segments"] = [{"name": s.name, "count": s.count} for s in segments]
+        manifest["tombstones"] = self.tombstones.ranges
+
+        tmp_path = self._path(MANIFEST_FILE + ".tmp")
+        _write_json(tmp_path, manifest)
+        os.replace(tmp_path, self._path(MANIFEST_FILE))
+        self.manifest = manifest
+
+    def load(self) -> List[Segment]:
+        """Open all live segments, upgrading older store formats if found."""
+        manifest_path = self._path(MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            if os.path.exists(self._path(LEGACY_INDEX_FILE)):
+                self.check_writable("migrate")
+                return self._migrate_legacy()
+            raise FileNotFoundError(f"Manifest file not found: {manifest_path}")
+
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        # Not in older manifests; persisted by the next commit
+        manifest.setdefault("store_id", uuid.uuid4().hex)
+        manifest.setdefault("data_version", 0)
+        if manifest.get("format") in (2, 3):
+            self.check_writable("upgrade")
+            self.manifest = manifest
+            return self._upgrade(manifest["format"])
+        if manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format: {manifest.get('format')}")
+
+        previous = self.tombstones
+        self.tombstones = Tombstones(manifest["tombstones"])
+        try:
+            segments = [self.read_segment(s["name"]) for s in manifest["segments"]]
+        except Exception:
+            # e.g. a writer compacted these segments away while we were reading
+            self.tombstones = previous
+            raise
+        self.manifest = manifest
+        if not self.read_only:
+            # A reader must not touch files: they may belong to an uncommitted write
+            self._remove_orphans({s.name for s in segments})
+        return segments
+
+    def manifest_stamp(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, inode) of the manifest file, or None; changes on every commit."""
+        try:
+            st = os.stat(self._path(MANIFEST_FILE))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino
+
+    def check_writable(self, action: str) -> None:
+        """Raise ValueError if this storage was opened read-only."""
+        if self.read_only:
+            raise ValueError(f"Cannot {action} {self.persist_dir}: store is opened read-only")
+
+    def _remove_orphans(self, live: set) -> None:
+        """Delete segment files left behind by an interrupted write or compaction."""
+        for fname in os.listdir(self.persist_dir):
+            if not fname.startswith(SEGMENT_PREFIX):
+                continue
+            if fname.split(".", 1)[0] not in live:
+                os.remove(self._path(fname))
+                logger.info(f"Removed orphaned segment file {fname}")
+        tmp_path = self._path(MANIFEST_FILE + ".tmp")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def _write_unattributed(self, vectors: np.ndarray, texts: List[str]) -> Segment:
+        """Write chunks from a store without document ids as one anonymous document."""
+        name = self.allocate_name()
+        ids = self.allocate_ids(len(texts))
+        docs = [{
+            "doc_id": f"legacy-{name}",
+            "source": "",
+            "content_hash": "",
+            "id_start": int(ids[0]),
+            "id_end": int(ids[-1]) + 1,
+        }]
+        return self.write_segment(name, vectors, [t.encode("utf-8") for t in texts], ids, docs)
+
+    def _migrate_legacy(self) -> List[Segment]:
+        """Convert a faiss.index + meta.pkl store into a single segment."""
+        meta_path = self._path(LEGACY_META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Metadata file not found: {meta_path}")
+
+        legacy = faiss.read_index(self._path(LEGACY_INDEX_FILE))
+        with open(meta_path, "rb") as f:
+            metadata = pickle.load(f)
+
+        self.reset()
+        segments: List[Segment] = []
+        if legacy.ntotal:
+            vectors = legacy.reconstruct_n(0, legacy.ntotal)
+            segments.append(self._write_unattributed(vectors, [m["text"] for m in metadata]))
+        self.commit(segments)
+
+        os.remove(self._path(LEGACY_INDEX_FILE))
+        os.remove(meta_path)
+        logger.info(f"Migrated legacy store in {self.persist_dir} to segmented format")
+        return segments
+
+    def _upgrade(self, fmt: int) -> List[Segment]:
+        """Rewrite format-2/3 segments with chunk ids and document tables."""
+        old_names = [s["name"] for s in self.manifest["segments"]]
+        self.manifest.setdefault("next_id", 0)
+        self.manifest["format"] = FORMAT_VERSION
+        self.tombstones = Tombstones()
+
+        segments: List[Segment] = []
+        for old in old_names:
+            index = faiss.read_index(self._path(f"{old}.faiss"))
+            vectors_path = self._path(f"{old}.vectors.npy")
+            if os.path.exists(vectors_path):
+                vectors = np.load(vectors_path)
+            else:
+                vectors = index.reconstruct_n(0, index.ntotal)
+            if fmt == 2:
+                with open(self._path(f"{old}.meta.pkl"), "rb") as f:
+                    texts = [m["text"] for m in pickle.load(f)]
+            else:
+                store = TextStore.open(self._path(old))
+                texts = [store[i] for i in range(len(store))]
+            segments.append(self._write_unattributed(vectors, texts))
+
+        self.commit(segments)
+        for old in old_names:
+            for suffix in SEGMENT_SUFFIXES + (".meta.pkl",):
+                path = self._path(f"{old}{suffix}")
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info(f"Upgraded {len(segments)} segments in {self.persist_dir} to format {FORMAT_VERSION}")
+        return segments
+
+    def merge(self, name: str, segments: List[Segment]) -> Optional[Segment]:
+        """
+        Write one new segment holding the live rows of all given segments.
+
+        Tombstoned rows and documents are dropped and rows are re-sorted by
+        chunk id. Returns None if no live rows remain.
+        """
+        ids = np.concatenate([s.ids for s in segments])
+        owner = np.concatenate([np.full(s.count, i, dtype=np.int32) for i, s in enumerate(segments)])
+        rows = np.concatenate([np.arange(s.count, dtype=np.int64) for s in segments])
+
+        keep = ~self.tombstones.mask(ids)
+        order = np.argsort(ids[keep], kind="stable")
+        ids, owner, rows = ids[keep][order], owner[keep][order], rows[keep][order]
+        if len(ids) == 0:
+            return None
+
+        vectors = np.empty((len(ids), segments[0].index.d), dtype=np.float32)
+        for i, s in enumerate(segments):
+            sel = owner == i
+            if sel.any():
+                vectors[sel] = np.asarray(s.vectors())[rows[sel]]
+        texts = [segments[o].texts.raw_row(r) for o, r in zip(owner, rows)]
+        columns = {column: np.empty(len(ids), dtype=np.int32) for column in CHUNK_COLUMNS}
+        for i, s in enumerate(segments):
+            sel = owner == i
+            if sel.any():
+                for column in CHUNK_COLUMNS:
+                    columns[column][sel] = np.asarray(s.columns[column])[rows[sel]]
+
+        docs = [
+            d for s in segments for d in s.docs
+            if not self.tombstones.covers(d["id_start"], d["id_end"])
+        ]
+        docs.sort(key=lambda d: d["id_start"])
+        return self.write_segment(name, vectors, texts, ids, docs, columns)
+
+
+def pick_compaction(segments: List[Segment], max_segments: int,
+                    spec: Optional[IndexSpec] = None,
+                    max_rows: Optional[int] = None) -> Optional[List[Segment]]:
+    """
+    Choose segments to merge, or None if the store is within budget.
+
+    Size-tiered: the smallest segments are merged first so that large,
+    already-compacted segments are rewritten rarely. With ``max_rows``, no
+    merge produces more live rows than that, since a merge holds its
+    output in memory; segments at the limit are no longer merged, even if
+    the store keeps more than ``max_segments`` of them. A single segment is
+    picked on its own when at least half its rows are deleted, or when its
+    index type is not the one the spec wants for its size (a flat segment
+    grown past the ANN threshold, or a store switched to another type such
+    as a quantized one), so that rewriting it reclaims space or migrates it.
+    """
+    for s in segments:
+        if s.deleted * 2 >= s.count:
+            return [s]
+    if spec is not None:
+        for s in segments:
+            if index_kind(s.index) != spec.target_kind(s.count):
+                return [s]
+    if len(segments) <= max_segments:
+        return None
+    n_merge = max(2, len(segments) - max_segments // 2)
+    picked = sorted(segments, key=lambda s: s.live_count)[:n_merge]
+    if max_rows is None:
+        return picked
+    capped, rows = [], 0
+    for s in picked:
+        if rows + s.live_count > max_rows:
+            break
+        capped.append(s)
+        rows += s.live_count
+    return capped if len(capped) >= 2 else None
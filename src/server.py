@@ -0,0 +1,223 @@
+"""
+Headless HTTP API for indexing and querying, without the Streamlit UI.
+
+Endpoints (JSON in and out):
+    GET  /health                       liveness probe
+    GET  /stats                        index size, cache and batcher counters
+    GET  /metrics                      stage latencies and counters, Prometheus text format
+    GET  /documents                    indexed documents
+    POST /index   {"paths": [...]}     index files readable by the server
+    POST /query   {"query", "top_k", "filter"}   answer with sources (search_with_details)
+    POST /query/stream                 same body; Server-Sent Events from stream_search
+
+Usage:
+    python -m src.server --port 8000                 # one process, can index
+    python -m src.server --port 8001 --workers 4     # read-only query workers
+
+With ``--workers N`` the listening socket is shared by N forked processes,
+each opening the store read-only and memory-mapped, so the OS page cache
+holds one copy of the index for all of them. Workers pick up documents
+indexed by a separate single-worker server on the same store directory.
+"""
+import os
+import sys
+import json
+import signal
+import logging
+import argparse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from src.search import RAGSearch, FAISS_STORE_DIR, FAISS_USE_MMAP, STARTUP_WARM_UP
+
+logger = logging.getLogger(__name__)
+
+# Largest accepted request body; requests carry paths and questions, not files
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the server's shared RAGSearch instance."""
+
+    server: "RAGHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError(f"Request body larger than {MAX_BODY_BYTES} bytes")
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        return data
+
+    def do_GET(self) -> None:
+        rag = self.server.rag
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/stats":
+            self._send_json(HTTPStatus.OK, {**rag.stats(), "pid": os.getpid()})
+        elif self.path == "/metrics":
+            body = rag.prometheus_metrics().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/documents":
+            self._send_json(HTTPStatus.OK, rag.list_documents())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self) -> None:
+        try:
+            body = self._read_json()
+            if self.path == "/index":
+                paths = body.get("paths")
+                if not isinstance(paths, list):
+                    raise ValueError("'paths' must be a list of file paths")
+                self._send_json(HTTPStatus.OK, self.server.rag.index_documents(paths))
+            elif self.path == "/query":
+                result = self.server.rag.search_with_details(
+                    str(body.get("query", "")), top_k=int(body.get("top_k", 5)),
+                    filter=body.get("filter")
+                )
+                self._send_json(HTTPStatus.OK, result)
+            elif self.path == "/query/stream":
+                self._stream(str(body.get("query", "")), int(body.get("top_k", 5)), body.get("filter"))
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {self.path}"})
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Error handling {self.path}: {str(e)}", exc_info=True)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def _stream(self, query: str, top_k: int, filter: Optional[Dict[str, Any]] = None) -> None:
+        """Send stream_search events as Server-Sent Events over a chunked response."""
+        events = self.server.rag.stream_search(query, top_k=top_k, filter=filter)
+        # Fail with a normal JSON error if retrieval fails, before streaming starts
+        first = next(events)
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event: Dict[str, Any]) -> None:
+            data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            send(first)
+            for event in events:
+                send(event)
+        except Exception as e:
+            # Headers are sent; report the failure in-band
+            logger.error(f"Error while streaming answer: {str(e)}", exc_info=True)
+            send({"type": "error", "error": str(e)})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class RAGHTTPServer(ThreadingHTTPServer):
+    """Thread-per-request server; concurrent queries meet in the shared query batcher."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, rag: Optional[RAGSearch] = None,
+                 bind_and_activate: bool = True):
+        super().__init__(address, RAGRequestHandler, bind_and_activate=bind_and_activate)
+        self.rag = rag
+
+
+def serve_workers(server: RAGHTTPServer, workers: int, rag_options: Dict[str, Any]) -> None:
+    """
+    Fork ``workers`` processes that accept connections on the same socket.
+
+    RAGSearch is created in each child after the fork: FAISS, the model
+    and thread pools must not be shared across fork.
+    """
+    if not hasattr(os, "fork"):
+        raise ValueError("Multi-worker mode needs os.fork (not available on this platform)")
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+            try:
+                server.rag = RAGSearch(**rag_options, read_only=True)
+                if STARTUP_WARM_UP:
+                    server.rag.start_warm_up()
+                logger.info(f"Worker {os.getpid()} serving")
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_: Any) -> None:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, lambda *_: stop())
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop()
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="HTTP API for RAG document Q&A")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--store-dir", default=FAISS_STORE_DIR)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Forked query processes sharing a read-only, memory-mapped index")
+    parser.add_argument("--read-only", action="store_true",
+                        help="Single process that serves queries but does not index")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s: %(message)s")
+
+    if args.workers > 1:
+        rag_options = {"faiss_store_dir": args.store_dir, "use_mmap": True}
+        server = RAGHTTPServer((args.host, args.port))
+        logger.info(f"Serving on http://{args.host}:{args.port} with {args.workers} read-only workers")
+        serve_workers(server, args.workers, rag_options)
+        return
+
+    rag = RAGSearch(args.store_dir, use_mmap=FAISS_USE_MMAP, read_only=args.read_only)
+    if STARTUP_WARM_UP:
+        # Requests arriving meanwhile wait for the model instead of loading it again
+        rag.start_warm_up()
+    server = RAGHTTPServer((args.host, args.port), rag)
+    logger.info(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
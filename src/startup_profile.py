@@ -0,0 +1,146 @@
+"""
+Cold-start profile: import time by package and time to a ready RAGSearch.
+
+Everything is measured in fresh child processes, so nothing is cached by
+this process. Prints JSON that can be saved per commit and compared, like
+the benchmark:
+
+    python -m src.startup_profile --output startup-$(git rev-parse --short HEAD).json
+
+The report has:
+    imports   total ``import src.search`` time and the packages taking most
+              of it (from ``python -X importtime``)
+    startup   seconds to import, construct RAGSearch, run each warm-up step
+              and answer a first retrieval-only query on the store
+
+Use ``--no-warm-up`` to see what the first query costs when nothing was
+loaded ahead of time. Set ``LLM_PROVIDER=fake`` to profile without an
+OpenAI key.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from typing import List, Dict, Any, Optional
+
+# Packages listed in the import report
+TOP_PACKAGES = 15
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """
+    Summarize ``python -X importtime`` output.
+
+    Returns:
+        Dictionary with 'total_s' (sum of self times) and 'packages', the
+        slowest top-level packages with the summed self time (seconds) of their modules
+    """
+    by_package: Dict[str, int] = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|")
+            self_us = int(self_us)
+        except ValueError:
+            continue
+        package = name.strip().split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+        total_us += self_us
+    ranked = sorted(by_package.items(), key=lambda item: -item[1])
+    return {
+        "total_s": round(total_us / 1e6, 3),
+        "packages": {p: round(us / 1e6, 3) for p, us in ranked[:TOP_PACKAGES]},
+    }
+
+
+def import_profile(module: str = "src.search") -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter with -X importtime and summarize it."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=_repo_root(), timeout=600,
+    )
+    if proc.returncode != 0:
+        raise ValueError(f"Importing {module} failed: {proc.stderr.strip().splitlines()[-1:]}")
+    return {"module": module, **parse_importtime(proc.stderr)}
+
+
+def startup_profile(store_dir: str, warm_up: bool = True, read_only: bool = False) -> Dict[str, Any]:
+    """Run measure_startup() in a fresh interpreter and return its timings."""
+    cmd = [sys.executable, "-m", "src.startup_profile", "--child", "--store-dir", store_dir]
+    if not warm_up:
+        cmd.append("--no-warm-up")
+    if read_only:
+        cmd.append("--read-only")
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=_repo_root(), timeout=1800)
+    if proc.returncode != 0:
+        raise ValueError(f"Startup profile failed: {proc.stderr.strip().splitlines()[-1:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(store_dir: str, warm_up: bool = True, read_only: bool = False) -> Dict[str, Any]:
+    """Time the startup steps in this process; call in a fresh interpreter only."""
+    timings: Dict[str, Any] = {}
+    start = time.perf_counter()
+    from src.search import RAGSearch
+    timings["import_s"] = round(time.perf_counter() - start, 3)
+
+    t0 = time.perf_counter()
+    rag = RAGSearch(store_dir, read_only=read_only)
+    timings["construct_s"] = round(time.perf_counter() - t0, 3)
+    timings["chunks"] = rag.store.ntotal
+
+    if warm_up:
+        timings["warm_up"] = rag.warm_up()
+
+    if rag.store.ntotal:
+        t0 = time.perf_counter()
+        rag.store.query("What is this document about?", top_k=5)
+        timings["first_query_s"] = round(time.perf_counter() - t0, 3)
+    timings["ready_s"] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+def _repo_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Profile import time and startup of RAGSearch")
+    parser.add_argument("--store-dir", default="faiss_store")
+    parser.add_argument("--module", default="src.search", help="Module for the import-time report")
+    parser.add_argument("--no-warm-up", action="store_true",
+                        help="Skip warm_up(), so the first query loads the models")
+    parser.add_argument("--read-only", action="store_true", help="Open the store read-only")
+    parser.add_argument("--output", default=None, help="JSON file to write (default: stdout)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    store_dir = os.path.abspath(args.store_dir)
+
+    if args.child:
+        print(json.dumps(measure_startup(store_dir, not args.no_warm_up, args.read_only)))
+        return
+
+    from src.benchmark import git_commit
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "imports": import_profile(args.module),
+        "startup": startup_profile(store_dir, not args.no_warm_up, args.read_only),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,125 +1,929 @@
 import os
+import time
+import heapq
+import shutil
+import hashlib
 import logging
+import threading
 import faiss
-import pickle
 import numpy as np
-from typing import List, Any, Dict, Optional
-from sentence_transformers import SentenceTransformer
-from src.embedding import EmbeddingPipeline
+from typing import List, Any, Dict, Optional, Tuple
+from src.embedding import EmbeddingPipeline, DEFAULT_EMBED_BATCH_SIZE
+from src.embedding_cache import EmbeddingCache
+from src.embedding_backends import MIN_COSINE, cosine_rows
+from src.registry import ReadWriteLock
+from src.index_types import IndexSpec, evaluate_index
+from src.segments import Segment, SegmentStorage, pick_compaction
+from src.metrics import metrics
+from src.bm25 import bm25_scores, query_hashes, reciprocal_rank_fusion
+from src.filters import (
+    chunk_columns, chunk_mask, file_type, matches_document, normalize_filter
+)
 
 logger = logging.getLogger(__name__)
 
+# (document key, source, content hash, pages or chunks) for a document awaiting indexing
+PendingDoc = Tuple[str, str, str, List[Any]]
+
+# Filtered searches on ANN segments score at most this many allowed rows exactly
+EXACT_FILTER_ROWS = 4096
+
+
+def document_id(source: str, content_hash: str) -> str:
+    """
+    Stable document id: derived from the source path when there is one,
+    so re-uploading a file replaces it; otherwise from the content.
+    """
+    if source:
+        key = "path:" + os.path.normpath(source)
+    else:
+        key = "content:" + content_hash
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def doc_key(doc_id: str, part: Optional[int] = None) -> str:
+    """
+    Registry key of a document, or of one part of a streamed file.
+
+    A large CSV, XLSX or JSON file is indexed in parts (see
+    data_loader.iter_file_parts) that share the file's doc_id, so filters,
+    listing and deletion treat them as one document, while each part is
+    written, replaced and skipped when unchanged on its own.
+    """
+    return doc_id if part is None else f"{doc_id}#{part}"
+
+
+def split_doc_key(key: str) -> Tuple[str, Optional[int]]:
+    """Inverse of doc_key(): (doc_id, part or None)."""
+    doc_id, _, part = key.partition("#")
+    return doc_id, (int(part) if part else None)
+
+
+def content_hash(docs: List[Any], salt: str = "") -> str:
+    """Hash of all page contents of one document, in order."""
+    h = hashlib.sha256()
+    if salt:
+        h.update(salt.encode("utf-8") + b"\0")
+    for d in docs:
+        h.update(d.page_content.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def group_by_source(docs: List[Any]) -> Dict[str, List[Any]]:
+    """Group loader output (e.g. one Document per PDF page) by source file."""
+    groups: Dict[str, List[Any]] = {}
+    for d in docs:
+        groups.setdefault(str(d.metadata.get("source", "")), []).append(d)
+    return groups
+
+
+def group_by_part(docs: List[Any]) -> Dict[Optional[int], List[Any]]:
+    """Split one source's documents by their 'part' (None unless the file was streamed)."""
+    parts: Dict[Optional[int], List[Any]] = {}
+    for d in docs:
+        parts.setdefault(d.metadata.get("part"), []).append(d)
+    return parts
+
+
 class FaissVectorStore:
-    def __init__(self, persist_dir: str = "faiss_store", model: str = "all-MiniLM-L6-v2"):
+    def __init__(self, persist_dir: str = "faiss_store", model: str = "all-MiniLM-L6-v2",
+                 max_segments: int = 8, use_mmap: bool = False,
+                 index_spec: Optional[IndexSpec] = None,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE, read_only: bool = False,
+                 hybrid: bool = False, rrf_k: int = 60, hybrid_candidates: int = 50,
+                 embedding_backend: str = "torch", embedding_threads: Optional[int] = None,
+                 chunking: str = "structured", max_segment_rows: Optional[int] = None):
+        """
+        Initialize the vector store.
+
+        Args:
+            persist_dir: Directory holding the manifest and segment files
+            model: SentenceTransformer model name
+            max_segments: Segment count above which background compaction runs
+            use_mmap: Memory-map segment vectors and texts read-only instead of
+                loading them into the heap
+            index_spec: FAISS index type and parameters (default: exact flat)
+            embedding_cache: Persistent cache consulted before encoding chunks
+            embed_batch_size: Chunks per model.encode call
+            read_only: Never modify files, for extra processes serving queries
+                while another process writes; call refresh() to see its changes
+            hybrid: Fuse dense results with BM25 keyword results for text queries
+            rrf_k: Reciprocal-rank fusion constant; larger values flatten rank differences
+            hybrid_candidates: Results taken from each retriever before fusion
+            embedding_backend: "torch", "onnx" or "onnx-int8" (see embedding_backends)
+            embedding_threads: CPU threads per encode call (None: the runtime's default)
+            chunking: "structured" or "recursive" (see src.chunking)
+            max_segment_rows: Largest segment compaction builds (None: no limit);
+                bounds the memory a merge needs on very large stores
+        """
         self.persist_dir = persist_dir
         os.makedirs(persist_dir, exist_ok=True)
 
-        self.index: Optional[faiss.Index] = None
-        self.metadata: List[Dict[str, Any]] = []
+        self.index_spec = index_spec or IndexSpec()
+        self.storage = SegmentStorage(persist_dir, use_mmap=use_mmap, spec=self.index_spec,
+                                      read_only=read_only)
+        self.read_only = read_only
+        # Manifest file identity at the last load, and when refresh() last checked it
+        self._manifest_stamp: Optional[Tuple[int, int]] = None
+        self._last_refresh = 0.0
+        self.segments: List[Segment] = []
+        self.max_segments = max_segments
+        self.max_segment_rows = max_segment_rows
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        self.hybrid_candidates = hybrid_candidates
+
+        # Live documents by doc_key(), and the keys of each doc_id
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._doc_keys: Dict[str, List[str]] = {}
+        # Excludes tombstoned chunk ids at search time; None when nothing is deleted
+        self._live_mask: Optional[np.ndarray] = None
+        self._live_bitmap: Optional[np.ndarray] = None
+        self._live_sel: Optional[faiss.IDSelector] = None
+
+        # Queries use the pipeline's model; it is loaded on first encode, not here
+        self.pipeline = EmbeddingPipeline(model, cache=embedding_cache,
+                                          batch_size=embed_batch_size, backend=embedding_backend,
+                                          threads=embedding_threads, chunking=chunking)
+
+        # Many concurrent queries, exclusive add/load/clear
+        self._lock = ReadWriteLock()
+        # Bumped by load/clear so an in-flight compaction knows its input is stale
+        self._generation = 0
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+
+    @property
+    def model(self) -> Any:
+        """The embedding model (the pipeline's shared instance)."""
+        return self.pipeline.model
+
+    @property
+    def ntotal(self) -> int:
+        """Total number of live chunks across all segments."""
+        return sum(s.live_count for s in self.segments)
+
+    @property
+    def document_count(self) -> int:
+        """Number of live documents, counting a streamed file once however many parts it has."""
+        return len(self._doc_keys)
+
+    @property
+    def data_version(self) -> str:
+        """Changes whenever documents are added, replaced, deleted or cleared."""
+        return self.storage.data_version
 
-        # Use pipeline's model consistently
-        self.pipeline = EmbeddingPipeline(model)
-        self.model = self.pipeline.model  # Use the same model instance
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """Return the live documents with their ids, sources and chunk counts (and 'parts' if streamed)."""
+        with self._lock.read_lock():
+            listed = []
+            for entries in (self._entries(doc_id) for doc_id in self._doc_keys):
+                first = min(entries, key=lambda d: d["id_start"])
+                doc = {**first, "chunks": sum(d["id_end"] - d["id_start"] for d in entries)}
+                if first.get("part") is not None:
+                    doc.pop("part")
+                    doc["parts"] = len(entries)
+                listed.append(doc)
+            return sorted(listed, key=lambda d: d["id_start"])
 
-    def add_documents(self, docs: List[Any]) -> None:
-        """Add documents to the vector store."""
+    def add_documents(self, docs: List[Any]) -> Dict[str, int]:
+        """
+        Add documents to the vector store, one document per source file.
+
+        A source that is already indexed with identical content is skipped,
+        and one with changed content replaces the old version.
+
+        Returns:
+            Counts of 'added', 'replaced', 'unchanged' documents and new 'chunks'
+        """
         if not docs:
             raise ValueError("Cannot add empty document list")
-        
+        self.storage.check_writable("add documents to")
+        return self._upsert(group_by_source(docs))
+
+    def upsert_document(self, docs: List[Any], source: Optional[str] = None) -> Dict[str, int]:
+        """
+        Insert or replace a single document made of one or more loader Documents.
+
+        Args:
+            docs: Documents (e.g. pages) of one file
+            source: Source path identifying the document (default: from metadata)
+        """
+        if not docs:
+            raise ValueError("Cannot upsert empty document list")
+        self.storage.check_writable("add documents to")
+        if source is None:
+            source = str(docs[0].metadata.get("source", ""))
+        return self._upsert({source: docs})
+
+    def delete_document(self, doc_id: str) -> bool:
+        """
+        Remove a document's chunks from search results.
+
+        The chunks are tombstoned and physically dropped by the next
+        compaction of their segment.
+
+        Returns:
+            True if the document existed
+        """
+        self.storage.check_writable("delete from")
+        with self._lock.write_lock():
+            entries = self._entries(doc_id)
+            if not entries:
+                return False
+            for doc in entries:
+                self._forget(doc)
+            self.storage.commit(self.segments)
+            self._refresh_live_selector()
+            self._schedule_compaction()
+        logger.info(f"Deleted document {doc_id} ({entries[0]['source'] or 'no source'})")
+        return True
+
+    def prune_parts(self, source: str, parts: int) -> int:
+        """
+        Delete what a streamed file no longer has after being read in ``parts`` parts.
+
+        Parts numbered ``parts`` and up (the file shrank) and a version
+        indexed whole before streaming are removed.
+
+        Returns:
+            Number of parts or documents removed
+        """
+        self.storage.check_writable("delete from")
+        doc_id = document_id(source, "")
+        with self._lock.write_lock():
+            stale = [d for d in self._entries(doc_id) if d.get("part") is None or d["part"] >= parts]
+            if not stale:
+                return 0
+            for doc in stale:
+                self._forget(doc)
+            self.storage.commit(self.segments)
+            self._refresh_live_selector()
+            self._schedule_compaction()
+        logger.info(f"Removed {len(stale)} stale parts of {source}")
+        return len(stale)
+
+    def _entries(self, doc_id: str) -> List[Dict[str, Any]]:
+        """All registry entries of a document: one, or one per part (call with a lock held)."""
+        return [self.documents[key] for key in self._doc_keys.get(doc_id, ())]
+
+    def _forget(self, doc: Dict[str, Any]) -> None:
+        """Tombstone a document and drop it from the registry (call with write lock held)."""
+        self.storage.delete_range(self.segments, doc["id_start"], doc["id_end"])
+        key = doc_key(doc["doc_id"], doc.get("part"))
+        del self.documents[key]
+        keys = self._doc_keys[doc["doc_id"]]
+        keys.remove(key)
+        if not keys:
+            del self._doc_keys[doc["doc_id"]]
+
+    def _register(self, doc: Dict[str, Any]) -> None:
+        # Entries written before metadata filtering lack these
+        doc.setdefault("file_type", file_type(doc["source"]))
+        doc.setdefault("indexed_at", None)
+        key = doc_key(doc["doc_id"], doc.get("part"))
+        if key not in self.documents:
+            self._doc_keys.setdefault(doc["doc_id"], []).append(key)
+        self.documents[key] = doc
+
+    def _is_current(self, key: str, chash: str) -> bool:
+        """
+        True if this key already holds this exact content.
+
+        Only the same key counts: a copy of a file under another path is its
+        own document, listed and deleted independently of the original.
+        """
+        existing = self.documents.get(key)
+        return existing is not None and existing["content_hash"] == chash
+
+    def plan_upsert(self, groups: Dict[str, List[Any]]) -> Tuple[List[PendingDoc], int]:
+        """
+        Decide which documents need indexing.
+
+        Returns:
+            Tuple of (pending documents as (doc_key, source, content_hash, docs),
+            number of documents or parts already indexed with identical content)
+        """
+        pending: List[PendingDoc] = []
+        unchanged = 0
+        with self._lock.read_lock():
+            for source, group in groups.items():
+                for part, docs in group_by_part(group).items():
+                    chash = content_hash(docs)
+                    key = doc_key(document_id(source, chash), part)
+                    if part is not None:
+                        # Identical rows elsewhere in the file are still their own part
+                        chash = content_hash(docs, salt=key)
+                    if self._is_current(key, chash):
+                        unchanged += 1
+                        continue
+                    pending.append((key, source, chash, docs))
+        return pending, unchanged
+
+    def chunk_pending(self, pending: List[PendingDoc]) -> List[PendingDoc]:
+        """Replace each pending document's pages with its chunks."""
+        # Chunk per document so each document's chunks get a contiguous id range
+        return [(i, s, h, self.pipeline.chunk(g)) for i, s, h, g in pending]
+
+    def embed_pending(self, pending: List[PendingDoc]) -> np.ndarray:
+        """Embed and L2-normalize the chunks of chunked pending documents, in order."""
+        chunks = [c for *_, doc_chunks in pending for c in doc_chunks]
+        if not chunks:
+            raise ValueError("No chunks created from documents")
+
+        emb = self.pipeline.embed(chunks)
+        if emb.shape[0] == 0:
+            raise ValueError("No embeddings generated")
+
+        faiss.normalize_L2(emb)
+        return emb
+
+    def write_pending(self, pending: List[PendingDoc], emb: np.ndarray) -> Dict[str, int]:
+        """
+        Write chunked, embedded documents as one new segment, replacing older versions.
+
+        Returns:
+            Counts of 'added', 'replaced', 'unchanged' documents and new 'chunks'
+        """
+        self.storage.check_writable("add documents to")
+        stats = {"added": 0, "replaced": 0, "unchanged": 0, "chunks": 0}
+        with self._lock.write_lock():
+            # Re-check: a concurrent upload may have indexed the same content
+            keep = np.zeros(emb.shape[0], dtype=bool)
+            accepted, row = [], 0
+            for doc_id, source, chash, doc_chunks in pending:
+                if doc_chunks and not self._is_current(doc_id, chash):
+                    keep[row:row + len(doc_chunks)] = True
+                    accepted.append((doc_id, source, chash, doc_chunks))
+                else:
+                    stats["unchanged"] += 1
+                row += len(doc_chunks)
+            if not accepted:
+                return stats
+
+            ids = self.storage.allocate_ids(int(keep.sum()))
+            indexed_at = round(time.time(), 3)
+            doc_entries, texts, chunks, start = [], [], [], 0
+            for key, source, chash, doc_chunks in accepted:
+                end = start + len(doc_chunks)
+                doc_id, part = split_doc_key(key)
+                entry = {
+                    "doc_id": doc_id,
+                    "source": source,
+                    "content_hash": chash,
+                    "file_type": file_type(source),
+                    "indexed_at": indexed_at,
+                    "id_start": int(ids[start]),
+                    "id_end": int(ids[end - 1]) + 1,
+                }
+                if part is not None:
+                    entry["part"] = part
+                doc_entries.append(entry)
+                texts.extend(c.page_content.encode("utf-8") for c in doc_chunks)
+                chunks.extend(doc_chunks)
+                start = end
+
+            save_start = time.perf_counter()
+            segment = self.storage.write_segment(
+                self.storage.allocate_name(), emb[keep], texts, ids, doc_entries,
+                chunk_columns(chunks)
+            )
+            self.storage.record_embedding({
+                "model": self.pipeline.model_name,
+                "backend": self.pipeline.backend,
+                "dimension": int(emb.shape[1]),
+            })
+            for entry in doc_entries:
+                old = self.documents.get(doc_key(entry["doc_id"], entry.get("part")))
+                if old is not None:
+                    self._forget(old)
+                    stats["replaced"] += 1
+                else:
+                    stats["added"] += 1
+                self._register(entry)
+            self.segments.append(segment)
+            self.storage.commit(self.segments)
+            metrics.observe("rag_ingest_stage_seconds", time.perf_counter() - save_start, stage="save")
+            self._refresh_live_selector()
+            self._schedule_compaction()
+
+        stats["chunks"] = len(ids)
+        metrics.inc("rag_ingested_chunks_total", len(ids))
+        logger.info(f"Added {len(ids)} chunks to vector store as {segment.name} "
+                    f"({stats['added']} new, {stats['replaced']} replaced documents)")
+        return stats
+
+    def _upsert(self, groups: Dict[str, List[Any]]) -> Dict[str, int]:
         try:
-            chunks = self.pipeline.chunk(docs)
-            if not chunks:
-                raise ValueError("No chunks created from documents")
-            
-            emb = self.pipeline.embed(chunks)
-            if emb.shape[0] == 0:
-                raise ValueError("No embeddings generated")
-
-            faiss.normalize_L2(emb)
-
-            if self.index is None:
-                self.index = faiss.IndexFlatIP(emb.shape[1])
-                logger.info(f"Created new FAISS index with dimension {emb.shape[1]}")
-
-            self.index.add(emb)
-            self.metadata.extend([{"text": c.page_content} for c in chunks])
-            self.save()
-            logger.info(f"Added {len(chunks)} chunks to vector store")
+            pending, unchanged = self.plan_upsert(groups)
+            if pending:
+                # Chunking and embedding run unlocked; only write_pending is exclusive
+                pending = self.chunk_pending(pending)
+                emb = self.embed_pending(pending)
+                stats = self.write_pending(pending, emb)
+                stats["unchanged"] += unchanged
+            else:
+                logger.info(f"All {unchanged} documents already indexed")
+                stats = {"added": 0, "replaced": 0, "unchanged": unchanged, "chunks": 0}
+            # The given parts of a streamed file are all of it
+            for source, group in groups.items():
+                parts = [part for part in group_by_part(group) if part is not None]
+                if parts:
+                    self.prune_parts(source, max(parts) + 1)
+            return stats
         except Exception as e:
             logger.error(f"Error adding documents: {str(e)}", exc_info=True)
             raise
 
+    def _refresh_live_selector(self) -> None:
+        """Rebuild the ID selector that hides tombstoned chunks (call with write lock held)."""
+        if not self.storage.tombstones:
+            self._live_mask = None
+            self._live_bitmap = None
+            self._live_sel = None
+            return
+        live = self.storage.tombstones.live_bitmap(self.storage.next_id)
+        # Kept unpacked too, for index types that filter results instead of taking the selector
+        self._live_mask = live
+        # The selector holds a raw pointer, so keep the packed array alive alongside it
+        self._live_bitmap = np.packbits(live, bitorder="little")
+        self._live_sel = faiss.IDSelectorBitmap(len(live), faiss.swig_ptr(self._live_bitmap))
+
+    def _replace_segments(self, old: List[Segment], merged: Optional[Segment]) -> None:
+        """Swap merged segments in and commit (call with write lock held)."""
+        old_names = {s.name for s in old}
+        self.segments = [s for s in self.segments if s.name not in old_names]
+        if merged is not None:
+            self.segments.append(merged)
+        self.storage.tombstones.prune(self.segments)
+        self.storage.commit(self.segments, data_changed=False)
+        self._refresh_live_selector()
+        for s in old:
+            self.storage.delete_segment_files(s.name)
+
     def save(self) -> None:
-        """Save the index and metadata to disk."""
-        if self.index is None:
-            raise ValueError("Cannot save: index is None")
-        
+        """Rewrite the whole store as a single compacted segment."""
+        self.storage.check_writable("save")
+        with self._compaction_lock, self._lock.write_lock():
+            if not self.segments:
+                raise ValueError("Cannot save: vector store is empty")
+
+            try:
+                old = self.segments
+                merged = self.storage.merge(self.storage.allocate_name(), old)
+                self._replace_segments(old, merged)
+                logger.info(f"Saved vector store to {self.persist_dir}")
+            except Exception as e:
+                logger.error(f"Error saving vector store: {str(e)}", exc_info=True)
+                raise
+
+    def compact(self) -> bool:
+        """
+        Run one compaction round if the store has too many segments,
+        deleted rows to reclaim, or a flat segment due for an ANN index.
+
+        The merged segment is written without holding the store lock, so
+        queries and adds continue meanwhile; only the manifest swap is exclusive.
+
+        Returns:
+            True if segments were merged
+        """
+        if self.read_only:
+            return False
+        with self._compaction_lock:
+            with self._lock.write_lock():
+                picked = pick_compaction(self.segments, self.max_segments, self.index_spec,
+                                         self.max_segment_rows)
+                if picked is None:
+                    return False
+                generation = self._generation
+                name = self.storage.allocate_name()
+
+            merged = self.storage.merge(name, picked)
+
+            with self._lock.write_lock():
+                if generation != self._generation:
+                    # Store was cleared or reloaded while we were merging
+                    self.storage.delete_segment_files(name)
+                    return False
+                # Rows deleted while we were merging are still tombstoned
+                if merged is not None:
+                    merged.deleted = int(self.storage.tombstones.mask(merged.ids).sum())
+                self._replace_segments(picked, merged)
+
+            count = merged.count if merged is not None else 0
+            logger.info(f"Compacted {len(picked)} segments into {name} ({count} chunks)")
+            return True
+
+    def _schedule_compaction(self) -> None:
+        """Start a background compaction thread if needed (call with write lock held)."""
+        if pick_compaction(self.segments, self.max_segments, self.index_spec,
+                           self.max_segment_rows) is None:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self._compact_in_background, name="faiss-compaction", daemon=True
+        )
+        self._compaction_thread.start()
+
+    def _compact_in_background(self) -> None:
         try:
-            index_path = os.path.join(self.persist_dir, "faiss.index")
-            meta_path = os.path.join(self.persist_dir, "meta.pkl")
-            
-            faiss.write_index(self.index, index_path)
-            with open(meta_path, "wb") as f:
-                pickle.dump(self.metadata, f)
-            logger.info(f"Saved vector store to {self.persist_dir}")
+            while self.compact():
+                pass
         except Exception as e:
-            logger.error(f"Error saving vector store: {str(e)}", exc_info=True)
-            raise
+            logger.error(f"Background compaction failed: {str(e)}", exc_info=True)
+
+    def evaluate_index_types(self, specs: List[IndexSpec], k: int = 10,
+                             n_queries: int = 200, max_vectors: int = 1_000_000) -> List[Dict[str, Any]]:
+        """
+        Report recall@k and latency of index types against exact search on this store's data.
+
+        Args:
+            specs: Index configurations to compare
+            k: Number of neighbours for recall@k
+            n_queries: Number of sampled queries
+            max_vectors: Cap on vectors copied out of the store for the comparison
+
+        Returns:
+            One dict per index type, flat baseline first
+        """
+        with self._lock.read_lock():
+            parts, remaining = [], max_vectors
+            for seg in self.segments:
+                if remaining <= 0:
+                    break
+                parts.append(np.asarray(seg.vectors()[:remaining], dtype=np.float32))
+                remaining -= parts[-1].shape[0]
+        if not parts:
+            raise ValueError("Cannot evaluate index types on an empty store")
+        return evaluate_index(np.vstack(parts), specs, k=k, n_queries=n_queries)
+
+    def exists(self) -> bool:
+        """Return True if a persisted index exists in persist_dir."""
+        return self.storage.exists()
+
+    def clear(self) -> None:
+        """Remove all documents, both in memory and on disk."""
+        self.storage.check_writable("clear")
+        with self._lock.write_lock():
+            shutil.rmtree(self.persist_dir, ignore_errors=True)
+            os.makedirs(self.persist_dir, exist_ok=True)
+            self._reset()
+        logger.info(f"Cleared vector store in {self.persist_dir}")
+
+    def _reset(self) -> None:
+        """Forget all segments and documents in memory (call with write lock held)."""
+        self.segments = []
+        self.documents = {}
+        self._doc_keys = {}
+        self.storage.reset()
+        self._manifest_stamp = None
+        self._refresh_live_selector()
+        self._generation += 1
 
     def load(self) -> None:
-        """Load the index and metadata from disk."""
-        index_path = os.path.join(self.persist_dir, "faiss.index")
-        meta_path = os.path.join(self.persist_dir, "meta.pkl")
-        
-        if not os.path.exists(index_path):
-            raise FileNotFoundError(f"Index file not found: {index_path}")
-        if not os.path.exists(meta_path):
-            raise FileNotFoundError(f"Metadata file not found: {meta_path}")
-        
+        """Load all segments listed in the manifest from disk."""
         try:
-            self.index = faiss.read_index(index_path)
-            with open(meta_path, "rb") as f:
-                self.metadata = pickle.load(f)
-            logger.info(f"Loaded vector store from {self.persist_dir} ({len(self.metadata)} chunks)")
+            with self._lock.write_lock():
+                # Taken before reading, so a commit during the load is seen by refresh()
+                stamp = self.storage.manifest_stamp()
+                self.segments = self.storage.load()
+                self._manifest_stamp = stamp
+                self.documents = {}
+                self._doc_keys = {}
+                tombstones = self.storage.tombstones
+                for seg in self.segments:
+                    for doc in seg.docs:
+                        if not tombstones.covers(doc["id_start"], doc["id_end"]):
+                            self._register(doc)
+                self._refresh_live_selector()
+                self._generation += 1
+            logger.info(f"Loaded vector store from {self.persist_dir} "
+                        f"({self.ntotal} chunks, {len(self.documents)} documents "
+                        f"in {len(self.segments)} segments)")
         except Exception as e:
             logger.error(f"Error loading vector store: {str(e)}", exc_info=True)
             raise
 
-    def query(self, text: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Query the vector store for similar documents."""
-        if self.index is None:
+    def check_embedding_compatibility(self, min_cosine: float = MIN_COSINE, sample_size: int = 32) -> None:
+        """
+        Refuse a store whose vectors the configured embedding model cannot match.
+
+        The manifest records the model, backend and dimension that produced
+        the stored vectors. Another model is refused outright. Another
+        backend (or, in stores from before backends were recorded, any
+        backend but torch) is checked numerically: a sample of stored chunks
+        is re-encoded and every vector must have at least ``min_cosine``
+        cosine similarity with the stored one.
+
+        Raises:
+            ValueError: If queries would be compared with incompatible vectors
+        """
+        recorded = self.storage.embedding
+        current = self.pipeline.backend
+        if not self.segments:
+            return
+        if recorded is None:
+            if current == "torch":
+                return
+        else:
+            if recorded["model"] != self.pipeline.model_name:
+                raise ValueError(
+                    f"Vector store {self.persist_dir} was built with embedding model "
+                    f"'{recorded['model']}', not '{self.pipeline.model_name}'. "
+                    f"Set EMBEDDING_MODEL={recorded['model']} or clear and re-index the documents."
+                )
+            if recorded["backend"] == current:
+                return
+
+        with self._lock.read_lock():
+            seg = max(self.segments, key=lambda s: s.count)
+            rows = np.unique(np.linspace(0, seg.count - 1, min(sample_size, seg.count)).astype(np.int64))
+            stored = seg.vectors_at(rows)
+            texts = [seg.texts[int(r)] for r in rows]
+        fresh = np.asarray(self.model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+        built_with = f"{recorded['model']} ({recorded['backend']})" if recorded else "an unrecorded backend"
+        if fresh.shape[1] != stored.shape[1]:
+            raise ValueError(
+                f"Vector store {self.persist_dir} holds {stored.shape[1]}-dimensional vectors from "
+                f"{built_with}; the {current} backend produces {fresh.shape[1]} dimensions. "
+                f"Clear and re-index the documents to switch."
+            )
+        worst = float(cosine_rows(fresh, stored).min())
+        if worst < min_cosine:
+            raise ValueError(
+                f"Embeddings from the {current} backend do not match the vectors in "
+                f"{self.persist_dir} (built with {built_with}): cosine similarity down to "
+                f"{worst:.4f}, below {min_cosine}. Use the original backend or clear and re-index."
+            )
+        logger.info(f"{current} embeddings match the stored vectors (min cosine {worst:.4f} "
+                    f"on {len(rows)} chunks)")
+
+    def refresh(self, min_interval_s: float = 1.0) -> bool:
+        """
+        Reload if another process has committed changes since the last load.
+
+        Meant for read-only stores following a writer process. Checks the
+        manifest at most once per ``min_interval_s``; a failed reload (e.g.
+        racing a compaction) keeps serving the current state. A manifest
+        that has disappeared means the writer cleared the store, so this
+        store is emptied too.
+
+        Returns:
+            True if the store was reloaded
+        """
+        now = time.monotonic()
+        if now - self._last_refresh < min_interval_s:
+            return False
+        self._last_refresh = now
+        stamp = self.storage.manifest_stamp()
+        if stamp == self._manifest_stamp:
+            return False
+        if stamp is None:
+            with self._lock.write_lock():
+                self._reset()
+            logger.info(f"Vector store in {self.persist_dir} was cleared, emptied this copy")
+            return True
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            logger.warning(f"Could not reload vector store, keeping current state: {str(e)}")
+            return False
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Return normalized (n, dim) float32 embeddings of queries, encoded in one pass."""
+        # Use pipeline's model for consistency; encoding needs no lock
+        with metrics.timer("rag_query_stage_seconds", stage="encode"):
+            q = self.model.encode(texts, batch_size=max(1, len(texts))).astype("float32")
+            faiss.normalize_L2(q)
+        return q
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """Return the normalized (1, dim) float32 embedding of a query."""
+        return self.encode_queries([text])
+
+    def _filter_selector(self, filter: Dict[str, Any]) -> Tuple[np.ndarray, faiss.IDSelector, np.ndarray]:
+        """
+        Resolve a normalized metadata filter to the chunk ids it allows (call with read lock held).
+
+        Document conditions select whole id ranges and chunk conditions are
+        evaluated on the segments' metadata columns. Only live documents are
+        considered, so tombstoned chunks are excluded as well.
+
+        Returns:
+            Tuple of (bool array over all chunk ids, FAISS selector, packed
+            bitmap the selector points into, which must be kept alive)
+        """
+        allowed = np.zeros(self.storage.next_id, dtype=bool)
+        if set(filter) == {"doc_id"}:
+            docs = [doc for d in filter["doc_id"] for doc in self._entries(d)]
+        else:
+            docs = [d for d in self.documents.values() if matches_document(d, filter)]
+        for doc in docs:
+            allowed[doc["id_start"]:doc["id_end"]] = True
+
+        for seg in self.segments:
+            mask = chunk_mask(seg.columns, filter)
+            if mask is not None:
+                allowed[seg.ids[~mask]] = False
+
+        bitmap = np.packbits(allowed, bitorder="little")
+        return allowed, faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap)), bitmap
+
+    def _search_segment(self, seg: Segment, q: np.ndarray, k: int, sel: Optional[faiss.IDSelector],
+                        allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Search one segment, restricted to allowed ids when filtering; same output as Segment.search."""
+        if allowed is not None and not seg.is_flat:
+            rows = np.flatnonzero(allowed[seg.ids])
+            if len(rows) <= EXACT_FILTER_ROWS:
+                # Few candidates: exact scores beat an ANN graph/list walk that skips most entries
+                scores = q @ np.asarray(seg.vectors())[rows].T
+                order = np.argsort(-scores, axis=1)[:, :k]
+                D = np.full((len(q), k), -np.inf, dtype=np.float32)
+                I = np.full((len(q), k), -1, dtype=np.int64)
+                D[:, :order.shape[1]] = np.take_along_axis(scores, order, axis=1)
+                I[:, :order.shape[1]] = seg.ids[rows][order]
+                return D, I
+        return seg.search(q, k, sel=sel, allowed=self._live_mask if allowed is None else allowed)
+
+    def _keyword_hits(self, text: str, n: int,
+                      allowed: Optional[np.ndarray] = None) -> List[Tuple[float, Segment, int]]:
+        """Top-n live chunks by BM25 score as (score, segment, chunk id) (call with read lock held)."""
+        hashes = query_hashes(text)
+        hits: List[Tuple[float, Segment, int]] = []
+        for seg, (rows, scores) in zip(self.segments, bm25_scores([s.bm25 for s in self.segments], hashes)):
+            if len(rows) == 0:
+                continue
+            ids = seg.ids[rows]
+            live = allowed[ids] if allowed is not None else ~self.storage.tombstones.mask(ids)
+            ids, scores = ids[live], scores[live]
+            if len(ids) > n:
+                top = np.argpartition(-scores, n - 1)[:n]
+                ids, scores = ids[top], scores[top]
+            hits.extend((float(score), seg, int(chunk_id)) for score, chunk_id in zip(scores, ids))
+        return heapq.nlargest(n, hits, key=lambda h: h[0])
+
+    @staticmethod
+    def _result(seg: Segment, chunk_id: int, score: float) -> Dict[str, Any]:
+        """A search hit with its text and citation: document, source, page and row."""
+        doc = seg.document_of(chunk_id) or {}
+        return {
+            "score": score,
+            "text": seg.text(chunk_id),
+            "chunk_id": chunk_id,
+            "doc_id": doc.get("doc_id"),
+            "source": doc.get("source", ""),
+            **seg.chunk_metadata(chunk_id),
+        }
+
+    def query_vectors(self, q: np.ndarray, top_k: int = 5, texts: Optional[List[str]] = None,
+                      filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search with a matrix of normalized query embeddings.
+
+        Each segment is searched once for all rows, so a batch costs one
+        multi-row FAISS call per segment instead of one call per query.
+
+        Args:
+            q: Query embeddings, one row per query
+            top_k: Number of results per query
+            texts: Query texts, one per row; with hybrid search enabled the
+                dense and BM25 rankings are fused by reciprocal rank
+            filter: Metadata filter applied to every row (see query())
+
+        Returns:
+            One result list per row, as returned by query()
+        """
+        if top_k <= 0:
+            raise ValueError("top_k must be positive")
+        filter = normalize_filter(filter)
+        hybrid = self.hybrid and texts is not None
+        if hybrid and len(texts) != len(q):
+            raise ValueError(f"Got {len(texts)} query texts for {len(q)} embeddings")
+        n_candidates = max(top_k, self.hybrid_candidates) if hybrid else top_k
+
+        with metrics.timer("rag_query_stage_seconds", stage="search"), self._lock.read_lock():
+            # Checked under the lock: clear() may run between a caller's checks and here
+            if self.ntotal == 0:
+                logger.warning("Query attempted on empty index")
+                return [[] for _ in range(len(q))]
+
+            sel, allowed, bitmap = self._live_sel, None, None
+            if filter is not None:
+                # The selector restricts the search itself, so no candidates are fetched and dropped
+                allowed, sel, bitmap = self._filter_selector(filter)
+                if not allowed.any():
+                    return [[] for _ in range(len(q))]
+
+            # Search every segment and keep the global top candidates per query
+            hits: List[List[Any]] = [[] for _ in range(len(q))]
+            for seg in self.segments:
+                if allowed is not None and not allowed[seg.ids].any():
+                    continue
+                D, I = self._search_segment(seg, q, n_candidates, sel, allowed)
+                for row in range(len(q)):
+                    hits[row].extend(
+                        (float(score), seg, int(chunk_id))
+                        for score, chunk_id in zip(D[row], I[row]) if chunk_id >= 0
+                    )
+            dense = [heapq.nlargest(n_candidates, row_hits, key=lambda h: h[0]) for row_hits in hits]
+
+            if not hybrid:
+                return [
+                    [self._result(seg, chunk_id, score) for score, seg, chunk_id in row_hits]
+                    for row_hits in dense
+                ]
+
+            results = []
+            for row, (text, dense_hits) in enumerate(zip(texts, dense)):
+                keyword_hits = self._keyword_hits(text, n_candidates, allowed)
+                vector_score = {chunk_id: score for score, _, chunk_id in dense_hits}
+                bm25_score = {chunk_id: score for score, _, chunk_id in keyword_hits}
+                segment_of = {chunk_id: seg for _, seg, chunk_id in dense_hits + keyword_hits}
+                fused = reciprocal_rank_fusion(
+                    [[h[2] for h in dense_hits], [h[2] for h in keyword_hits]], k=self.rrf_k
+                )
+                # Keyword-only hits get their cosine too, so every result has a dense score
+                for chunk_id, _ in fused[:top_k]:
+                    if chunk_id not in vector_score:
+                        seg = segment_of[chunk_id]
+                        vector = seg.vectors_at(np.array([seg.row_of(chunk_id)]))[0]
+                        vector_score[chunk_id] = float(q[row] @ vector)
+                results.append([
+                    {
+                        **self._result(segment_of[chunk_id], chunk_id, score),
+                        "vector_score": vector_score.get(chunk_id),
+                        "bm25_score": bm25_score.get(chunk_id)
+                    }
+                    for chunk_id, score in fused[:top_k]
+                ])
+            return results
+
+    def query(self, text: str, top_k: int = 5, embedding: Optional[np.ndarray] = None,
+              filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Query the vector store for similar documents.
+
+        Args:
+            text: Query text
+            top_k: Number of results
+            embedding: Precomputed encode_query(text), to avoid encoding twice
+            filter: Only search chunks matching this metadata, e.g.
+                ``{"source": "docs/manual.pdf", "page": [3, 4]}``; see
+                filters.normalize_filter for the supported fields
+
+        Returns:
+            Results best first, each with 'score', 'text' and the citation
+            fields 'chunk_id', 'doc_id', 'source', 'page', 'row' and
+            'row_end' (last row of a chunk of grouped rows). With hybrid
+            search 'score' is the fused reciprocal-rank score, and
+            'vector_score' (cosine similarity) and 'bm25_score' (None if
+            not a keyword match) are added
+        """
+        if not self.segments:
             raise ValueError("Index not initialized. Please load or add documents first.")
-        
+
         if not text or not text.strip():
             raise ValueError("Query text cannot be empty")
-        
+
         if top_k <= 0:
             raise ValueError("top_k must be positive")
-        
-        # Check if index is empty
-        if self.index.ntotal == 0:
-            logger.warning("Query attempted on empty index")
-            return []
-        
+
         try:
-            # Use pipeline's model for consistency
-            q = self.model.encode([text]).astype("float32")
-            faiss.normalize_L2(q)
-            
-            # Ensure top_k doesn't exceed available documents
-            actual_top_k = min(top_k, self.index.ntotal)
-            D, I = self.index.search(q, actual_top_k)
-
-            results = [
-                {
-                    "score": float(D[0][i]),
-                    "text": self.metadata[idx]["text"]
-                }
-                for i, idx in enumerate(I[0]) if idx < len(self.metadata)
-            ]
-            
+            q = self.encode_query(text) if embedding is None else embedding
+            results = self.query_vectors(q, top_k, texts=[text], filter=filter)[0]
             logger.debug(f"Query returned {len(results)} results")
             return results
         except Exception as e:
             logger.error(f"Error querying vector store: {str(e)}", exc_info=True)
             raise
+
+    def query_batch(self, texts: List[str], top_k: int = 5,
+                    filter: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Query many texts at once, e.g. for offline evaluation.
+
+        All texts are encoded in one forward pass and searched with one
+        multi-row search per segment.
+
+        Returns:
+            One result list per text, in input order
+        """
+        if not self.segments:
+            raise ValueError("Index not initialized. Please load or add documents first.")
+
+        if any(not t or not t.strip() for t in texts):
+            raise ValueError("Query text cannot be empty")
+
+        if not texts:
+            return []
+
+        try:
+            return self.query_vectors(self.encode_queries(texts), top_k, texts=texts, filter=filter)
+        except Exception as e:
+            logger.error(f"Error querying vector store: {str(e)}", exc_info=True)
+            raise
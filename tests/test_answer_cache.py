@@ -0,0 +1,34 @@
+import numpy as np
+from src.answer_cache import AnswerCache
+
+
+def _unit(i: int, dim: int = 32) -> np.ndarray:
+    v = np.zeros(dim, dtype=np.float32)
+    v[i % dim] = 1.0
+    v[(i * 7 + 3) % dim] += 0.5
+    return v / np.linalg.norm(v)
+
+
+def test_new_data_version_keeps_other_stores_answers():
+    cache = AnswerCache()
+    cache.put("q", _unit(1), "storeA:1", 5, {"answer": "a"})
+    cache.put("q", _unit(1), "storeB:1", 5, {"answer": "b"})
+
+    assert cache.get(_unit(1), "storeA:2", 5) is None
+    assert cache.get(_unit(1), "storeB:1", 5) == {"answer": "b"}
+    assert cache.get(_unit(1), "storeA:1", 5) is None
+
+
+def test_entries_stay_aligned_through_growth_and_eviction(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), max_entries=20, threshold=0.999)
+    for i in range(100):
+        cache.put(f"q{i}", _unit(i), "s:1", 5, {"answer": i})
+
+    assert cache.stats()["entries"] == 20
+    # Distinct embeddings repeat every 32 puts; only the latest 20 remain
+    for i in range(80, 100):
+        assert cache.get(_unit(i), "s:1", 5) == {"answer": i}
+    assert cache.get(_unit(79), "s:1", 5) is None
+
+    reopened = AnswerCache(str(tmp_path / "answers.sqlite"), max_entries=20, threshold=0.999)
+    assert reopened.get(_unit(99), "s:1", 5) == {"answer": 99}
@@ -0,0 +1,35 @@
+import json
+import pytest
+from src import data_loader
+from src.data_loader import iter_json_records
+
+
+def _records(tmp_path, content: str):
+    path = tmp_path / "data.json"
+    path.write_text(content, encoding="utf-8")
+    return list(iter_json_records(str(path)))
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('"plain text"', [("plain text", {"row": 0})]),
+    (" 42\n", [("42", {"row": 0})]),
+    ("null", [("null", {"row": 0})]),
+    ('[1, "a", {"b": 2}]', [("1", {"row": 0}), ("a", {"row": 1}), ('{"b": 2}', {"row": 2})]),
+    ('{"x": 1, "y": [2]}', [('{"x": 1}', {"row": 0}), ('{"y": [2]}', {"row": 1})]),
+    ("[]", []),
+])
+def test_json_records(tmp_path, content, expected):
+    assert _records(tmp_path, content) == expected
+
+
+@pytest.mark.parametrize("content", ["", "1 2", '[1, 2', '{"a" 1}'])
+def test_malformed_json_raises(tmp_path, content):
+    with pytest.raises(ValueError):
+        _records(tmp_path, content)
+
+
+def test_records_span_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, "JSON_READ_SIZE", 3)
+    records = [{"id": i, "text": "word " * i} for i in range(50)]
+    assert len(_records(tmp_path, json.dumps(records))) == 50
+    assert _records(tmp_path, json.dumps("s" * 500)) == [("s" * 500, {"row": 0})]
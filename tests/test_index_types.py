@@ -0,0 +1,89 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from src.benchmark import HashingEmbedder, HASHING_MODEL
+from src.registry import register_embedding_model
+from src.index_types import IndexSpec, INDEX_TYPES
+from src.vectorstore import FaissVectorStore
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa"]
+
+
+def _documents(source: str, n: int):
+    return [
+        Document(page_content=f"{source} {WORDS[i % 16]} {WORDS[i // 16 % 16]} item {i}",
+                 metadata={"source": source})
+        for i in range(n)
+    ]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def hashing_model():
+    register_embedding_model(HASHING_MODEL, HashingEmbedder(64))
+
+
+@pytest.fixture(scope="module", params=INDEX_TYPES)
+def store_after_delete(request, tmp_path_factory):
+    """A store of every index type with one of its two documents deleted."""
+    spec = IndexSpec(request.param, train_threshold=0, nlist=4, nprobe=4)
+    store = FaissVectorStore(str(tmp_path_factory.mktemp(request.param)), model=HASHING_MODEL,
+                             index_spec=spec)
+    store.add_documents(_documents("a.txt", 300) + _documents("b.txt", 300))
+    doc_a = next(d for d in store.list_documents() if d["source"] == "a.txt")
+    assert store.delete_document(doc_a["doc_id"])
+    return store
+
+
+def test_query_after_delete(store_after_delete):
+    results = store_after_delete.query("alpha bravo item", top_k=5)
+    assert len(results) == 5
+    assert all(r["source"] == "b.txt" for r in results)
+
+    filtered = store_after_delete.query("alpha bravo item", top_k=5, filter={"source": "b.txt"})
+    assert [r["source"] for r in filtered] == ["b.txt"] * 5
+
+
+def test_top_k_beyond_live_rows(store_after_delete):
+    results = store_after_delete.query("alpha bravo item", top_k=1000)
+    assert 0 < len(results) <= 300
+    assert {r["source"] for r in results} == {"b.txt"}
+    assert len({r["chunk_id"] for r in results}) == len(results)
+
+
+def _pq_index(n: int) -> faiss.Index:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 64)).astype(np.float32)
+    index = faiss.IndexPQ(64, 8, 4, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    mapped = faiss.IndexIDMap2(index)
+    mapped.add_with_ids(vectors[:n], np.arange(n, dtype=np.int64) + 100)
+    return mapped
+
+
+def test_rejected_selector_on_empty_index():
+    allowed = np.ones(1000, dtype=bool)
+    sel = faiss.IDSelectorBitmap(1000, faiss.swig_ptr(np.packbits(allowed, bitorder="little")))
+    D, I = IndexSpec("pq").search(_pq_index(0), np.ones((2, 64), dtype=np.float32), 5, sel,
+                                  allowed=allowed)
+    assert I.shape[0] == 2 and (I == -1).all()
+
+
+def test_rejected_selector_filters_by_allowed_ids():
+    index = _pq_index(200)
+    allowed = np.zeros(1000, dtype=bool)
+    allowed[[105, 150, 299]] = True
+    bitmap = np.packbits(allowed, bitorder="little")
+    sel = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    q = np.random.default_rng(1).normal(size=(3, 64)).astype(np.float32)
+
+    D, I = IndexSpec("pq").search(index, q, 5, sel, allowed=allowed)
+    assert I.shape == (3, 5)
+    for row, scores in zip(I, D):
+        assert sorted(row[:3]) == [105, 150, 299]
+        assert (row[3:] == -1).all() and np.isneginf(scores[3:]).all()
+        assert (np.diff(scores[:3]) <= 0).all()
+
+    with pytest.raises(ValueError):
+        IndexSpec("pq").search(index, q, 5, sel)
@@ -0,0 +1,70 @@
+import json
+import pytest
+from src import data_loader
+from src.benchmark import HashingEmbedder, HASHING_MODEL
+from src.registry import register_embedding_model
+from src.vectorstore import FaissVectorStore
+from src.ingest import IngestionPipeline
+
+
+@pytest.fixture(scope="module", autouse=True)
+def hashing_model():
+    register_embedding_model(HASHING_MODEL, HashingEmbedder(64))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, "STREAM_PART_ROWS", 10)
+    return FaissVectorStore(str(tmp_path / "store"), model=HASHING_MODEL)
+
+
+def _write_records(path, version: str, n: int, truncate_after: int = 0) -> None:
+    text = json.dumps([{"id": i, "version": version} for i in range(n)])
+    if truncate_after:
+        # Cut inside record number truncate_after, so reading fails there
+        text = text[:text.index(f'{{"id": {truncate_after},') + 5]
+    path.write_text(text, encoding="utf-8")
+
+
+def _texts(store):
+    return [r["text"] for r in store.query("version", top_k=100)]
+
+
+def test_file_failing_partway_keeps_no_old_parts(tmp_path, store):
+    path = tmp_path / "records.json"
+    _write_records(path, "old", 30)
+    IngestionPipeline(store, load_workers=0).run([str(path)])
+    assert store.list_documents()[0]["parts"] == 3
+
+    _write_records(path, "new", 30, truncate_after=15)
+    result = IngestionPipeline(store, load_workers=0).run([str(path)])
+
+    assert result["errors"] and "kept the 1 parts" in result["errors"][0]
+    assert store.list_documents()[0]["parts"] == 1
+    texts = _texts(store)
+    assert len(texts) > 0 and all('"new"' in t for t in texts)
+
+
+def test_file_failing_before_any_part_keeps_old_version(tmp_path, store):
+    path = tmp_path / "records.json"
+    _write_records(path, "old", 30)
+    IngestionPipeline(store, load_workers=0).run([str(path)])
+
+    _write_records(path, "new", 30, truncate_after=5)
+    result = IngestionPipeline(store, load_workers=0).run([str(path)])
+
+    assert result["errors"]
+    assert store.list_documents()[0]["parts"] == 3
+    assert all('"old"' in t for t in _texts(store))
+
+
+def test_counts_files_rows_and_parts_separately(tmp_path, store):
+    table = tmp_path / "table.csv"
+    table.write_text("id,name\n" + "".join(f"{i},name {i}\n" for i in range(25)), encoding="utf-8")
+    note = tmp_path / "note.txt"
+    note.write_text("A short note.", encoding="utf-8")
+
+    result = IngestionPipeline(store, load_workers=0).run([str(table), str(note)])
+    assert result["doc_count"] == 2
+    assert result["pages"] == 26
+    assert result["parts"] == 3
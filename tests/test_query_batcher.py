@@ -0,0 +1,36 @@
+from concurrent.futures import wait
+import pytest
+from langchain_core.documents import Document
+from src.benchmark import HashingEmbedder, HASHING_MODEL
+from src.registry import register_embedding_model
+from src.vectorstore import FaissVectorStore
+from src.query_batcher import QueryBatcher
+
+QUERIES = [("alpha report", 3), ("bravo figures", 50), ("alpha bravo", 3), ("charlie", 10)]
+
+
+@pytest.fixture(scope="module")
+def hybrid_store(tmp_path_factory):
+    register_embedding_model(HASHING_MODEL, HashingEmbedder(64))
+    store = FaissVectorStore(str(tmp_path_factory.mktemp("store")), model=HASHING_MODEL,
+                             hybrid=True, hybrid_candidates=4)
+    words = ["alpha", "bravo", "charlie", "report", "figures", "delta"]
+    store.add_documents([
+        Document(page_content=f"{words[i % 6]} {words[i * 5 % 6]} {words[i * 7 % 4]} entry {i}",
+                 metadata={"source": f"doc{i % 5}.txt"})
+        for i in range(120)
+    ])
+    return store
+
+
+def test_batched_hybrid_results_match_direct_queries(hybrid_store):
+    batcher = QueryBatcher(hybrid_store, max_batch=8, window_ms=500)
+    futures = [batcher.submit(text, k) for text, k in QUERIES]
+    wait(futures)
+
+    assert batcher.stats()["batches"] == 1
+    for (text, k), future in zip(QUERIES, futures):
+        _, batched = future.result()
+        direct = hybrid_store.query(text, top_k=k)
+        assert [r["chunk_id"] for r in batched] == [r["chunk_id"] for r in direct]
+        assert [r["score"] for r in batched] == pytest.approx([r["score"] for r in direct])
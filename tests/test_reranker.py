@@ -0,0 +1,52 @@
+import time
+from src.reranker import CrossEncoderReranker
+
+
+class SlowCrossEncoder:
+    """Scores a pair by its text length, taking ``pair_s`` seconds per pair."""
+
+    def __init__(self, pair_s: float):
+        self.pair_s = pair_s
+        self.scored = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        time.sleep(self.pair_s * len(pairs))
+        self.scored += len(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+
+def _reranker(model: SlowCrossEncoder, budget_ms: float) -> CrossEncoderReranker:
+    reranker = CrossEncoderReranker("fake", batch_size=16, budget_ms=budget_ms)
+    reranker._model = model
+    return reranker
+
+
+def test_first_batch_is_cut_to_the_budget():
+    model = SlowCrossEncoder(pair_s=0.01)
+    reranker = _reranker(model, budget_ms=55)
+    reranker.load()
+    model.scored = 0
+
+    scores = reranker.score("q", [f"text {'x' * i}" for i in range(16)])
+    assert 0 < model.scored < 16
+    assert scores.count(None) == 16 - model.scored
+    assert reranker.budget_exceeded == 1
+
+
+def test_cold_start_over_budget_scores_nothing():
+    model = SlowCrossEncoder(pair_s=0.0)
+    reranker = _reranker(model, budget_ms=20)
+    reranker._get_model = lambda: time.sleep(0.05) or model
+
+    results = [{"text": t} for t in ("a", "bbb", "cc")]
+    reranked = reranker.rerank("q", results, top_n=3)
+    assert model.scored == 0
+    assert [r["text"] for r in reranked] == ["a", "bbb", "cc"]
+    assert all(r["rerank_score"] is None for r in reranked)
+
+
+def test_without_budget_everything_is_scored():
+    model = SlowCrossEncoder(pair_s=0.0)
+    reranker = _reranker(model, budget_ms=0)
+    reranked = reranker.rerank("q", [{"text": t} for t in ("a", "bbb", "cc")], top_n=2)
+    assert [r["text"] for r in reranked] == ["bbb", "cc"]
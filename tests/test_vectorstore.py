@@ -0,0 +1,70 @@
+import pytest
+from langchain_core.documents import Document
+from src.benchmark import HashingEmbedder, HASHING_MODEL
+from src.registry import register_embedding_model
+from src.vectorstore import FaissVectorStore
+
+
+@pytest.fixture(scope="module", autouse=True)
+def hashing_model():
+    register_embedding_model(HASHING_MODEL, HashingEmbedder(64))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FaissVectorStore(str(tmp_path), model=HASHING_MODEL)
+
+
+def _page(source: str, text: str = "shared quarterly report text") -> Document:
+    return Document(page_content=text, metadata={"source": source})
+
+
+def test_copy_under_another_path_is_its_own_document(store):
+    store.add_documents([_page("a.txt")])
+    result = store.add_documents([_page("b.txt")])
+
+    assert result["added"] == 1
+    assert sorted(d["source"] for d in store.list_documents()) == ["a.txt", "b.txt"]
+
+    original = next(d for d in store.list_documents() if d["source"] == "a.txt")
+    store.delete_document(original["doc_id"])
+    assert [r["source"] for r in store.query("quarterly report", top_k=5)] == ["b.txt"]
+
+
+def test_unchanged_file_is_skipped(store):
+    store.add_documents([_page("a.txt")])
+    result = store.add_documents([_page("a.txt")])
+
+    assert result["added"] == 0 and result["unchanged"] == 1
+    assert store.ntotal == 1
+
+
+def test_read_only_copy_follows_clear(tmp_path, store):
+    store.add_documents([_page("a.txt")])
+    reader = FaissVectorStore(str(tmp_path), model=HASHING_MODEL, read_only=True)
+    reader.load()
+    assert reader.ntotal == 1
+
+    store.clear()
+    assert reader.refresh(min_interval_s=0)
+    assert reader.ntotal == 0 and reader.list_documents() == []
+    assert not reader.refresh(min_interval_s=0)
+
+    store.add_documents([_page("b.txt")])
+    assert reader.refresh(min_interval_s=0)
+    assert [d["source"] for d in reader.list_documents()] == ["b.txt"]
+
+
+def test_hybrid_results_keep_their_cosine(tmp_path):
+    store = FaissVectorStore(str(tmp_path), model=HASHING_MODEL, hybrid=True, hybrid_candidates=2)
+    store.add_documents([_page(f"{i}.txt", f"filler words number {i} about nothing") for i in range(20)]
+                        + [_page("part.txt", "order part XK-4411 shipped")])
+    # The embedding points at the filler, so the part number is a keyword-only hit
+    q = store.encode_query("filler words about nothing")
+    results = store.query("XK-4411", top_k=5, embedding=q)
+
+    assert "part.txt" in [r["source"] for r in results]
+    for r in results:
+        expected = store.encode_query(r["text"])[0] @ q[0]
+        assert r["vector_score"] == pytest.approx(float(expected), abs=1e-5)
+        assert r["score"] < 0.1